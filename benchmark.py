@@ -0,0 +1,558 @@
+import os
+import io
+import sys
+import csv
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import pandas as pd
+from export_parser import COLUMNS, parse_rows
+from parse_legal_acts_statistics import read_raw_rows, parse_csv
+from generate_stats_pages import generate_stats_page, generate_index_page
+import columnar_store
+import snapshot_store
+import snapshot_cube
+import snapshots
+
+# Pipeline stages timed by benchmark_stages, in order
+STAGES = ['parse', 'aggregate', 'render', 'index']
+
+# Slowdowns below this many seconds are never reported as regressions (timer noise)
+REGRESSION_SLACK_SECONDS = 0.01
+
+# Entry points whose import time is measured with --imports
+ENTRY_MODULES = ['parse_legal_acts_statistics', 'generate_stats_pages', 'stats_server', 'diff_snapshots',
+                 'quick_stats', 'export_parser']
+
+# Dependencies the entry points must only import in the stages that need them
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'jinja2', 'requests']
+
+def legacy_parse(raw_csv_path):
+    """
+    Reference implementation of the original iterrows-based parser.
+
+    Kept only to benchmark and cross-check the current parser against it.
+
+    Args:
+        raw_csv_path (str): Path to a raw EUR-Lex export
+
+    Returns:
+        DataFrame: Long-format output without the parsing_date column
+    """
+    df_raw = pd.read_csv(snapshot_store.open_text(raw_csv_path), header=None)
+
+    data = []
+    current_year = None
+    current_month = None
+    current_category = None
+    type_continues = False
+
+    for idx, row in df_raw.iterrows():
+        if pd.notna(row[0]) and "Statistics for" in row[0]:
+            current_year = row[1]
+            current_month = row[2]
+            current_category = None
+            type_continues = False
+            continue
+
+        if pd.notna(row[0]) and pd.isna(row[1]) and pd.isna(row[2]) and "Total" not in row[0]:
+            if type_continues:
+                current_category += " - " + row[0]
+            else:
+                current_category = row[0]
+            type_continues = True
+            continue
+
+        if pd.isna(row[0]) and pd.isna(row[1]) and pd.isna(row[2]):
+            current_category = None
+            type_continues = False
+            continue
+
+        if pd.notna(row[1]) and "Total" in row[1]:
+            continue
+
+        if current_year and current_month and current_category and pd.notna(row[0]) and pd.notna(row[1]) and pd.notna(row[2]):
+            act_type = row[0]
+            basic_count = pd.to_numeric(row[1], errors='coerce')
+            amending_count = pd.to_numeric(row[2], errors='coerce') if len(row) > 2 else 0
+
+            data.append({'year': current_year, 'month': current_month, 'category': current_category,
+                         'act_type': act_type, 'type': 'basic', 'count': basic_count})
+            data.append({'year': current_year, 'month': current_month, 'category': current_category,
+                         'act_type': act_type, 'type': 'amending', 'count': amending_count})
+
+            type_continues = False
+
+    df_final = pd.DataFrame(data)
+    return df_final[df_final['act_type'] != 'Total'].reset_index(drop=True)
+
+def legacy_aggregate_stats(df):
+    """
+    Reference implementation of the original per-group filtering aggregation.
+
+    Kept only to benchmark SnapshotCube.stats and cross-check it against
+    (see also tests/test_stats.py).
+
+    Args:
+        df (DataFrame): Long-format output of parse_csv
+
+    Returns:
+        dict: Same structure as SnapshotCube.stats
+    """
+    yearly_stats = {}
+    for year in sorted(df['year'].unique()):
+        year_df = df[df['year'] == year]
+        yearly_stats[year] = {
+            'basic': year_df[year_df['type'] == 'basic']['count'].sum(),
+            'amending': year_df[year_df['type'] == 'amending']['count'].sum(),
+            'total': year_df['count'].sum()
+        }
+
+    category_stats = {}
+    for category in sorted(df['category'].unique()):
+        cat_df = df[df['category'] == category]
+        category_stats[category] = {
+            'basic': cat_df[cat_df['type'] == 'basic']['count'].sum(),
+            'amending': cat_df[cat_df['type'] == 'amending']['count'].sum(),
+            'total': cat_df['count'].sum()
+        }
+
+    detailed_stats = {}
+    for category in sorted(df['category'].unique()):
+        detailed_stats[category] = {}
+        cat_df = df[df['category'] == category]
+        for act_type in sorted(cat_df['act_type'].unique()):
+            act_df = cat_df[cat_df['act_type'] == act_type]
+            detailed_stats[category][act_type] = {
+                'basic': act_df[act_df['type'] == 'basic']['count'].sum(),
+                'amending': act_df[act_df['type'] == 'amending']['count'].sum(),
+                'total': act_df['count'].sum()
+            }
+
+    return {
+        'total_acts': df['count'].sum(),
+        'basic_acts': df[df['type'] == 'basic']['count'].sum(),
+        'amending_acts': df[df['type'] == 'amending']['count'].sum(),
+        'yearly_stats': yearly_stats,
+        'category_stats': category_stats,
+        'detailed_stats': detailed_stats
+    }
+
+def _rendered(stats):
+    """Return stats as the strings the template renders, in iteration order."""
+    if isinstance(stats, dict):
+        return [(str(key), _rendered(value)) for key, value in stats.items()]
+    return str(stats)
+
+def current_parse(raw_csv_path):
+    """Parse a raw export with the current single-pass parser."""
+    return pd.DataFrame(parse_rows(read_raw_rows(raw_csv_path)), columns=COLUMNS)
+
+def _best_time(func, arg, repeat):
+    """Return the best wall time of repeat calls and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def _to_output_csv(df, parsing_date):
+    """Render a parsed frame exactly as parse_csv writes it."""
+    df = df.copy()
+    df['parsing_date'] = parsing_date
+    return df.to_csv(index=False)
+
+def benchmark_parsers(input_dir, repeat=3):
+    """
+    Time the legacy and current parsers on every raw export in input_dir.
+
+    Each result is also checked for byte-identical output against the other
+    parser and against the parsed CSV stored next to the raw export.
+
+    Args:
+        input_dir (str): Directory containing snapshot folders
+        repeat (int): Number of timed runs per file (the best one is kept)
+
+    Returns:
+        list: One dict per raw export with timings and check results
+    """
+    results = []
+    for snapshot in snapshots.discover_snapshots(input_dir):
+        raw_csv_path = snapshot.raw_csv_path
+        if not raw_csv_path:
+            continue
+        legacy_time, legacy_df = _best_time(legacy_parse, raw_csv_path, repeat)
+        current_time, current_df = _best_time(current_parse, raw_csv_path, repeat)
+
+        stored = snapshot_store.read_bytes(snapshot.csv_path).decode('utf-8')
+        parsing_date = pd.read_csv(io.StringIO(stored), nrows=1)['parsing_date'].iloc[0]
+
+        current_csv = _to_output_csv(current_df, parsing_date)
+        results.append({
+            'file': os.path.basename(raw_csv_path),
+            'rows': len(current_df),
+            'legacy_seconds': legacy_time,
+            'current_seconds': current_time,
+            'speedup': legacy_time / current_time,
+            'matches_legacy': current_csv == _to_output_csv(legacy_df, parsing_date),
+            'matches_stored': current_csv == stored
+        })
+    return results
+
+def cube_stats(df):
+    """Build the cube of a long-format frame and aggregate it, as generate_stats_page does without a cube file."""
+    return snapshot_cube.SnapshotCube.from_frame(df).stats()
+
+def benchmark_aggregation(input_dir, repeat=3):
+    """
+    Time the legacy and current (cube) aggregation on every parsed snapshot in input_dir.
+
+    Each result is also checked to render exactly the same numbers, in the
+    same order, as the legacy aggregation.
+
+    Args:
+        input_dir (str): Directory containing snapshot folders
+        repeat (int): Number of timed runs per file (the best one is kept)
+
+    Returns:
+        list: One dict per snapshot with timings and check results
+    """
+    results = []
+    for snapshot in snapshots.discover_snapshots(input_dir):
+        csv_path = snapshot.csv_path
+        df = columnar_store.load_snapshot_frame(csv_path)
+        legacy_time, legacy_stats = _best_time(legacy_aggregate_stats, df, repeat)
+        current_time, current_stats = _best_time(cube_stats, df, repeat)
+        results.append({
+            'file': os.path.basename(csv_path),
+            'rows': len(df),
+            'legacy_seconds': legacy_time,
+            'current_seconds': current_time,
+            'speedup': legacy_time / current_time,
+            'matches_legacy': _rendered(current_stats) == _rendered(legacy_stats)
+        })
+    return results
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of this process, where supported (Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb():
+    """Return the peak resident set size of this process in MB (since the last reset on Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def _measure(func, args, repeat):
+    """Return the best wall time of repeat calls of func(*args), the peak RSS in MB during them and the last result."""
+    _reset_peak_rss()
+    seconds, result = _best_time(lambda a: func(*a), args, repeat)
+    return seconds, _peak_rss_mb(), result
+
+def write_synthetic_export(raw_csv_path, scale, path):
+    """
+    Write a raw export scaled up by repeating its blocks.
+
+    Every copy after the first is shifted by the number of years the export
+    spans, so a scaled export has scale times as many years (and rows) for
+    the same categories and act types.
+
+    Args:
+        raw_csv_path (str): Path to a raw EUR-Lex export (which may be packed)
+        scale (int): Number of copies
+        path (str): Path to the synthetic export
+
+    Returns:
+        str: Path to the synthetic export
+    """
+    rows = list(csv.reader(snapshot_store.open_text(raw_csv_path)))
+    years = [int(row[1]) for row in rows if row and "Statistics for" in row[0]]
+    span = max(years) - min(years) + 1
+
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        for copy in range(scale):
+            for row in rows:
+                if copy and row and "Statistics for" in row[0]:
+                    row = [row[0], str(int(row[1]) + copy * span)] + row[2:]
+                writer.writerow(row)
+    return path
+
+def _stage_result(file, scale, stage, rows, seconds, peak_rss_mb):
+    """Return the result of one timed stage."""
+    return {
+        'file': file,
+        'scale': scale,
+        'stage': stage,
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds else None,
+        'peak_rss_mb': peak_rss_mb
+    }
+
+def benchmark_stages(input_dir, scales=(1,), repeat=1):
+    """
+    Replay the raw exports of input_dir through the parser and the page generator.
+
+    Each export is parsed with parse_csv, aggregated, and rendered as a stats
+    page (against the previous export), then the index page is rendered for
+    all of them. Everything is written to a temporary directory. At scales
+    other than 1, only the latest export is replayed, scaled up with
+    write_synthetic_export.
+
+    Args:
+        input_dir (str): Directory containing snapshot folders
+        scales (list): Scale factors to replay the exports at
+        repeat (int): Number of timed runs per stage (the best one is kept)
+
+    Returns:
+        list: One dict per export, scale and stage with the wall time, rows
+            per second and peak RSS (see _stage_result)
+    """
+    found = [snapshot for snapshot in snapshots.discover_snapshots(input_dir) if snapshot.raw_csv_path]
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in scales:
+            cache_dir = os.path.join(work_dir, f"cache_x{scale}")
+            pages_dir = os.path.join(work_dir, f"pages_x{scale}")
+            os.makedirs(pages_dir)
+
+            summaries = []
+            previous_csv_path = None
+            for snapshot in (found if scale == 1 else found[-1:]):
+                raw_csv_path = snapshot.raw_csv_path
+                if scale != 1:
+                    raw_csv_path = write_synthetic_export(
+                        raw_csv_path, scale, os.path.join(work_dir, f"{snapshot.name}_x{scale}_raw.csv"))
+
+                seconds, rss, _ = _measure(parse_csv, (raw_csv_path, os.path.join(cache_dir, snapshot.name + '.csv')), repeat)
+                csv_path = os.path.join(cache_dir, snapshot.name, snapshot.name + '.csv')
+                df = columnar_store.load_snapshot_frame(csv_path)
+                results.append(_stage_result(snapshot.name, scale, 'parse', len(df), seconds, rss))
+
+                seconds, rss, _ = _measure(cube_stats, (df,), repeat)
+                results.append(_stage_result(snapshot.name, scale, 'aggregate', len(df), seconds, rss))
+
+                seconds, rss, summary = _measure(generate_stats_page, (csv_path, pages_dir, previous_csv_path), repeat)
+                results.append(_stage_result(snapshot.name, scale, 'render', len(df), seconds, rss))
+
+                summaries.append(summary)
+                previous_csv_path = csv_path
+
+            seconds, rss, _ = _measure(generate_index_page, (summaries, pages_dir, False), repeat)
+            results.append(_stage_result('(all)', scale, 'index', len(summaries), seconds, rss))
+    return results
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module (str): Name of the module
+
+    Returns:
+        tuple: Cumulative import time of the module in seconds, number of
+            modules imported with it and the heavy modules among them
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    seconds = None
+    imported = 0
+    heavy = set()
+    # Lines read "import time: <self us> | <cumulative us> | <indented module name>"
+    for line in result.stderr.splitlines():
+        fields = line.partition('import time:')[2].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        imported += 1
+        if name == module:
+            seconds = int(fields[1]) / 1e6
+        if name.split('.')[0] in HEAVY_MODULES:
+            heavy.add(name.split('.')[0])
+    return seconds, imported, sorted(heavy)
+
+def benchmark_imports(modules=ENTRY_MODULES, repeat=3):
+    """
+    Measure the import time of the entry points, each in a fresh interpreter.
+
+    Args:
+        modules (list): Names of the modules to import
+        repeat (int): Number of imports per module (the fastest one is kept)
+
+    Returns:
+        list: One stage result (see _stage_result) per module, for the
+            'import' stage, with the heavy modules it imported
+    """
+    results = []
+    for module in modules:
+        measurements = [measure_import(module) for _ in range(repeat)]
+        seconds, imported, heavy = min(measurements, key=lambda measurement: measurement[0])
+        result = _stage_result(module, 1, 'import', imported, seconds, None)
+        result['heavy_modules'] = heavy
+        results.append(result)
+    return results
+
+def save_baseline(path, results):
+    """Store stage results as a baseline for later runs."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results
+        }, f, indent=2)
+
+def _stage_totals(results, files=None):
+    """Return the summed seconds per (scale, stage), over the given files (default: all)."""
+    totals = {}
+    for r in results:
+        if files is None or (r['file'], r['scale']) in files:
+            totals[(r['scale'], r['stage'])] = totals.get((r['scale'], r['stage']), 0) + r['seconds']
+    return totals
+
+def compare_to_baseline(results, baseline_path, tolerance):
+    """
+    Find the stages that got slower than their baseline.
+
+    Stages are compared by their total time over the exports timed in both
+    runs, which evens out the noise of timing single files.
+
+    Args:
+        results (list): Result of benchmark_stages
+        baseline_path (str): Path to a baseline stored with save_baseline
+        tolerance (float): Allowed slowdown as a fraction of the baseline time
+
+    Returns:
+        list: (scale, stage, seconds, baseline seconds) for each regressed stage
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)['results']
+    files = {(r['file'], r['scale']) for r in results} & {(r['file'], r['scale']) for r in baseline}
+
+    expected = _stage_totals(baseline, files)
+    regressions = []
+    for (scale, stage), seconds in sorted(_stage_totals(results, files).items()):
+        baseline_seconds = expected.get((scale, stage))
+        if baseline_seconds is not None and \
+                seconds - baseline_seconds > max(baseline_seconds * tolerance, REGRESSION_SLACK_SECONDS):
+            regressions.append((scale, stage, seconds, baseline_seconds))
+    return regressions
+
+def _print_stage_results(results):
+    """Print a table of stage results, with totals per stage and scale."""
+    print("Pipeline stages")
+    print(f"{'file':<18} {'scale':>5} {'stage':<10} {'rows':>9} {'time [s]':>9} {'rows/s':>11} {'peak RSS [MB]':>14}")
+    for r in results:
+        rate = f"{r['rows_per_second']:>11.0f}" if r['rows_per_second'] else f"{'-':>11}"
+        print(f"{r['file']:<18} {r['scale']:>5} {r['stage']:<10} {r['rows']:>9} {r['seconds']:>9.4f} {rate} "
+              f"{r['peak_rss_mb']:>14.1f}")
+
+    totals = _stage_totals(results)
+    for scale in sorted({r['scale'] for r in results}):
+        print(f"Total at scale {scale}: " + ', '.join(f"{stage} {totals.get((scale, stage), 0):.3f}s" for stage in STAGES))
+    print()
+
+def _print_import_results(results):
+    """Print a table of import times and the heavy modules each entry point imports."""
+    print("Import times (python -X importtime)")
+    print(f"{'module':<30} {'time [ms]':>10} {'modules':>8}  heavy modules")
+    for r in results:
+        print(f"{r['file']:<30} {r['seconds'] * 1000:>10.1f} {r['rows']:>8}  {', '.join(r['heavy_modules']) or '-'}")
+    print()
+
+def _print_results(title, results):
+    """Print a table of benchmark results and return whether all checks passed."""
+    print(title)
+    print(f"{'file':<28} {'rows':>6} {'legacy [s]':>11} {'current [s]':>12} {'speedup':>8}  identical")
+    for r in results:
+        identical = r['matches_legacy'] and r.get('matches_stored') is not False
+        print(f"{r['file']:<28} {r['rows']:>6} {r['legacy_seconds']:>11.4f} {r['current_seconds']:>12.4f} "
+              f"{r['speedup']:>7.1f}x  {'yes' if identical else 'NO'}")
+
+    if results:
+        legacy_total = sum(r['legacy_seconds'] for r in results)
+        current_total = sum(r['current_seconds'] for r in results)
+        print(f"Total: legacy {legacy_total:.3f}s, current {current_total:.3f}s, "
+              f"speedup {legacy_total / current_total:.1f}x")
+    print()
+
+    return all(r['matches_legacy'] and r.get('matches_stored') is not False for r in results)
+
+def main():
+    """Benchmark parsing and aggregation against the original implementations, or time the pipeline stages."""
+    parser = argparse.ArgumentParser(description='Benchmark parsing and aggregation of the cached snapshots.')
+    parser.add_argument('--input', '-i', default='cache', help='Directory containing snapshot folders')
+    parser.add_argument('--repeat', '-r', type=int, default=3, help='Timed runs per file (best is reported)')
+    parser.add_argument('--stages', action='store_true',
+                        help='Time parse_csv, aggregation, stats page and index rendering instead of comparing '
+                             'against the original implementations')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1],
+                        help='Scale factors to replay the exports at with --stages (e.g. 1 10 100)')
+    parser.add_argument('--imports', action='store_true',
+                        help='Measure the import time of the entry points instead, failing if one imports '
+                             'a heavy dependency at module level')
+    parser.add_argument('--baseline', help='Fail if a stage is slower than in this baseline file')
+    parser.add_argument('--save-baseline', help='Store the stage results as a baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline as a fraction (default: 0.25)')
+    args = parser.parse_args()
+
+    if (args.baseline or args.save_baseline) and not (args.stages or args.imports):
+        parser.error('--baseline and --save-baseline require --stages or --imports')
+
+    if args.stages or args.imports:
+        if args.imports:
+            results = benchmark_imports(repeat=args.repeat)
+            _print_import_results(results)
+        else:
+            results = benchmark_stages(args.input, scales=args.scale, repeat=args.repeat)
+            _print_stage_results(results)
+
+        if args.save_baseline:
+            save_baseline(args.save_baseline, results)
+            print(f"Saved baseline to {args.save_baseline}")
+
+        if args.baseline:
+            regressions = compare_to_baseline(results, args.baseline, args.tolerance)
+            for scale, stage, seconds, baseline_seconds in regressions:
+                print(f"Regression: {stage} at scale {scale} took {seconds:.4f}s (baseline {baseline_seconds:.4f}s)")
+            if regressions:
+                raise SystemExit(f"{len(regressions)} stages are more than {args.tolerance:.0%} slower than the baseline")
+            print(f"No stage is more than {args.tolerance:.0%} slower than the baseline")
+
+        heavy = [r for r in results if r.get('heavy_modules')]
+        if heavy:
+            raise SystemExit(f"{len(heavy)} entry points import heavy dependencies at module level: " +
+                             ', '.join(f"{r['file']} ({', '.join(r['heavy_modules'])})" for r in heavy))
+        return
+
+    parse_ok = _print_results("Parsing", benchmark_parsers(args.input, repeat=args.repeat))
+    aggregate_ok = _print_results("Aggregation", benchmark_aggregation(args.input, repeat=args.repeat))
+
+    if not parse_ok:
+        raise SystemExit("Parser output differs from the reference output")
+    if not aggregate_ok:
+        raise SystemExit("Aggregated statistics differ from the reference output")
+
+if __name__ == '__main__':
+    main()
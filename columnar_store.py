@@ -0,0 +1,100 @@
+import os
+import importlib.util
+import snapshot_store
+
+# Key of the schema metadata entry holding the (constant) parsing_date column
+PARSING_DATE_KEY = b'parsing_date'
+
+# Compact dtypes of the long-format columns in Parquet files
+PARQUET_DTYPES = {
+    'year': 'int16',
+    'month': 'int8',
+    'category': 'category',
+    'act_type': 'category',
+    'type': 'category'
+}
+
+def parquet_available():
+    """Whether the optional pyarrow dependency is installed."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def parquet_path_for(csv_path):
+    """Return the path of the Parquet file belonging to a long-format CSV file."""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+def write_parquet(df, path):
+    """
+    Write a long-format frame as a compact Parquet file.
+
+    Strings are dictionary-encoded categoricals, year/month are small
+    integers and the parsing_date column, which is the same on every row,
+    is stored once in the file metadata.
+
+    Args:
+        df (DataFrame): Long-format output of parse_csv
+        path (str): Path to the Parquet file
+
+    Returns:
+        str: Path to the Parquet file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.astype(PARQUET_DTYPES)
+    # Keep counts as floats if some could not be parsed, like the CSV output does
+    if df['count'].notna().all():
+        df['count'] = df['count'].astype('int32')
+
+    parsing_date = None
+    if 'parsing_date' in df.columns:
+        parsing_date = str(df['parsing_date'].iloc[0]) if len(df) else None
+        df = df.drop(columns='parsing_date')
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if parsing_date is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               PARSING_DATE_KEY: parsing_date.encode('utf-8')})
+
+    pq.write_table(table, path, compression='zstd', use_dictionary=True)
+    return path
+
+def read_parquet(path):
+    """
+    Read a Parquet file written by write_parquet.
+
+    Args:
+        path (str): Path to the Parquet file
+
+    Returns:
+        DataFrame: Long-format frame with categorical string columns and the
+            parsing_date column restored from the file metadata
+    """
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path)
+    df = table.to_pandas()
+    metadata = table.schema.metadata or {}
+    if PARSING_DATE_KEY in metadata:
+        df['parsing_date'] = pd.Categorical([metadata[PARSING_DATE_KEY].decode('utf-8')] * len(df))
+    return df
+
+def load_snapshot_frame(csv_path):
+    """
+    Load the long-format frame of a snapshot, preferring its Parquet file.
+
+    Falls back to the CSV file (which may be packed into blocks) if there is
+    no Parquet file next to it or pyarrow is not installed.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file of the snapshot
+
+    Returns:
+        DataFrame: Long-format frame
+    """
+    import pandas as pd
+
+    parquet_path = parquet_path_for(csv_path)
+    if os.path.exists(parquet_path) and parquet_available():
+        return read_parquet(parquet_path)
+    return pd.read_csv(snapshot_store.open_text(csv_path))
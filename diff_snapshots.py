@@ -0,0 +1,186 @@
+import csv
+import json
+import argparse
+import snapshot_store
+import snapshots
+
+# Columns identifying a cell of the long-format output
+KEY_COLUMNS = ['year', 'month', 'category', 'act_type', 'type']
+
+def _count_value(value):
+    """Convert a count from the long-format CSV to a number, or None if it is missing."""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+
+def read_cells(csv_path):
+    """
+    Read the cells of a long-format CSV file, sorted by key.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file (which may be packed)
+
+    Returns:
+        list: ((year, month, category, act_type, type), count) tuples
+    """
+    reader = csv.DictReader(snapshot_store.open_text(csv_path))
+    cells = [((int(row['year']), int(row['month']), row['category'], row['act_type'], row['type']),
+              _count_value(row['count']))
+             for row in reader]
+    cells.sort(key=lambda cell: cell[0])
+    return cells
+
+def cells_from_columns(columns):
+    """
+    Turn the column lists returned by parse_rows into cells, sorted by key.
+
+    Args:
+        columns (dict): Long-format output as lists keyed by column name
+
+    Returns:
+        list: ((year, month, category, act_type, type), count) tuples
+    """
+    keys = zip(*(columns[column] for column in KEY_COLUMNS))
+    cells = [((int(year), int(month), category, act_type, type_), _count_value(count))
+             for (year, month, category, act_type, type_), count in zip(keys, columns['count'])]
+    cells.sort(key=lambda cell: cell[0])
+    return cells
+
+def diff_cells(old_cells, new_cells):
+    """
+    Compare two sorted lists of cells in a single merge pass.
+
+    Args:
+        old_cells (list): Sorted (key, count) tuples of the older snapshot
+        new_cells (list): Sorted (key, count) tuples of the newer snapshot
+
+    Returns:
+        dict: 'added' and 'removed' lists of (key, count) tuples and a
+            'changed' list of (key, old count, new count) tuples, by key
+    """
+    added, removed, changed = [], [], []
+    i = j = 0
+    while i < len(old_cells) and j < len(new_cells):
+        old_key, old_count = old_cells[i]
+        new_key, new_count = new_cells[j]
+        if old_key == new_key:
+            if old_count != new_count:
+                changed.append((old_key, old_count, new_count))
+            i += 1
+            j += 1
+        elif old_key < new_key:
+            removed.append(old_cells[i])
+            i += 1
+        else:
+            added.append(new_cells[j])
+            j += 1
+    removed.extend(old_cells[i:])
+    added.extend(new_cells[j:])
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+def diff_snapshots(old_csv_path, new_csv_path):
+    """
+    Compare the cells of two snapshots.
+
+    If both snapshots have an up-to-date cube file, the cubes are compared
+    (see snapshot_cube.diff_cubes) instead of reading the CSV files.
+
+    Args:
+        old_csv_path (str): Long-format CSV file of the older snapshot
+        new_csv_path (str): Long-format CSV file of the newer snapshot
+
+    Returns:
+        dict: See diff_cells
+    """
+    import snapshot_cube
+
+    old_cube = snapshot_cube.load_cube(old_csv_path)
+    new_cube = old_cube and snapshot_cube.load_cube(new_csv_path)
+    if old_cube and new_cube:
+        return snapshot_cube.diff_cubes(old_cube, new_cube)
+    return diff_cells(read_cells(old_csv_path), read_cells(new_csv_path))
+
+def is_empty(diff):
+    """Whether a diff contains no added, removed or changed cells."""
+    return not (diff['added'] or diff['removed'] or diff['changed'])
+
+def diff_summary(diff, limit=None):
+    """
+    Turn a diff into a JSON-serializable summary.
+
+    Args:
+        diff (dict): Result of diff_cells
+        limit (int): Maximum number of cells listed per kind (None: all)
+
+    Returns:
+        dict: Number of added/removed/changed cells, the net change of the
+            total count, and the cells themselves as dicts
+    """
+    def as_dict(key, **counts):
+        return {**dict(zip(KEY_COLUMNS, key)), **counts}
+
+    def numeric(value):
+        return value if isinstance(value, (int, float)) else 0
+
+    net_change = (sum(numeric(count) for _, count in diff['added'])
+                  - sum(numeric(count) for _, count in diff['removed'])
+                  + sum(numeric(new) - numeric(old) for _, old, new in diff['changed']))
+
+    return {
+        'added_count': len(diff['added']),
+        'removed_count': len(diff['removed']),
+        'changed_count': len(diff['changed']),
+        'net_change': net_change,
+        'added': [as_dict(key, count=count) for key, count in diff['added'][:limit]],
+        'removed': [as_dict(key, count=count) for key, count in diff['removed'][:limit]],
+        'changed': [as_dict(key, old_count=old, new_count=new) for key, old, new in diff['changed'][:limit]]
+    }
+
+def main():
+    """Report the cells that changed between two snapshots (by default the latest two in the cache)."""
+    parser = argparse.ArgumentParser(description='Report what changed between two EUR-Lex snapshots.')
+    parser.add_argument('old', nargs='?', help='Long-format CSV file of the older snapshot')
+    parser.add_argument('new', nargs='?', help='Long-format CSV file of the newer snapshot')
+    parser.add_argument('--input', '-i', default='cache', help='Directory containing snapshot folders')
+    parser.add_argument('--json', action='store_true', help='Print the diff as JSON')
+    parser.add_argument('--limit', type=int, default=50, help='Maximum number of cells listed per kind')
+    parser.add_argument('--exit-code', action='store_true', help='Exit with status 1 if the snapshots differ')
+    args = parser.parse_args()
+
+    if args.old and args.new:
+        old_path, new_path = args.old, args.new
+    else:
+        found = snapshots.discover_snapshots(args.input)
+        if len(found) < 2:
+            raise SystemExit(f"Need two snapshots in {args.input} to compare")
+        old_path, new_path = found[-2].csv_path, found[-1].csv_path
+
+    diff = diff_snapshots(old_path, new_path)
+    summary = diff_summary(diff, limit=args.limit)
+
+    if args.json:
+        print(json.dumps({'old': old_path, 'new': new_path, **summary}, indent=2))
+    else:
+        print(f"Comparing {old_path} -> {new_path}")
+        print(f"Added: {summary['added_count']}, removed: {summary['removed_count']}, "
+              f"changed: {summary['changed_count']}, net change of total: {summary['net_change']:+}")
+        for cell in summary['changed']:
+            print(f"  {cell['year']}-{cell['month']:02d} {cell['category']} / {cell['act_type']} ({cell['type']}): "
+                  f"{cell['old_count']} -> {cell['new_count']}")
+        for kind in ('added', 'removed'):
+            for cell in summary[kind]:
+                print(f"  {kind} {cell['year']}-{cell['month']:02d} {cell['category']} / {cell['act_type']} "
+                      f"({cell['type']}): {cell['count']}")
+
+    if args.exit_code and not is_empty(diff):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import csv
+import hashlib
+import functools
+
+# Columns of the long-format output, in output order (parsing_date is appended later)
+COLUMNS = ['year', 'month', 'category', 'act_type', 'type', 'count']
+
+# Start of the line opening each per-month block of an export
+BLOCK_MARKER = '"Statistics for"'
+
+# Cell values that pandas.read_csv treats as missing by default. The export is
+# parsed with the csv module, but empty cells have to behave exactly as they did
+# when the raw file was read with pandas.
+NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+def _cell(row, index):
+    """Return the cell at index, or None if it is missing or empty."""
+    if index < len(row) and row[index] not in NA_VALUES:
+        return row[index]
+    return None
+
+def _to_count(value):
+    """Convert a count cell to a number, or None if it is not numeric."""
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+def parse_rows(rows, totals=None):
+    """
+    Parse the rows of a raw EUR-Lex statistics export in a single pass.
+    
+    The export is a sequence of "Statistics for, YEAR, MONTH" blocks. Inside a
+    block, rows with only a first cell name the current category (consecutive
+    ones are joined with " - "), rows with three cells are act type counts and
+    "Total" rows are left out of the output.
+    
+    Args:
+        rows (iterable): Rows as lists of strings, e.g. from csv.reader
+        totals (list): If given, the "Total" row of every category is appended
+            to it as (year, month, category, basic, amending); for the Total
+            row with a single count (the basic acts again), amending is None
+    
+    Returns:
+        dict: Long-format output as lists keyed by column name (see COLUMNS)
+    """
+    years, months, categories, act_types, types, counts = ([] for _ in COLUMNS)
+    current_year = None
+    current_month = None
+    current_category = None
+    type_continues = False
+
+    for row in rows:
+        first, second, third = _cell(row, 0), _cell(row, 1), _cell(row, 2)
+
+        if first is not None and "Statistics for" in first:
+            current_year = second
+            current_month = third
+            current_category = None
+            type_continues = False
+            continue
+
+        if second is None and third is None:
+            if first is None:
+                current_category = None
+                type_continues = False
+            elif "Total" not in first:
+                if type_continues:
+                    current_category += " - " + first
+                else:
+                    current_category = first
+                type_continues = True
+            continue
+
+        if second is not None and "Total" in second:
+            continue
+
+        if first == 'Total' and third is None and totals is not None and current_year and current_month and current_category:
+            totals.append((current_year, current_month, current_category, _to_count(second), None))
+            continue
+
+        if current_year and current_month and current_category and first is not None and second is not None and third is not None:
+            type_continues = False
+            if first == 'Total':
+                if totals is not None:
+                    totals.append((current_year, current_month, current_category, _to_count(second), _to_count(third)))
+                continue
+
+            years += (current_year, current_year)
+            months += (current_month, current_month)
+            categories += (current_category, current_category)
+            act_types += (first, first)
+            types += ('basic', 'amending')
+            counts += (_to_count(second), _to_count(third))
+
+    return dict(zip(COLUMNS, (years, months, categories, act_types, types, counts)))
+
+def parse_export(lines, totals=None):
+    """
+    Parse a raw EUR-Lex statistics export held in memory.
+    
+    Has no file system or network side effects and needs no third-party
+    packages, so it can be called in tight loops (tests, backfills, services).
+    
+    Args:
+        lines (iterable): Lines of the export as strings (e.g. a list, an open
+            text file or io.StringIO), without a byte order mark
+        totals (list): If given, filled with the export's Total rows (see parse_rows)
+    
+    Returns:
+        dict: Long-format output as lists keyed by column name (see COLUMNS)
+    """
+    return parse_rows(csv.reader(lines), totals)
+
+@functools.lru_cache(maxsize=None)
+def parser_version():
+    """Return a hash of this module's source; parsed blocks are only reused by the parser that produced them."""
+    with open(__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def split_export(lines):
+    """
+    Group the lines of an export into per-month blocks.
+    
+    A block starts at every line beginning with "Statistics for", where the
+    parser resets its state, so each block parses the same on its own as
+    inside the whole export. Lines before the first block form a block too.
+    
+    Args:
+        lines (iterable): Lines of the export as strings, with their line endings
+    
+    Yields:
+        list: The lines of each block
+    """
+    block = []
+    for line in lines:
+        if block and line.startswith(BLOCK_MARKER):
+            yield block
+            block = []
+        block.append(line)
+    if block:
+        yield block
+
+def parse_export_blocks(lines, previous=None, totals=None):
+    """
+    Parse an export block by block, reusing the rows of blocks unchanged since a previous parse.
+    
+    Every block is hashed; a block whose hash is in the previous block index
+    (written by the same parser version) takes its rows from there, and only
+    new or changed blocks are parsed. The result is the same as parse_export.
+    
+    Args:
+        lines (iterable): Lines of the export as strings, with their line endings
+            (e.g. an open text file or the lines yielded while downloading)
+        previous (dict): Block index returned for an earlier export, or None
+        totals (list): If given, filled with the export's Total rows (see parse_rows)
+    
+    Returns:
+        tuple: Long-format output as lists keyed by column name (see COLUMNS)
+            and the block index of this export: the parser version, the
+            number of reused blocks and, per block in export order, its
+            SHA-256, its rows as [year, month, category, act_type, basic, amending]
+            and its Total rows
+    """
+    known = {}
+    if previous and previous.get('parser') == parser_version():
+        known = {digest: (rows, block_totals) for digest, rows, block_totals in previous['blocks']}
+
+    years, months, categories, act_types, types, counts = ([] for _ in COLUMNS)
+    blocks = []
+    reused = 0
+    for block in split_export(lines):
+        digest = hashlib.sha256(''.join(block).encode('utf-8')).hexdigest()
+        if digest not in known:
+            block_totals = []
+            parsed = parse_rows(csv.reader(block), block_totals)
+            if totals is not None:
+                totals += block_totals
+            # Every act type yields a basic and an amending row with the same keys
+            blocks.append([digest, list(zip(parsed['year'][::2], parsed['month'][::2], parsed['category'][::2],
+                                            parsed['act_type'][::2], parsed['count'][::2], parsed['count'][1::2])),
+                           block_totals])
+            years += parsed['year']
+            months += parsed['month']
+            categories += parsed['category']
+            act_types += parsed['act_type']
+            types += parsed['type']
+            counts += parsed['count']
+            continue
+
+        rows, block_totals = known[digest]
+        if totals is not None:
+            totals += block_totals
+        reused += 1
+        blocks.append([digest, rows, block_totals])
+        for year, month, category, act_type, basic, amending in rows:
+            years += (year, year)
+            months += (month, month)
+            categories += (category, category)
+            act_types += (act_type, act_type)
+            types += ('basic', 'amending')
+            counts += (basic, amending)
+
+    columns = dict(zip(COLUMNS, (years, months, categories, act_types, types, counts)))
+    return columns, {'parser': parser_version(), 'reused': reused, 'blocks': blocks}
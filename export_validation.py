@@ -0,0 +1,185 @@
+import numpy as np
+import snapshot_cube
+
+# Maximum number of problems listed per check in a validation report
+MAX_EXAMPLES = 20
+
+class ValidationError(Exception):
+    """Raised when a parsed export fails validation, with the validation report."""
+
+    def __init__(self, report):
+        failed = [name for name, check in report['checks'].items() if check['problems']]
+        super().__init__(f"Export failed validation ({', '.join(failed)})")
+        self.report = report
+
+def _check(checked, problems, examples, warnings=()):
+    """Return the result of one check; warnings are reported without failing the validation."""
+    return {'checked': int(checked), 'problems': int(problems), 'examples': examples[:MAX_EXAMPLES],
+            'warnings': list(warnings)[:MAX_EXAMPLES]}
+
+def _month_label(year, month):
+    return f"{int(year)}-{int(month):02d}"
+
+def check_totals(cube, totals):
+    """
+    Compare the export's Total rows with the sums of the parsed counts.
+
+    Every Total row must match the basic/amending counts of its category in
+    its month, and every category with counts must have a Total row (a
+    truncated or reshaped export loses them).
+
+    Args:
+        cube (SnapshotCube): Cube of the parsed counts
+        totals (list): Total rows collected by export_parser.parse_rows
+
+    Returns:
+        dict: Number of checked Total rows and cells, problems and examples
+    """
+    if not totals:
+        return _check(0, 1, ["The export has no Total rows"])
+
+    # Parsed basic/amending sums per year, month and category
+    one_hot = np.zeros((len(cube.act_types), len(cube.categories)), dtype=np.int64)
+    one_hot[np.arange(len(cube.act_types)), cube.act_type_categories] = 1
+    parsed = np.einsum('ymat,ac->ymct', cube.counts.astype(np.int64), one_hot)
+    has_counts = np.einsum('ymat,ac->ymc', cube.present.astype(np.int64), one_hot) > 0
+
+    # One column per field; numpy converts the year and month strings in C
+    year_column, month_column, category_column, basic_column, amending_column = zip(*totals)
+    category_index = {str(name): index for index, name in enumerate(cube.categories)}
+    years = np.array(year_column).astype(np.int64)
+    months = np.array(month_column).astype(np.int64) - 1
+    categories = np.fromiter((category_index.get(name, -1) for name in category_column), dtype=np.int64,
+                             count=len(totals))
+    expected = np.column_stack((np.array(basic_column, dtype=np.float64),
+                                np.array(amending_column, dtype=np.float64)))
+
+    known = (categories >= 0) & (months >= 0) & (months < 12)
+    year_index = np.zeros(len(totals), dtype=np.int64)
+    if len(cube.years):
+        year_index = np.minimum(np.searchsorted(cube.years, years), len(cube.years) - 1)
+        known &= cube.years[year_index] == years
+    else:
+        known[:] = False
+    actual = np.zeros((len(totals), 2), dtype=np.float64)
+    actual[known] = parsed[year_index[known], months[known], categories[known]]
+
+    # The Total row with a single count has no amending total; it repeats the basic acts
+    amending_checked = ~np.isnan(expected[:, 1])
+    wrong = (expected[:, 0] != actual[:, 0]) | (amending_checked & (expected[:, 1] != actual[:, 1]))
+    examples = [f"{_month_label(totals[i][0], totals[i][1])} {totals[i][2]}: Total row says "
+                f"{totals[i][3] if totals[i][4] is None else f'{totals[i][3]}/{totals[i][4]}'}, "
+                f"parsed counts sum to {actual[i, 0]:g}/{actual[i, 1]:g} (basic/amending)"
+                for i in np.flatnonzero(wrong)[:MAX_EXAMPLES]]
+
+    has_total = np.zeros(has_counts.shape, dtype=bool)
+    has_total[year_index[known], months[known], categories[known]] = True
+    untotalled = has_counts & ~has_total
+    examples += [f"{_month_label(cube.years[y], m + 1)} {cube.categories[c]}: no Total row"
+                 for y, m, c in zip(*np.nonzero(untotalled))][:MAX_EXAMPLES]
+
+    return _check(len(totals) + has_counts.sum(), wrong.sum() + untotalled.sum(), examples)
+
+def check_missing_counts(cube):
+    """
+    Check that every parsed count is numeric.
+
+    Args:
+        cube (SnapshotCube): Cube of the parsed counts
+
+    Returns:
+        dict: Number of checked counts, problems and examples
+    """
+    pairs = cube.pairs()
+    examples = [f"{_month_label(cube.years[y], m + 1)} {pairs[a][0]} / {pairs[a][1]} ({snapshot_cube.TYPES[t]}): "
+                f"count is missing or not a number"
+                for y, m, a, t in zip(*np.nonzero(cube.missing))][:MAX_EXAMPLES]
+    return _check(cube.present.sum(), cube.missing.sum(), examples)
+
+def check_coverage(cube, previous=None):
+    """
+    Check that the export covers consecutive months and every month a previous export covered.
+
+    Counts of the previous export missing from months that are still
+    covered (e.g. after an act type was renamed or reclassified) are
+    reported as warnings.
+
+    Args:
+        cube (SnapshotCube): Cube of the parsed counts
+        previous (SnapshotCube): Cube of the previous snapshot, or None
+
+    Returns:
+        dict: Number of checked months, problems and examples
+    """
+    covered = cube.present.any(axis=(2, 3))
+    if not covered.any():
+        return _check(0, 1, ["The export has no counts"])
+
+    examples = []
+    problems = 0
+    # Years missing entirely do not appear on the year axis
+    for year, next_year in zip(cube.years[:-1], cube.years[1:]):
+        if next_year != year + 1:
+            problems += 1
+            examples.append(f"Years {int(year) + 1}-{int(next_year) - 1} are missing")
+
+    flat = covered.ravel()
+    first = int(np.argmax(flat))
+    last = len(flat) - 1 - int(np.argmax(flat[::-1]))
+    gaps = np.flatnonzero(~flat[first:last + 1]) + first
+    problems += len(gaps)
+    examples += [f"Month {_month_label(cube.years[i // 12], i % 12 + 1)} is missing" for i in gaps[:MAX_EXAMPLES]]
+
+    warnings = []
+    if previous is not None:
+        years = np.union1d(cube.years, previous.years)
+        pairs = sorted(set(cube.pairs()) | set(previous.pairs()))
+        present = cube.reindex(years, pairs)[1]
+        previous_present = previous.reindex(years, pairs)[1]
+
+        # Months of the previous export (e.g. trailing months of a truncated download) that are gone
+        month_present = present.any(axis=(2, 3))
+        lost_months = previous_present.any(axis=(2, 3)) & ~month_present
+        problems += int(lost_months.sum())
+        examples += [f"Month {_month_label(years[y], m + 1)} of the previous snapshot is missing"
+                     for y, m in zip(*np.nonzero(lost_months))][:MAX_EXAMPLES]
+
+        # Act types of the previous export missing from months that are still covered
+        lost = previous_present & ~present & month_present[:, :, None, None]
+        lost_pairs = lost.sum(axis=(0, 1, 3))
+        warnings = [f"{int(lost_pairs[a])} counts of {pairs[a][0]} / {pairs[a][1]} in the previous snapshot are missing"
+                    for a in np.flatnonzero(lost_pairs)]
+
+    return _check(last - first + 1, problems, examples, warnings)
+
+def malformed_export(error):
+    """
+    Return the validation report of an export whose rows could not be turned into a cube.
+
+    Args:
+        error (Exception): Error raised by SnapshotCube.from_columns (e.g. a non-numeric year)
+
+    Returns:
+        dict: Failed validation report (see validate_export)
+    """
+    return {'passed': False, 'checks': {'structure': _check(0, 1, [f"The export is malformed: {error}"])}}
+
+def validate_export(cube, totals, previous=None):
+    """
+    Validate a parsed export before it is written and published.
+
+    Args:
+        cube (SnapshotCube): Cube of the parsed counts
+        totals (list): Total rows collected by export_parser.parse_rows
+        previous (SnapshotCube): Cube of the previous snapshot, or None
+
+    Returns:
+        dict: 'passed' and the result of every check by name (with
+            examples of its problems and warnings)
+    """
+    checks = {
+        'totals': check_totals(cube, totals),
+        'missing_counts': check_missing_counts(cube),
+        'coverage': check_coverage(cube, previous)
+    }
+    return {'passed': not any(check['problems'] for check in checks.values()), 'checks': checks}
@@ -1,20 +1,162 @@
 import os
-import pandas as pd
 import glob
 import re
 import json
 import argparse
+import hashlib
+import functools
+import importlib.util
 from datetime import datetime
-from jinja2 import Template, FileSystemLoader, Environment
+import snapshot_store
+import columnar_store
+import snapshots
+import diff_snapshots
+import stats_data
+import stats_charts
+import instrumentation
 
-def generate_stats_page(csv_path, output_dir):
-    """Generate an HTML statistics page for a CSV file."""
-    df = pd.read_csv(csv_path)
+# numpy and pandas (via snapshot_cube) and jinja2 are imported where they are
+# used, so that --help and fully incremental builds start quickly
+
+# Directory containing the Jinja templates
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Maximum number of changed cells listed on a stats page
+CHANGES_LIMIT = 100
+
+# Name of the build manifest written to the output directory
+BUILD_MANIFEST = 'build_manifest.json'
+
+# Name of the run report (stage timings and counters) written to the output directory
+BUILD_REPORT = 'build_report.json'
+
+# Number of rows of the larger tables rendered into a stats page; the others
+# are loaded page by page from the snapshot's JSON data files
+INLINE_ROWS = 20
+
+# Elements whose content is whitespace-sensitive and left alone when minifying
+PRESERVED_ELEMENTS = re.compile(r'<(pre|textarea)\b.*?</\1\s*>', re.S | re.I)
+
+@functools.lru_cache(maxsize=None)
+def get_template_environment():
+    """Return the Jinja environment, created (and its templates compiled) once per process."""
+    from jinja2 import FileSystemLoader, Environment
+    
+    return Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+
+def _strip_lines(text):
+    """Remove indentation and blank lines, keeping a line break where whitespace separated text."""
+    stripped = '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+    if stripped and text[:1].isspace():
+        stripped = '\n' + stripped
+    if stripped and text[-1:].isspace():
+        stripped += '\n'
+    return stripped or ('\n' if text and text.isspace() else text)
+
+def minify_html(html):
+    """
+    Minify rendered HTML by removing indentation and blank lines.
+    
+    Line breaks between non-blank lines are kept, so text and inline
+    scripts read exactly as before; <pre> and <textarea> content is kept as is.
+    """
+    parts = []
+    position = 0
+    for match in PRESERVED_ELEMENTS.finditer(html):
+        parts.append(_strip_lines(html[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_strip_lines(html[position:]))
+    return ''.join(parts)
+
+def _hash_files(paths):
+    """Return a SHA-256 hex digest over the names and contents of files (missing ones included)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8') + b'\0')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        else:
+            digest.update(b'-')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def build_versions():
+    """
+    Return the hashes of the templates and of the page generation code.
+    
+    A page built with other versions is rebuilt by an incremental build.
+    """
+    templates = sorted(glob.glob(os.path.join(TEMPLATE_DIR, '*.html')))
+    # Modules are located without importing them
+    modules = [os.path.abspath(__file__)] + [os.path.abspath(importlib.util.find_spec(name).origin) for name in (
+        'snapshot_store', 'columnar_store', 'snapshots', 'diff_snapshots', 'snapshot_cube', 'stats_data', 'stats_charts')]
+    return {
+        'template_hash': _hash_files(templates),
+        'code_version': _hash_files(modules)
+    }
+
+def snapshot_input_hash(csv_path, previous_csv_path=None):
+    """
+    Return a hash over every input a snapshot's stats page is rendered from.
+    
+    This covers the data (CSV, packed CSV manifest or Parquet file), the DOI
+    metadata, which downloadable files exist and the data of the previous
+    snapshot the changes are computed against.
+    
+    Args:
+        csv_path (str): Path to the long-format CSV file of the snapshot
+        previous_csv_path (str): Path to the previous snapshot's CSV file, if any
+    
+    Returns:
+        str: SHA-256 hex digest
+    """
+    snapshot = snapshots.load_snapshot(csv_path)
+    files_hash = _hash_files([
+        csv_path,
+        csv_path + snapshot_store.MANIFEST_SUFFIX,
+        columnar_store.parquet_path_for(csv_path),
+        csv_path.replace('.csv', '_metadata.json')
+    ] + ([previous_csv_path, previous_csv_path + snapshot_store.MANIFEST_SUFFIX] if previous_csv_path else []))
+    downloads = f"raw={snapshot.raw_csv_path is not None},parsecode={snapshot.parsing_code_path is not None}"
+    return hashlib.sha256((files_hash + downloads).encode('utf-8')).hexdigest()
+
+def load_build_manifest(output_dir):
+    """Return the build manifest of an output directory, or None if there is none."""
+    manifest_path = os.path.join(output_dir, BUILD_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+def write_build_manifest(output_dir, versions, pages):
+    """
+    Write the build manifest of an output directory.
+    
+    Args:
+        output_dir (str): Directory for output HTML files
+        versions (dict): Template and code hashes (see build_versions)
+        pages (dict): Per input CSV (relative path): input_hash and page summary
+    """
+    manifest_path = os.path.join(output_dir, BUILD_MANIFEST)
+    with open(manifest_path, 'w') as f:
+        json.dump({**versions, 'pages': pages}, f, indent=2, sort_keys=True)
+
+def generate_stats_page(csv_path, output_dir, previous_csv_path=None):
+    """
+    Generate an HTML statistics page for a CSV file, with its changes since previous_csv_path if given.
+    
+    The statistics are aggregated from the snapshot's cube (see snapshot_cube)
+    and also written as JSON data files (see stats_data). The page's charts
+    are inline SVG rendered here (see stats_charts).
+    """
+    import snapshot_cube
+    
+    cube = snapshot_cube.load_snapshot_cube(csv_path)
     
     # Extract parsing timestamp if available
-    parsing_timestamp = None
-    if 'parsing_date' in df.columns:
-        parsing_timestamp = df['parsing_date'].iloc[0]
+    parsing_timestamp = cube.parsing_timestamp
     
     # Extract filename without extension
     filename = os.path.basename(csv_path)
@@ -30,17 +172,13 @@ def generate_stats_page(csv_path, output_dir):
             if not parsing_timestamp and 'parsing_timestamp' in doi_info:
                 parsing_timestamp = doi_info['parsing_timestamp']
     
-    raw_csv_fallback = base_name + "_raw.csv"
-    parsing_code_fallback = base_name + "_parsecode.py"
-
-    raw_csv_path = os.path.join(os.path.dirname(csv_path), raw_csv_fallback)
-    parse_code_path = os.path.join(os.path.dirname(csv_path), parsing_code_fallback)
+    snapshot = snapshots.load_snapshot(csv_path)
 
     raw_csv_filename = doi_info.get('raw_csv_filename') if doi_info else (
-        raw_csv_fallback if os.path.exists(raw_csv_path) else None
+        base_name + "_raw.csv" if snapshot.raw_csv_path else None
     )
     parsing_code_filename = doi_info.get('parsing_code_filename') if doi_info else (
-        parsing_code_fallback if os.path.exists(parse_code_path) else None
+        base_name + "_parsecode.py" if snapshot.parsing_code_path else None
     )
 
     # Extract date from filename (format: YYYYMMDD_HHMMSS.csv)
@@ -74,57 +212,41 @@ def generate_stats_page(csv_path, output_dir):
     if parsing_timestamp and "Parsed:" in title:
         title = title.replace(" - Parsed: " + str(parsing_timestamp), "")
     
-    # Calculate summary statistics
-    total_acts = df['count'].sum()
-    basic_acts = df[df['type'] == 'basic']['count'].sum()
-    amending_acts = df[df['type'] == 'amending']['count'].sum()
-    
-    # Calculate yearly statistics
-    yearly_stats = {}
-    for year in sorted(df['year'].unique()):
-        year_df = df[df['year'] == year]
-        yearly_stats[year] = {
-            'basic': year_df[year_df['type'] == 'basic']['count'].sum(),
-            'amending': year_df[year_df['type'] == 'amending']['count'].sum(),
-            'total': year_df['count'].sum()
-        }
-    
-    # Calculate category statistics
-    category_stats = {}
-    for category in sorted(df['category'].unique()):
-        cat_df = df[df['category'] == category]
-        category_stats[category] = {
-            'basic': cat_df[cat_df['type'] == 'basic']['count'].sum(),
-            'amending': cat_df[cat_df['type'] == 'amending']['count'].sum(),
-            'total': cat_df['count'].sum()
-        }
-    
-    # Calculate detailed statistics
-    detailed_stats = {}
-    for category in sorted(df['category'].unique()):
-        detailed_stats[category] = {}
-        cat_df = df[df['category'] == category]
-        for act_type in sorted(cat_df['act_type'].unique()):
-            act_df = cat_df[cat_df['act_type'] == act_type]
-            detailed_stats[category][act_type] = {
-                'basic': act_df[act_df['type'] == 'basic']['count'].sum(),
-                'amending': act_df[act_df['type'] == 'amending']['count'].sum(),
-                'total': act_df['count'].sum()
-            }
+    # Calculate summary, yearly, category and detailed statistics
+    stats = cube.stats()
+    
+    # Compare with the previous snapshot, if there is one
+    changes = None
+    if previous_csv_path:
+        changes = diff_snapshots.diff_summary(diff_snapshots.diff_snapshots(previous_csv_path, csv_path),
+                                              limit=CHANGES_LIMIT)
+        changes['previous_name'] = os.path.splitext(os.path.basename(previous_csv_path))[0]
+    
+    # The larger tables are only partly rendered and loaded from these files
+    data_files = stats_data.write_snapshot_data(output_dir, base_name, stats, parsing_timestamp,
+                                                doi_info['doi'] if doi_info else None, changes)
+    parts = stats_data.snapshot_parts(base_name, stats)
+    charts = stats_charts.snapshot_charts(output_dir, base_name, parts['years'], parts['categories'])
+    # Most recent years first, so that the inline rows are the ones readers look for
+    yearly_rows = list(reversed(stats['yearly_stats'].items()))
+    detailed_rows = [(category, act_type, counts)
+                     for category, types in stats['detailed_stats'].items()
+                     for act_type, counts in types.items()]
     
     # Load and render the template with better template path handling
-    env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')))
-    template = env.get_template('stats_page.html')
+    template = get_template_environment().get_template('stats_page.html')
     
     html = template.render(
         title=title,
         period=period,
-        total_acts=total_acts,
-        basic_acts=basic_acts,
-        amending_acts=amending_acts,
-        yearly_stats=yearly_stats,
-        category_stats=category_stats,
-        detailed_stats=detailed_stats,
+        **stats,
+        changes=changes,
+        charts=charts,
+        change_rows=stats_data.change_rows(changes) if changes else [],
+        changes_limit=CHANGES_LIMIT,
+        yearly_rows=yearly_rows,
+        detailed_rows=detailed_rows,
+        inline_rows=INLINE_ROWS,
         doi_info=doi_info,
         csv_filename=filename,
         raw_csv_filename=raw_csv_filename,
@@ -144,7 +266,7 @@ def generate_stats_page(csv_path, output_dir):
 
     output_filename = os.path.join(output_dir, out_name)
     with open(output_filename, 'w') as f:
-        f.write(html)
+        f.write(minify_html(html))
     
     # Extract date for sorting purposes
     parsing_date = None
@@ -159,11 +281,13 @@ def generate_stats_page(csv_path, output_dir):
         'parsing_date': parsing_date,
         'doi': doi_info['doi'] if doi_info else None,
         'csv_filename': filename,
-        'parsing_timestamp': parsing_timestamp
+        'parsing_timestamp': parsing_timestamp,
+        'totals': stats_data.totals(stats),
+        'data_files': data_files
     }
 
-def generate_index_page(stats_files, output_dir):
-    """Generate the main index.html page with links to all stats pages."""
+def generate_index_page(stats_files, output_dir, root_index=True):
+    """Generate the main index.html page with links to all stats pages (also in the project root if root_index)."""
     # Sort files by parsing timestamp or parsing date (most recent first)
     def sort_key(x):
         # First try parsing_timestamp (full datetime)
@@ -179,11 +303,10 @@ def generate_index_page(stats_files, output_dir):
     sorted_files = sorted(stats_files, key=sort_key, reverse=True)
     
     # Load the template
-    env = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')))
-    template = env.get_template('index.html')
+    template = get_template_environment().get_template('index.html')
     
     # Render the template
-    html = template.render(stats_files=sorted_files)
+    html = minify_html(template.render(stats_files=sorted_files))
     
     # Write to HTML file
     output_filename = os.path.join(output_dir, 'index.html')
@@ -191,41 +314,148 @@ def generate_index_page(stats_files, output_dir):
         f.write(html)
     
     # Also write to project root for GitHub Pages
-    root_index_path = os.path.join(os.path.dirname(__file__), 'index.html')
-    with open(root_index_path, 'w') as f:
-        f.write(html)
+    if root_index:
+        root_index_path = os.path.join(os.path.dirname(__file__), 'index.html')
+        with open(root_index_path, 'w') as f:
+            f.write(html)
     
     return output_filename
 
+def _init_worker():
+    """Compile the stats page template once when a worker process starts."""
+    get_template_environment().get_template('stats_page.html')
+
+def _build_stats_page(csv_path, output_dir, previous_csv_path=None):
+    """
+    Generate a stats page, catching errors so that one bad file doesn't stop the others.
+    
+    Returns:
+        tuple: Page summary (dict or None) and error message (str or None)
+    """
+    try:
+        return generate_stats_page(csv_path, output_dir, previous_csv_path), None
+    except Exception as e:
+        return None, str(e)
+
+def build_stats_pages(csv_paths, output_dir, jobs=1, previous_csv_paths=None):
+    """
+    Generate the stats pages of several CSV files, optionally in a process pool.
+    
+    Args:
+        csv_paths (list): Paths to long-format CSV files
+        output_dir (str): Directory for output HTML files
+        jobs (int): Number of worker processes (0: one per CPU, 1: no pool)
+        previous_csv_paths (list): Path to the previous snapshot's CSV file (or None) for each CSV file
+    
+    Returns:
+        list: (page summary, error message) for each CSV file, in input order
+    """
+    previous_csv_paths = previous_csv_paths or [None] * len(csv_paths)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(csv_paths) < 2:
+        return [_build_stats_page(csv_path, output_dir, previous_csv_path)
+                for csv_path, previous_csv_path in zip(csv_paths, previous_csv_paths)]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with ProcessPoolExecutor(max_workers=min(jobs, len(csv_paths)), initializer=_init_worker) as pool:
+        return list(pool.map(_build_stats_page, csv_paths, [output_dir] * len(csv_paths), previous_csv_paths))
+
 def main():
     """Main function to generate all statistics pages."""
     parser = argparse.ArgumentParser(description='Generate statistics pages from CSV files.')
     parser.add_argument('--input', '-i', default='cache', help='Directory containing CSV files')
     parser.add_argument('--output', '-o', default='stats_pages', help='Directory for output HTML files')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only rebuild pages whose inputs, templates or code changed since the last build')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of worker processes generating pages (0: one per CPU)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Record the peak memory of every stage in the run report (slower)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run and list the slowest functions in the run report')
     args = parser.parse_args()
     
+    report = instrumentation.start_run('generate_stats_pages', trace_memory=args.trace_memory, profile=args.profile)
+    report.set('jobs', args.jobs)
+    report.set('incremental', args.incremental)
+    
     # Create output directory if it doesn't exist
     os.makedirs(args.output, exist_ok=True)
     
-    # Find all CSV files
-    csv_files = glob.glob(os.path.join(args.input, '**', '*.csv'), recursive=True)
+    # Find the parsed CSV file of every snapshot (raw exports are not stats pages)
+    with instrumentation.stage('discover'):
+        csv_files = [snapshot.csv_path for snapshot in snapshots.discover_snapshots(args.input)]
     
-    # Filter out metadata files
-    csv_files = [f for f in csv_files if not f.endswith('_metadata.csv')]
+    # Pages from the last build can be reused if they were built with the same templates and code
+    versions = build_versions()
+    previous_pages = {}
+    if args.incremental:
+        manifest = load_build_manifest(args.output)
+        if manifest and all(manifest.get(key) == value for key, value in versions.items()):
+            previous_pages = manifest.get('pages', {})
     
-    # Generate a stats page for each CSV file
+    # Find the CSV files whose stats page is new or changed
     stats_files = []
-    for csv_file in csv_files:
-        try:
-            stats_file = generate_stats_page(csv_file, args.output)
-            stats_files.append(stats_file)
-            print(f"Generated stats page for {csv_file}")
-        except Exception as e:
-            print(f"Error generating stats page for {csv_file}: {e}")
-    
-    # Generate the index page
-    index_path = generate_index_page(stats_files, args.output)
+    pages = {}
+    reused = 0
+    to_build = []
+    with instrumentation.stage('hash_inputs'):
+        for csv_file, previous_csv in zip(csv_files, [None] + csv_files[:-1]):
+            key = os.path.relpath(csv_file, args.input).replace(os.sep, '/')
+            input_hash = snapshot_input_hash(csv_file, previous_csv)
+            
+            previous = previous_pages.get(key)
+            if previous and previous['input_hash'] == input_hash and \
+                    os.path.exists(os.path.join(args.output, os.path.basename(previous['summary']['path']))) and \
+                    stats_data.snapshot_data_exists(args.output, previous['summary']['id']):
+                stats_files.append(previous['summary'])
+                pages[key] = previous
+                reused += 1
+            else:
+                to_build.append((key, csv_file, previous_csv, input_hash))
+    
+    # Generate their stats pages, in parallel if requested
+    with instrumentation.stage('build_pages'):
+        results = build_stats_pages([csv_file for _, csv_file, _, _ in to_build], args.output, jobs=args.jobs,
+                                    previous_csv_paths=[previous_csv for _, _, previous_csv, _ in to_build])
+    
+    # Report results and errors in input order, however the pages were scheduled
+    errors = []
+    for (key, csv_file, _, input_hash), (stats_file, error) in zip(to_build, results):
+        if error:
+            errors.append((csv_file, error))
+            print(f"Error generating stats page for {csv_file}: {error}")
+            continue
+        stats_files.append(stats_file)
+        pages[key] = {'input_hash': input_hash, 'summary': stats_file}
+        print(f"Generated stats page for {csv_file}")
+    
+    if errors:
+        print(f"Failed to generate {len(errors)} of {len(to_build)} stats pages")
+    
+    if args.incremental:
+        print(f"Reused {reused} unchanged stats pages")
+    
+    report.count('pages_built', len(to_build) - len(errors))
+    report.count('pages_reused', reused)
+    report.count('page_errors', len(errors))
+    
+    # Generate the index page from the summaries of all pages
+    with instrumentation.stage('index'):
+        index_path = generate_index_page(stats_files, args.output)
     print(f"Generated index page at {index_path}")
+    
+    # List every snapshot's totals and JSON data files in one manifest
+    with instrumentation.stage('data_manifest'):
+        manifest_path = stats_data.write_manifest(args.output, stats_files)
+    print(f"Generated data manifest at {manifest_path}")
+    
+    write_build_manifest(args.output, versions, pages)
+    
+    report_path = os.path.join(args.output, BUILD_REPORT)
+    instrumentation.finish_run(report, report_path)
+    print(f"Run report saved to {report_path}")
 
 if __name__ == '__main__':
     main()
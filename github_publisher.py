@@ -1,12 +1,19 @@
 import os
-import requests
+import re
+import time
 from datetime import datetime
-import base64
+from concurrent.futures import ThreadPoolExecutor
+from http_session import create_session, FileUpload, print_progress
+import instrumentation
+
+# Status codes of asset uploads that are repeated (if the asset was not created after all)
+UPLOAD_RETRY_STATUS_CODES = frozenset([500, 502, 503, 504])
 
 class GitHubPublisher:
     """Class to handle publishing datasets as GitHub releases."""
     
-    def __init__(self, token=None, repo_owner=None, repo_name=None):
+    def __init__(self, token=None, repo_owner=None, repo_name=None, api_url="https://api.github.com",
+                 session=None, max_workers=4, progress=print_progress, upload_retries=3, retry_backoff=1):
         """
         Initialize the GitHub publisher.
         
@@ -14,6 +21,13 @@ class GitHubPublisher:
             token (str): GitHub API token
             repo_owner (str): GitHub repository owner
             repo_name (str): GitHub repository name
+            api_url (str): Base URL of the GitHub API (e.g. a local mock server for testing)
+            session (requests.Session): Session to send requests with (default: pooled, retrying session)
+            max_workers (int): Maximum number of assets uploaded concurrently
+            progress (callable): Called with (filename, bytes sent, total bytes) during uploads, or None
+            upload_retries (int): Number of times an asset upload failing with a read error or a
+                5xx response is repeated, if the asset was not created
+            retry_backoff (float): Base of the exponential backoff between upload attempts in seconds
         """
         self.token = token or os.environ.get('GITHUB_TOKEN')
         if not self.token:
@@ -33,7 +47,12 @@ class GitHubPublisher:
             if not self.repo_owner or not self.repo_name:
                 raise ValueError("Repository owner and name are required")
         
-        self.base_url = f"https://api.github.com/repos/{self.repo_owner}/{self.repo_name}"
+        self.base_url = f"{api_url.rstrip('/')}/repos/{self.repo_owner}/{self.repo_name}"
+        self.session = session or create_session()
+        self.max_workers = max_workers
+        self.progress = progress
+        self.upload_retries = upload_retries
+        self.retry_backoff = retry_backoff
         self.headers = {
             "Accept": "application/vnd.github+json",
             "Authorization": f"Bearer {self.token}",
@@ -66,7 +85,7 @@ class GitHubPublisher:
         
         # Add DOI information if available
         if doi:
-            body += f"\n\n## Digital Object Identifier\n\nThis dataset is also available with DOI: [{doi}](https://doi.org/{doi})"
+            body += self._doi_section(doi)
         
         # Create the release
         payload = {
@@ -77,44 +96,138 @@ class GitHubPublisher:
             "prerelease": prerelease
         }
         
-        response = requests.post(
-            f"{self.base_url}/releases",
-            headers=self.headers,
-            json=payload
-        )
-        response.raise_for_status()
+        with instrumentation.stage('github.release'):
+            response = self.session.post(
+                f"{self.base_url}/releases",
+                headers=self.headers,
+                json=payload
+            )
+            response.raise_for_status()
         release_data = response.json()
         
-        # Upload asset if provided
-        if csv_path and os.path.exists(csv_path):
-            self._upload_asset(release_data["upload_url"], csv_path)
-        
-        if additional_files:
-            for f in additional_files:
-                if f and os.path.exists(f):
-                    self._upload_asset(release_data["upload_url"], f)
+        # Upload the CSV file and any additional files concurrently
+        files = [f for f in [csv_path] + list(additional_files or []) if f and os.path.exists(f)]
+        with instrumentation.stage('github.upload'):
+            self.upload_assets(release_data["upload_url"], files)
         
         return release_data
     
+    def add_doi(self, release_data, doi):
+        """
+        Add DOI information to the notes of an existing release.
+        
+        Lets a release be created while its DOI is still being minted.
+        
+        Args:
+            release_data (dict): Release data from GitHub API
+            doi (str): DOI to include in release notes
+            
+        Returns:
+            dict: Updated release data from GitHub API
+        """
+        with instrumentation.stage('github.add_doi'):
+            response = self.session.patch(
+                f"{self.base_url}/releases/{release_data['id']}",
+                headers=self.headers,
+                json={"body": (release_data.get("body") or "") + self._doi_section(doi)}
+            )
+            response.raise_for_status()
+        return response.json()
+    
+    @staticmethod
+    def _doi_section(doi):
+        """Return the release notes section announcing a DOI."""
+        return f"\n\n## Digital Object Identifier\n\nThis dataset is also available with DOI: [{doi}](https://doi.org/{doi})"
+    
+    def upload_assets(self, upload_url, file_paths):
+        """
+        Upload several assets to a GitHub release concurrently.
+        
+        All uploads are attempted; the first error (if any) is raised once they
+        have finished.
+        
+        Args:
+            upload_url (str): GitHub upload URL for the release
+            file_paths (list): Paths to the files to upload
+            
+        Returns:
+            list: Asset data from GitHub API, in the order of file_paths
+        """
+        if not file_paths:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(file_paths))) as pool:
+            futures = [pool.submit(self._upload_asset, upload_url, f) for f in file_paths]
+        
+        for future in futures:
+            if future.exception():
+                raise future.exception()
+        return [future.result() for future in futures]
+    
+    def _find_asset(self, upload_url, filename):
+        """Return the asset of a release with the given file name, or None if there is none."""
+        match = re.search(r'/releases/(\d+)/assets', upload_url)
+        if not match:
+            return None
+        response = self.session.get(f"{self.base_url}/releases/{match.group(1)}/assets", headers=self.headers)
+        if not response.ok:
+            return None
+        return next((asset for asset in response.json() if asset.get("name") == filename), None)
+    
+    def _delete_asset(self, asset):
+        """Delete an asset of a release (e.g. the remains of a failed upload)."""
+        response = self.session.delete(f"{self.base_url}/releases/assets/{asset['id']}", headers=self.headers)
+        response.raise_for_status()
+    
     def _upload_asset(self, upload_url, file_path):
         """
         Upload an asset to a GitHub release.
         
+        The upload is a POST, which the session does not repeat after a read
+        error or a 5xx response: GitHub may have created the asset anyway. It
+        is repeated here only if the release has no completely uploaded asset
+        of that name; an incomplete ("starter") asset is deleted first.
+        
         Args:
             upload_url (str): GitHub upload URL for the release
             file_path (str): Path to the file to upload
         """
+        import requests
+        
         filename = os.path.basename(file_path)
         # Remove the {?name,label} template parameter
-        upload_url = upload_url.split("{")[0] + f"?name={filename}"
+        upload_url = upload_url.split("{")[0]
         
-        with open(file_path, "rb") as file:
+        with FileUpload(file_path, progress=self.progress) as body:
             headers = {**self.headers, "Content-Type": "application/octet-stream"}
-            response = requests.post(
-                upload_url,
-                headers=headers,
-                data=file
-            )
-            response.raise_for_status()
+            for attempt in range(self.upload_retries + 1):
+                last_attempt = attempt == self.upload_retries
+                try:
+                    response = self.session.post(
+                        upload_url,
+                        params={"name": filename},
+                        headers=headers,
+                        data=body
+                    )
+                except (requests.ConnectionError, requests.Timeout):
+                    if last_attempt:
+                        raise
+                else:
+                    if last_attempt or response.status_code not in UPLOAD_RETRY_STATUS_CODES:
+                        response.raise_for_status()
+                        asset = response.json()
+                        break
+                
+                # GitHub may have created the asset before the error
+                asset = self._find_asset(upload_url, filename)
+                if asset and asset.get("state") == "uploaded":
+                    break
+                if asset:
+                    # A partial upload is kept as a "starter" asset, which would make the next upload fail
+                    self._delete_asset(asset)
+                time.sleep(self.retry_backoff * 2 ** attempt)
+                body.seek(0)
+        instrumentation.count('github.uploaded_files')
+        instrumentation.count('github.uploaded_bytes', body.total)
         
-        return response.json()
+        return asset
@@ -0,0 +1,127 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP status codes on which a request is retried instead of failing
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+class SafeRetry(Retry):
+    """
+    Retry policy that only repeats requests which cannot take effect twice.
+
+    Idempotent methods (GET, HEAD, PUT, DELETE, ...) are retried on
+    connection and read errors and on RETRY_STATUS_CODES. Other methods
+    (e.g. the POST creating a deposit or a release) may have been processed
+    by the server before a read error or a 5xx response, so they are only
+    retried when the server cannot have processed them: on connection
+    errors and on 429 Too Many Requests.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and not self._is_method_retryable(method):
+            return bool(self.total)
+        return super().is_retry(method, status_code, has_retry_after)
+
+def create_session(retries=5, backoff_factor=1, pool_size=10):
+    """
+    Create a requests session with pooled connections and automatic retries.
+
+    Requests failing with a connection error or a 429 response are retried
+    with exponential backoff (backoff_factor * 2 ** attempt seconds),
+    honouring Retry-After headers; idempotent requests are also retried on
+    read errors and 5xx responses (see SafeRetry).
+
+    Args:
+        retries (int): Maximum number of retries per request
+        backoff_factor (float): Base of the exponential backoff in seconds
+        pool_size (int): Maximum number of pooled connections per host
+
+    Returns:
+        requests.Session: The configured session
+    """
+    retry = SafeRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def print_progress(filename, sent, total):
+    """Default progress callback: print upload progress in steps of 25%."""
+    if total:
+        print(f"Uploading {filename}: {sent * 100 // total}% ({sent}/{total} bytes)")
+    else:
+        print(f"Uploaded {filename}")
+
+class FileUpload:
+    """File-like request body that streams a file in chunks and reports progress."""
+
+    def __init__(self, path, progress=print_progress, chunk_size=1024 * 1024, steps=4):
+        """
+        Open a file for uploading.
+
+        Args:
+            path (str): Path to the file to upload
+            progress (callable): Called with (filename, bytes sent, total bytes), or None
+            chunk_size (int): Maximum number of bytes read at once
+            steps (int): Number of progress reports over the whole file
+        """
+        self.filename = os.path.basename(path)
+        self.total = os.path.getsize(path)
+        self.progress = progress
+        self.chunk_size = chunk_size
+        self.step = max(self.total // steps, 1)
+        self._file = open(path, 'rb')
+        self._reported = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        # Lets requests send a Content-Length header instead of a chunked body
+        return self.total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read(self, size=-1):
+        """Read the next chunk of the file."""
+        if size is None or size < 0 or size > self.chunk_size:
+            size = self.chunk_size
+        data = self._file.read(size)
+        self._report(self._file.tell())
+        return data
+
+    def tell(self):
+        return self._file.tell()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        # Called by urllib3 to rewind the body before a retry
+        position = self._file.seek(offset, whence)
+        with self._lock:
+            self._reported = min(self._reported, position)
+        return position
+
+    def close(self):
+        self._file.close()
+
+    def _report(self, sent):
+        """Report progress whenever another step of the file has been read."""
+        if not self.progress:
+            return
+        with self._lock:
+            if sent < self.total and sent - self._reported < self.step:
+                return
+            if sent == self._reported:
+                return
+            self._reported = sent
+        self.progress(self.filename, sent, self.total)
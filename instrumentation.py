@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+import contextlib
+from datetime import datetime
+
+# Number of functions listed in a run report when profiling
+PROFILE_TOP_FUNCTIONS = 25
+
+class RunReport:
+    """Class to collect the stage timings, counters and optional memory and profile data of one run."""
+
+    def __init__(self, name, trace_memory=False, profile=False):
+        """
+        Start a run report.
+
+        Args:
+            name (str): Name of the run (e.g. parse or generate_stats_pages)
+            trace_memory (bool): Whether to record the peak Python memory of
+                every stage with tracemalloc (slows the run down)
+            profile (bool): Whether to profile the run with cProfile
+        """
+        self.name = name
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.stages = []
+        self.counters = {}
+        self.info = {}
+        self.trace_memory = trace_memory
+        self.profiler = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+        if trace_memory:
+            import tracemalloc
+            tracemalloc.start()
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage of the run.
+
+        Stages may overlap (e.g. uploads running in threads); with
+        trace_memory, the peak memory of overlapping stages is shared.
+
+        Args:
+            name (str): Name of the stage (e.g. zenodo.upload)
+        """
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            record = {
+                'name': name,
+                'start': round(started - self._start, 6),
+                'seconds': round(time.perf_counter() - started, 6),
+                'thread': threading.current_thread().name
+            }
+            if self.trace_memory:
+                import tracemalloc
+                record['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+            if failed:
+                record['failed'] = True
+            with self._lock:
+                self.stages.append(record)
+
+    def count(self, name, value=1):
+        """Add value to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """Record a piece of information about the run (e.g. the snapshot name)."""
+        with self._lock:
+            self.info[name] = value
+
+    def _profile_summary(self):
+        """Return the functions with the highest cumulative time, if the run was profiled."""
+        import pstats
+
+        self.profiler.disable()
+        stats = pstats.Stats(self.profiler)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [{
+            'function': f"{os.path.basename(filename)}:{line}({function})",
+            'calls': calls,
+            'total_seconds': round(total_time, 6),
+            'cumulative_seconds': round(cumulative_time, 6)
+        } for (filename, line, function), (_, calls, total_time, cumulative_time, _) in functions[:PROFILE_TOP_FUNCTIONS]]
+
+    def finish(self):
+        """
+        Stop the run and return its report.
+
+        Returns:
+            dict: JSON-serializable run report
+        """
+        report = {
+            'name': self.name,
+            'started_at': self.started_at,
+            'seconds': round(time.perf_counter() - self._start, 6),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'info': self.info,
+            'stages': sorted(self.stages, key=lambda stage: stage['start']),
+            'counters': self.counters
+        }
+
+        if self.trace_memory:
+            import tracemalloc
+            report['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+            tracemalloc.stop()
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            report['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+        except ImportError:
+            pass
+        if self.profiler:
+            report['profile'] = self._profile_summary()
+        return report
+
+# The report of the run in progress, shared by all threads
+_active = None
+
+def start_run(name, trace_memory=False, profile=False):
+    """Start recording a run; stage() and count() record into it until finish_run()."""
+    global _active
+    _active = RunReport(name, trace_memory=trace_memory, profile=profile)
+    return _active
+
+def finish_run(report, path=None):
+    """
+    Stop recording a run, writing its report to path if given.
+
+    Args:
+        report (RunReport): Report returned by start_run
+        path (str): Path to write the JSON run report to
+
+    Returns:
+        dict: JSON-serializable run report
+    """
+    global _active
+    if _active is report:
+        _active = None
+    data = report.finish()
+    if path:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+    return data
+
+def stage(name):
+    """Time a stage of the run in progress (does nothing if no run is being recorded)."""
+    return _active.stage(name) if _active else contextlib.nullcontext()
+
+def count(name, value=1):
+    """Add value to a counter of the run in progress (does nothing if no run is being recorded)."""
+    if _active:
+        _active.count(name, value)
@@ -1,35 +1,427 @@
-import pandas as pd
 import argparse
+import csv
 import os
-import requests
 import json
 import shutil
-from io import StringIO
+import time
+import codecs
+import gzip
+import hashlib
 from datetime import datetime
+from dataclasses import dataclass
+from typing import Optional
+import snapshot_store
+import columnar_store
+import snapshots
+import diff_snapshots
+import instrumentation
+from export_parser import COLUMNS, parse_export_blocks
 
-def parse_csv(input_path, output_path, generate_doi=False, zenodo_token=None, sandbox=True, metadata=None, 
-             create_github_release=False, github_token=None, github_repo_owner=None, github_repo_name=None,
-             include_parsing_code=False, parsing_code_path="parse_legal_acts_statistics.py"):
+# pandas, requests and the publishers are imported by the stages that need
+# them, so that importing the parser stays cheap
+
+@dataclass(frozen=True)
+class FetchOptions:
+    """How parse_csv downloads an export and whether it skips unchanged exports."""
+
+    # Connect/read timeout in seconds when downloading from a URL
+    timeout: float = 60
+    # Number of times an interrupted download is resumed
+    retries: int = 3
+    # Whether to skip writing and publishing if the export (or every parsed
+    # count) is unchanged since the latest snapshot
+    skip_unchanged: bool = False
+
+@dataclass(frozen=True)
+class OutputOptions:
+    """Which checks parse_csv runs and which files it writes besides the long-format CSV file."""
+
+    # Whether to validate the parsed export before writing and publishing it
+    validate: bool = True
+    # Whether to also write a compact Parquet file (requires pyarrow)
+    parquet: bool = False
+    # Path to a time-series database to add the snapshot to
+    timeseries_db: Optional[str] = None
+    # Whether to store the CSV files as deduplicated blocks (see snapshot_store) once they have been published
+    pack: bool = False
+
+@dataclass(frozen=True)
+class PublishOptions:
+    """Where parse_csv publishes a snapshot (see publish_pipeline.create_publishers)."""
+
+    generate_doi: bool = False
+    zenodo_token: Optional[str] = None
+    sandbox: bool = True
+    # Additional metadata for DOI generation
+    metadata: Optional[dict] = None
+    create_github_release: bool = False
+    github_token: Optional[str] = None
+    github_repo_owner: Optional[str] = None
+    github_repo_name: Optional[str] = None
+    # Whether to include the parsing code in the snapshot, read from parsing_code_path
+    include_parsing_code: bool = False
+    parsing_code_path: str = "parse_legal_acts_statistics.py"
+
+@dataclass(frozen=True)
+class RunOptions:
+    """What parse_csv records in its run report besides the stage timings (see instrumentation)."""
+
+    # Whether to record the peak memory of every stage
+    trace_memory: bool = False
+    # Whether to profile the run and list the slowest functions
+    profile: bool = False
+
+def open_raw_text(path):
+    """
+    Open a raw EUR-Lex statistics export as text, without its byte order mark.
+    
+    Args:
+        path (str): Path to the raw CSV file (which may be packed into blocks)
+    
+    Returns:
+        file: Text stream over the export's lines
+    """
+    if not os.path.exists(path):
+        return snapshot_store.open_text(path)
+    return open(path, newline='', encoding='utf-8-sig')
+
+def read_raw_rows(path):
+    """
+    Read the rows of a raw EUR-Lex statistics export.
+    
+    Args:
+        path (str): Path to the raw CSV file (which may be packed into blocks)
+    
+    Returns:
+        list: Rows as lists of strings
+    """
+    with open_raw_text(path) as f:
+        return list(csv.reader(f))
+
+def block_index_path(csv_path):
+    """Return the path of the block index belonging to a long-format CSV file."""
+    return os.path.splitext(csv_path)[0] + '_blocks.json.gz'
+
+def block_index_bytes(block_index):
+    """Serialize a block index (see export_parser.parse_export_blocks) as deterministic gzip-compressed JSON."""
+    data = {'parser': block_index['parser'], 'blocks': block_index['blocks']}
+    return gzip.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'), mtime=0)
+
+def load_block_index(path):
+    """Return the block index stored at path, or None if there is none or it cannot be read."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable block index {path}: {e}")
+        return None
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_previous_validators(cache_dir, exclude=None):
+    """
+    Find the fetch validators of the most recent snapshot in a cache directory.
+    
+    Snapshots written before validators were stored only get a content hash,
+    computed from their raw export.
+    
+    Args:
+        cache_dir (str): Directory containing snapshot folders
+        exclude (str): Snapshot folder name to ignore (the one being written)
+    
+    Returns:
+        dict: Validators (etag, last_modified, sha256) or None if there is no snapshot
+    """
+    for snapshot in reversed(snapshots.discover_snapshots(cache_dir)):
+        if snapshot.name == exclude:
+            continue
+        if snapshot.fetch_path:
+            with open(snapshot.fetch_path, 'r') as f:
+                return json.load(f)
+        if snapshot.raw_csv_path:
+            return {'sha256': hashlib.sha256(snapshot_store.read_bytes(snapshot.raw_csv_path)).hexdigest()}
+    return None
+
+class ExportChangedError(Exception):
+    """Raised when an export changes on the server while its interrupted download is resumed."""
+
+def stream_export(url, raw_csv_filename, timeout=60, retries=3, chunk_size=64 * 1024,
+                  validators=None, fetch_info=None):
+    """
+    Download a raw export in chunks, writing it to disk while yielding its lines.
+    
+    The response body is never held in memory as a whole: each chunk is written
+    to raw_csv_filename as received and decoded into complete lines for the
+    parser. Interrupted downloads are resumed with a Range request (or by
+    skipping the bytes already received if the server ignores it), waiting
+    exponentially longer between attempts. The Range request is conditional
+    on the ETag or Last-Modified of the first response (If-Range), so bytes
+    of a different version of the export are never appended; if the export
+    changed in between, ExportChangedError is raised, as the lines already
+    yielded cannot be taken back.
+    
+    Args:
+        url (str): URL of the raw export
+        raw_csv_filename (str): Path the downloaded bytes are written to
+        timeout (float): Connect/read timeout in seconds
+        retries (int): Number of times an interrupted download is resumed
+        chunk_size (int): Size of the chunks read from the response
+        validators (dict): ETag/Last-Modified of a previous download; if given,
+            the request is conditional and nothing is yielded on a 304 response
+        fetch_info (dict): Filled with the validators of this download
+            (etag, last_modified, sha256, size, not_modified)
+    
+    Yields:
+        str: Lines of the export, including their line endings
+    
+    Raises:
+        ExportChangedError: If the export changed while an interrupted download was resumed
+    """
+    import requests
+    from http_session import RETRY_STATUS_CODES
+
+    if fetch_info is None:
+        fetch_info = {}
+    fetch_info['not_modified'] = False
+
+    conditional_headers = {}
+    if validators and validators.get('etag'):
+        conditional_headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        conditional_headers['If-Modified-Since'] = validators['last_modified']
+
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    digest = hashlib.sha256()
+    received = 0
+    pending = ''
+    attempt = 0
+    # Validator of the version being downloaded, taken from the first response
+    version = None
+
+    with open(raw_csv_filename, 'wb') as raw_f:
+        while True:
+            headers = conditional_headers
+            if received:
+                headers = {'Range': f'bytes={received}-'}
+                if version:
+                    headers['If-Range'] = version
+            try:
+                with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    if response.status_code == 304:
+                        fetch_info['not_modified'] = True
+                        return
+                    if response.status_code in RETRY_STATUS_CODES:
+                        raise requests.exceptions.RetryError(f"{response.status_code} response from {url}")
+                    # The connection dropped after the last byte: nothing is left to resume
+                    if received and response.status_code == 416 and \
+                            response.headers.get('Content-Range') == f'bytes */{received}':
+                        break
+                    response.raise_for_status()
+
+                    if not received:
+                        fetch_info['etag'] = response.headers.get('ETag')
+                        fetch_info['last_modified'] = response.headers.get('Last-Modified')
+                        version = fetch_info['etag'] or fetch_info['last_modified']
+                    elif response.status_code != 206 and version and \
+                            version != (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+                        raise ExportChangedError(f"{url} changed while its download was resumed "
+                                                 f"after {received} bytes")
+
+                    # The server ignored the Range header: skip what we already have
+                    skip = received if received and response.status_code != 206 else 0
+
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if skip:
+                            if len(chunk) <= skip:
+                                skip -= len(chunk)
+                                continue
+                            chunk = chunk[skip:]
+                            skip = 0
+                        raw_f.write(chunk)
+                        digest.update(chunk)
+                        received += len(chunk)
+
+                        *lines, pending = (pending + decoder.decode(chunk)).split('\n')
+                        for line in lines:
+                            yield line + '\n'
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                    requests.exceptions.ChunkedEncodingError, requests.exceptions.RetryError) as e:
+                attempt += 1
+                instrumentation.count('download.retries')
+                if attempt > retries:
+                    raise
+                wait = 2 ** attempt
+                print(f"Download interrupted after {received} bytes ({e}), retrying in {wait}s")
+                time.sleep(wait)
+
+    fetch_info['sha256'] = digest.hexdigest()
+    fetch_info['size'] = received
+
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def fetch_export(input_path, raw_csv_filename, timeout=60, retries=3, validators=None, fetch_info=None,
+                 previous_blocks=None, totals=None):
+    """
+    Store a raw export as raw_csv_filename and parse it.
+    
+    Exports at a URL are parsed while they are being downloaded (see
+    stream_export); local files, which may be packed, are copied. The export
+    is parsed per "Statistics for" block, reusing the rows of blocks that are
+    unchanged since previous_blocks (see export_parser.parse_export_blocks).
+    The Total rows of the export are collected into totals for validation
+    (see export_validation).
+    
+    Args:
+        input_path (str): Path or URL to the raw export
+        raw_csv_filename (str): Path the raw export is stored at
+        timeout (float): Connect/read timeout in seconds when downloading from a URL
+        retries (int): Number of times an interrupted download is resumed, and
+            restarted if the export changed in between
+        validators (dict): ETag/Last-Modified of a previous download (URLs only)
+        fetch_info (dict): Filled with the validators and content hash of the export
+        previous_blocks (dict): Block index of the previous snapshot, or None
+        totals (list): Filled with the Total rows of the export, if given
+    
+    Returns:
+        tuple: Long-format output as lists keyed by column name (see COLUMNS)
+            and the block index of the export
+    """
+    if fetch_info is None:
+        fetch_info = {}
+    if input_path.startswith('http://') or input_path.startswith('https://'):
+        for attempt in range(retries + 1):
+            try:
+                with instrumentation.stage('download_parse'):
+                    columns, block_index = parse_export_blocks(
+                        stream_export(input_path, raw_csv_filename, timeout=timeout, retries=retries,
+                                      validators=validators, fetch_info=fetch_info),
+                        previous_blocks, totals)
+                return columns, _count_blocks(block_index)
+            except ExportChangedError as e:
+                if attempt == retries:
+                    raise
+                # The lines parsed so far belong to the previous version: download and parse it again
+                instrumentation.count('download.restarts')
+                print(f"{e}, downloading it again")
+                if totals is not None:
+                    totals.clear()
+
+    with instrumentation.stage('copy'):
+        if os.path.exists(input_path):
+            shutil.copyfile(input_path, raw_csv_filename)
+        else:
+            with open(raw_csv_filename, 'wb') as f:
+                f.write(snapshot_store.read_bytes(input_path))
+        fetch_info['sha256'] = file_sha256(raw_csv_filename)
+    with instrumentation.stage('parse'), open_raw_text(input_path) as f:
+        columns, block_index = parse_export_blocks(f, previous_blocks, totals)
+    return columns, _count_blocks(block_index)
+
+def _count_blocks(block_index):
+    """Record how many blocks of an export were reused and parsed in the run report."""
+    instrumentation.count('blocks_reused', block_index['reused'])
+    instrumentation.count('blocks_parsed', len(block_index['blocks']) - block_index['reused'])
+    return block_index
+
+def to_frame(columns, parsing_timestamp):
+    """
+    Turn parsed columns into the long-format DataFrame of a snapshot.
+    
+    Args:
+        columns (dict): Result of parse_export or parse_rows
+        parsing_timestamp (str): Value of the parsing_date column
+    
+    Returns:
+        DataFrame: Long-format frame with the parsing_date column
+    """
+    import pandas as pd
+    
+    df = pd.DataFrame(columns, columns=COLUMNS)
+    df['parsing_date'] = parsing_timestamp
+    return df
+
+def write_snapshot(columns, final_csv_filename, parsing_timestamp, parquet=False, timeseries_db=None, cube=None):
+    """
+    Write parsed columns as the long-format CSV file of a snapshot, with its cube (see snapshot_cube).
+    
+    Args:
+        columns (dict): Result of parse_export or parse_rows
+        final_csv_filename (str): Path to the long-format CSV file (cache/<name>/<name>.csv)
+        parsing_timestamp (str): Parsing timestamp of the snapshot
+        parquet (bool): Whether to also write a compact Parquet file (requires pyarrow)
+        timeseries_db (str): Path to a time-series database to add the snapshot to
+        cube (SnapshotCube): Cube already built from columns (e.g. for validation), or None to build it
+    
+    Returns:
+        tuple: The long-format DataFrame and the path to the Parquet file (or None)
+    """
+    with instrumentation.stage('write_csv'):
+        df_final = to_frame(columns, parsing_timestamp)
+        os.makedirs(os.path.dirname(os.path.abspath(final_csv_filename)), exist_ok=True)
+        df_final.to_csv(final_csv_filename, index=False)
+    instrumentation.count('rows', len(df_final))
+    
+    with instrumentation.stage('write_cube'):
+        import snapshot_cube
+        if cube is None:
+            snapshot_cube.write_snapshot_cube(df_final, final_csv_filename)
+        else:
+            cube.save(snapshot_cube.cube_path_for(final_csv_filename), snapshot_cube.source_digest(final_csv_filename))
+    
+    if timeseries_db:
+        from timeseries_store import TimeSeriesStore, frame_rows
+        snapshot_name = os.path.splitext(os.path.basename(final_csv_filename))[0]
+        with instrumentation.stage('timeseries_db'), TimeSeriesStore(timeseries_db) as store:
+            store.add_snapshot(snapshot_name, frame_rows(df_final), parsing_timestamp, replace=True)
+    
+    parquet_filename = None
+    if parquet:
+        with instrumentation.stage('write_parquet'):
+            parquet_filename = columnar_store.write_parquet(df_final, columnar_store.parquet_path_for(final_csv_filename))
+    
+    return df_final, parquet_filename
+
+def parse_csv(input_path, output_path, fetch=None, output=None, publish=None, run=None):
     """
     Parse legal acts CSV file from local file or URL.
     
+    Unless output.validate is False, the parsed counts are checked against
+    the Total rows of the export, for gaps and for months lost since the
+    latest snapshot (see export_validation) before anything is written or
+    published.
+    
     Args:
         input_path (str): Path or URL to input CSV file
         output_path (str): Path to output CSV file
-        generate_doi (bool): Whether to generate a DOI via Zenodo
-        zenodo_token (str): Zenodo API token
-        sandbox (bool): Whether to use Zenodo sandbox environment
-        metadata (dict): Additional metadata for DOI generation
-        create_github_release (bool): Whether to create a GitHub release
-        github_token (str): GitHub API token
-        github_repo_owner (str): GitHub repository owner
-        github_repo_name (str): GitHub repository name
-        include_parsing_code (bool): Whether to include parsing code in DOI generation
-        parsing_code_path (str): Path to parsing code file
+        fetch (FetchOptions): Download and skip options (default: FetchOptions())
+        output (OutputOptions): Validation and output file options (default: OutputOptions())
+        publish (PublishOptions): Zenodo and GitHub options (default: nothing is published)
+        run (RunOptions): Run report options (default: RunOptions())
     
     Returns:
-        tuple: DOI information (dict or None) and parsing timestamp (str)
+        tuple: DOI information (dict or None) and parsing timestamp (str),
+            or (None, None) if the export was unchanged and skipped
+    
+    Raises:
+        ValidationError: If the parsed export failed validation; its report is saved
+            as <name>_validation.json next to the raw export
     """
+    fetch = fetch or FetchOptions()
+    output = output or OutputOptions()
+    publish = publish or PublishOptions()
+    run = run or RunOptions()
+    
     # Record parsing timestamp
     parsing_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
@@ -37,198 +429,276 @@ def parse_csv(input_path, output_path, generate_doi=False, zenodo_token=None, sa
     folder_name = os.path.splitext(os.path.basename(output_path))[0]
     parent_dir = os.path.dirname(os.path.abspath(output_path))
     dataset_dir = os.path.join(parent_dir, folder_name)
-    os.makedirs(dataset_dir, exist_ok=True)
+    run_report_path = os.path.join(dataset_dir, folder_name + "_run.json")
+    
+    # Time the stages of this run for the run report
+    report = instrumentation.start_run('parse', trace_memory=run.trace_memory, profile=run.profile)
+    try:
+        os.makedirs(dataset_dir, exist_ok=True)
 
-    # Store final CSV, raw CSV, parse code, and metadata in this subfolder
-    final_csv_filename = os.path.join(dataset_dir, folder_name + ".csv")
-    raw_csv_filename = os.path.join(dataset_dir, folder_name + "_raw.csv")
-    parsing_code_filename = None
+        # Store final CSV, raw CSV, parse code, and metadata in this subfolder
+        final_csv_filename = os.path.join(dataset_dir, folder_name + ".csv")
+        raw_csv_filename = os.path.join(dataset_dir, folder_name + "_raw.csv")
+        parsing_code_filename = None
 
-    if input_path.startswith('http://') or input_path.startswith('https://'):
-        response = requests.get(input_path)
-        response.raise_for_status()
-        with open(raw_csv_filename, 'w') as raw_f:
-            raw_f.write(response.text)
-        df_raw = pd.read_csv(StringIO(response.text), header=None)
-    else:
-        shutil.copyfile(input_path, raw_csv_filename)
-        df_raw = pd.read_csv(input_path, header=None)
-
-    data = []
-    current_year = None
-    current_month = None
-    current_category = None
-    type_continues = False
-
-    for idx, row in df_raw.iterrows():
-        if pd.notna(row[0]) and "Statistics for" in row[0]:
-            current_year = row[1]
-            current_month = row[2]
-            current_category = None
-            type_continues = False
-            continue
+        fetch_filename = os.path.join(dataset_dir, folder_name + "_fetch.json")
+        previous = load_previous_validators(parent_dir, exclude=folder_name) if fetch.skip_unchanged else None
+        latest = snapshots.latest_snapshot(parent_dir, exclude=folder_name)
 
-        if pd.notna(row[0]) and pd.isna(row[1]) and pd.isna(row[2]) and "Total" not in row[0]:
-            if type_continues:
-                current_category += " - " + row[0]
-            else:
-                current_category = row[0]
-            type_continues = True
-            continue
+        report.set('snapshot', folder_name)
+        report.set('source', input_path)
 
-        if pd.isna(row[0]) and pd.isna(row[1]) and pd.isna(row[2]):
-            current_category = None
-            type_continues = False
-            continue
+        fetch_info = {'source': input_path}
+        totals = []
+        with instrumentation.stage('load_blocks'):
+            previous_blocks = load_block_index(latest.blocks_path) if latest else None
+        columns, block_index = fetch_export(input_path, raw_csv_filename, timeout=fetch.timeout, retries=fetch.retries,
+                                            validators=previous, fetch_info=fetch_info, previous_blocks=previous_blocks,
+                                            totals=totals)
+        report.count('raw_bytes', os.path.getsize(raw_csv_filename))
 
-        if pd.notna(row[1]) and "Total" in row[1]:
-            continue
+        if previous and (fetch_info.get('not_modified') or fetch_info.get('sha256') == previous.get('sha256')):
+            shutil.rmtree(dataset_dir)
+            print("Export unchanged since the latest snapshot, skipping")
+            return None, None
 
-        if current_year and current_month and current_category and pd.notna(row[0]) and pd.notna(row[1]) and pd.notna(row[2]):
-            act_type = row[0]
-            basic_count = pd.to_numeric(row[1], errors='coerce')
-            amending_count = pd.to_numeric(row[2], errors='coerce') if len(row) > 2 else 0
-
-            data.append({'year': current_year, 'month': current_month, 'category': current_category,
-                         'act_type': act_type, 'type': 'basic', 'count': basic_count})
-            data.append({'year': current_year, 'month': current_month, 'category': current_category,
-                         'act_type': act_type, 'type': 'amending', 'count': amending_count})
-
-            type_continues = False
-
-    df_final = pd.DataFrame(data)
-    df_final = df_final[df_final['act_type'] != 'Total'].reset_index(drop=True)
-    
-    # Add parsing timestamp to the dataframe
-    df_final['parsing_date'] = parsing_timestamp
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-    
-    # Save to output path
-    df_final.to_csv(final_csv_filename, index=False)
-    
-    if include_parsing_code and os.path.exists(parsing_code_path):
-        parsing_code_filename = os.path.join(dataset_dir, folder_name + "_parsecode.py")
-        shutil.copyfile(parsing_code_path, parsing_code_filename)
-    
-    # Generate DOI if requested
-    doi_info = None
-    if generate_doi:
-        try:
-            from zenodo_publisher import ZenodoPublisher
-            
-            # Extract date from filename
-            filename = os.path.basename(output_path)
-            date_match = filename.replace('eurlex_legal_acts_statistics_', '').replace('.csv', '')
-            
-            # Format date for display
-            try:
-                year, month = date_match.split('_')
-                formatted_date = datetime(int(year), int(month), 1).strftime('%B %Y')
-            except:
-                formatted_date = date_match
-            
-            # Include parsing timestamp in metadata
-            if metadata is None:
-                metadata = {}
-            
-            # Add parsing timestamp to description if not explicitly provided
-            if 'description' not in metadata:
-                metadata['description'] = f"Monthly statistics of EU legal acts. Parsed on {parsing_timestamp}."
-            elif 'Parsed on' not in metadata['description']:
-                metadata['description'] += f" Parsed on {parsing_timestamp}."
-            
-            # Create publisher and publish dataset
-            publisher = ZenodoPublisher(token=zenodo_token, sandbox=sandbox)
-            doi = publisher.create_or_update_deposit(
-                csv_path=final_csv_filename,
-                dataset_date=date_match,
-                metadata=metadata,
-                parsing_timestamp=parsing_timestamp,
-                code_path=parsing_code_filename if include_parsing_code else None,
-                raw_csv_path=raw_csv_filename if raw_csv_filename else None
-            )
-            
-            # Generate citation information
-            doi_info = publisher.generate_citation(doi)
-            
-            # Save DOI info to metadata file alongside the CSV
-            metadata_path = os.path.join(dataset_dir, folder_name + "_metadata.json")
-            
-            # Add parsing timestamp to the metadata file
-            doi_info['parsing_timestamp'] = parsing_timestamp
-            
-            if raw_csv_filename:
-                doi_info['raw_csv_filename'] = os.path.basename(raw_csv_filename)
-            if parsing_code_filename:
-                doi_info['parsing_code_filename'] = os.path.basename(parsing_code_filename)
-            
-            with open(metadata_path, 'w') as f:
-                json.dump(doi_info, f, indent=2)
-                
-            print(f"DOI generated: {doi}")
-            print(f"Citation metadata saved to: {metadata_path}")
-        except Exception as e:
-            print(f"Error generating DOI: {e}")
-    
-    # Create GitHub Release if requested
-    if create_github_release:
-        try:
-            from github_publisher import GitHubPublisher
-            
-            # Extract date from filename
-            filename = os.path.basename(output_path)
-            date_match = filename.replace('eurlex_legal_acts_statistics_', '').replace('.csv', '')
-            
-            # Format date for display
-            try:
-                year, month = date_match.split('_')
-                formatted_date = datetime(int(year), int(month), 1).strftime('%B %Y')
-            except:
-                formatted_date = date_match
-            
-            # Create tag name and release title
-            tag_name = f"dataset-{date_match}"
-            title = metadata.get('title') if metadata else f"EU Legal Acts Statistics - {formatted_date} (Parsed: {parsing_timestamp})"
-            
-            # Create release body with description
-            description = metadata.get('description') if metadata else f"Monthly statistics of EU legal acts for {formatted_date}. Parsed on {parsing_timestamp}."
-            body = f"{description}\n\nThis dataset contains legal acts statistics from EUR-Lex. The data was parsed on {parsing_timestamp}."
-            
-            # Create publisher and publish release
-            publisher = GitHubPublisher(
-                token=github_token,
-                repo_owner=github_repo_owner,
-                repo_name=github_repo_name
-            )
-            
-            # Create the GitHub release (including DOI if available)
-            release_data = publisher.create_release(
-                tag_name=tag_name,
-                csv_path=final_csv_filename,
-                title=title,
-                body=body,
-                doi=doi_info['doi'] if doi_info else None,
-                additional_files=[
-                    raw_csv_filename,
-                    parsing_code_filename
-                ] if raw_csv_filename or parsing_code_filename else None
+        # The export may differ byte-wise while every parsed count is the same
+        if fetch.skip_unchanged and latest:
+            with instrumentation.stage('compare'):
+                unchanged = diff_snapshots.is_empty(diff_snapshots.diff_cells(diff_snapshots.read_cells(latest.csv_path),
+                                                                              diff_snapshots.cells_from_columns(columns)))
+            if unchanged:
+                shutil.rmtree(dataset_dir)
+                print(f"Parsed counts unchanged since snapshot {latest.name}, skipping")
+                return None, None
+
+        # Catch truncated or reshaped exports before anything is written or published
+        cube = None
+        if output.validate:
+            import snapshot_cube
+            import export_validation
+            with instrumentation.stage('validate'):
+                try:
+                    cube = snapshot_cube.SnapshotCube.from_columns(columns, parsing_timestamp)
+                    previous_cube = snapshot_cube.load_snapshot_cube(latest.csv_path) if latest else None
+                    validation = export_validation.validate_export(cube, totals, previous_cube)
+                except ValueError as e:
+                    # E.g. a non-numeric year or month
+                    cube = None
+                    validation = export_validation.malformed_export(e)
+            report.count('validation_problems', sum(check['problems'] for check in validation['checks'].values()))
+            warnings = [warning for check in validation['checks'].values() for warning in check['warnings']]
+            report.count('validation_warnings', len(warnings))
+            for warning in warnings:
+                print(f"Warning: {warning}")
+            if warnings or not validation['passed']:
+                validation_filename = os.path.join(dataset_dir, folder_name + "_validation.json")
+                with open(validation_filename, 'w') as f:
+                    json.dump(validation, f, indent=2)
+                print(f"Validation report saved to: {validation_filename}")
+            if not validation['passed']:
+                raise export_validation.ValidationError(validation)
+
+        fetch_info.pop('not_modified', None)
+        fetch_info['fetched_at'] = parsing_timestamp
+        with open(fetch_filename, 'w') as f:
+            json.dump(fetch_info, f, indent=2)
+
+        write_snapshot(columns, final_csv_filename, parsing_timestamp, parquet=output.parquet,
+                       timeseries_db=output.timeseries_db, cube=cube)
+        with open(block_index_path(final_csv_filename), 'wb') as f:
+            f.write(block_index_bytes(block_index))
+    
+        if publish.include_parsing_code and os.path.exists(publish.parsing_code_path):
+            parsing_code_filename = os.path.join(dataset_dir, folder_name + "_parsecode.py")
+            shutil.copyfile(publish.parsing_code_path, parsing_code_filename)
+    
+        # Publish the snapshot, minting the DOI and creating the GitHub release concurrently
+        doi_info = None
+        if publish.generate_doi or publish.create_github_release:
+            import publish_pipeline
+            zenodo, github = publish_pipeline.create_publishers(
+                generate_doi=publish.generate_doi,
+                zenodo_token=publish.zenodo_token,
+                sandbox=publish.sandbox,
+                create_github_release=publish.create_github_release,
+                github_token=publish.github_token,
+                github_repo_owner=publish.github_repo_owner,
+                github_repo_name=publish.github_repo_name
             )
-            
-            print(f"GitHub Release created: {release_data['html_url']}")
-        except Exception as e:
-            print(f"Error creating GitHub Release: {e}")
+            if zenodo or github:
+                with instrumentation.stage('publish'):
+                    doi_info, _ = publish_pipeline.publish_snapshot(
+                        snapshots.load_snapshot(final_csv_filename),
+                        parsing_timestamp,
+                        publish_pipeline.dataset_date(output_path),
+                        metadata=publish.metadata,
+                        zenodo=zenodo,
+                        github=github
+                    )
+    
+        if output.pack:
+            with instrumentation.stage('pack'):
+                for manifest_path in snapshot_store.pack_snapshot(dataset_dir):
+                    print(f"Packed {manifest_path}")
+    finally:
+        # Save the run report next to the metadata file, also if the run failed;
+        # skipped runs remove the folder and leave no report
+        instrumentation.finish_run(report, run_report_path if os.path.isdir(dataset_dir) else None)
+    print(f"Run report saved to: {run_report_path}")
     
     # Return both DOI info and parsing timestamp
     return doi_info, parsing_timestamp
 
+def snapshot_parsing_date(snapshot):
+    """
+    Return the original parsing timestamp of a snapshot.
+    
+    Taken from the parsing_date column of its CSV file if there is one,
+    else from its folder name (YYYYMMDD_HHMMSS).
+    
+    Args:
+        snapshot (Snapshot): Snapshot in the cache directory
+    
+    Returns:
+        str: Parsing timestamp (YYYY-MM-DD HH:MM:SS), or None if unknown
+    """
+    if snapshot_store.exists(snapshot.csv_path):
+        reader = csv.reader(snapshot_store.open_text(snapshot.csv_path))
+        header = next(reader, [])
+        row = next(reader, None)
+        if row and 'parsing_date' in header:
+            return row[header.index('parsing_date')]
+    try:
+        return datetime.strptime(snapshot.name[-15:], '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+
+def _replace_atomically(path, write):
+    """Call write with a temporary path next to path, then move the result into place."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _read_file(path):
+    """Return the contents of a file."""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def reparse_snapshot(snapshot, parquet=False):
+    """
+    Parse the raw export of a snapshot again, keeping its original parsing timestamp.
+    
+    Files are only rewritten if their contents changed, and then atomically,
+    so an interrupted backfill never leaves a half-written snapshot behind.
+    A packed CSV file is packed again, an existing Parquet file is
+    rewritten and a missing or outdated cube file or block index is
+    written. Nothing is published.
+    
+    Args:
+        snapshot (Snapshot): Snapshot with a raw export
+        parquet (bool): Whether to write a Parquet file if there is none yet
+    
+    Returns:
+        dict: Snapshot name, number of rows and whether the CSV file changed
+    """
+    parsing_timestamp = snapshot_parsing_date(snapshot) or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    with open_raw_text(snapshot.raw_csv_path) as f:
+        columns, block_index = parse_export_blocks(f)
+    df_final = to_frame(columns, parsing_timestamp)
+    
+    stored = snapshot_store.exists(snapshot.csv_path)
+    packed = stored and not os.path.exists(snapshot.csv_path)
+    content = df_final.to_csv(index=False).encode('utf-8')
+    changed = not stored or content != snapshot_store.read_bytes(snapshot.csv_path)
+    
+    if changed:
+        def write_csv(path):
+            with open(path, 'wb') as f:
+                f.write(content)
+        _replace_atomically(snapshot.csv_path, write_csv)
+        if packed:
+            snapshot_store.pack_file(snapshot.csv_path)
+    
+    import snapshot_cube
+    source_sha256 = hashlib.sha256(content).hexdigest()
+    cube_path = snapshot_cube.cube_path_for(snapshot.csv_path)
+    if changed or not snapshot.cube_path or snapshot_cube.SnapshotCube.load(cube_path).source_sha256 != source_sha256:
+        snapshot_cube.SnapshotCube.from_frame(df_final).save(cube_path, source_sha256)
+    
+    index_content = block_index_bytes(block_index)
+    if not snapshot.blocks_path or index_content != _read_file(snapshot.blocks_path):
+        def write_index(path):
+            with open(path, 'wb') as f:
+                f.write(index_content)
+        _replace_atomically(block_index_path(snapshot.csv_path), write_index)
+    
+    if (changed and snapshot.parquet_path) or (parquet and not snapshot.parquet_path):
+        _replace_atomically(columnar_store.parquet_path_for(snapshot.csv_path),
+                            lambda path: columnar_store.write_parquet(df_final, path))
+    
+    return {'name': snapshot.name, 'rows': len(df_final), 'changed': changed}
+
+def _reparse_snapshot(snapshot, parquet=False):
+    """
+    Re-parse a snapshot, catching errors so that one bad export doesn't stop the others.
+    
+    Returns:
+        tuple: Result of reparse_snapshot (dict or None) and error message (str or None)
+    """
+    try:
+        return reparse_snapshot(snapshot, parquet), None
+    except Exception as e:
+        return None, str(e)
+
+def reparse_all(cache_dir, jobs=1, parquet=False):
+    """
+    Re-parse the raw export of every snapshot in a cache directory, optionally in a process pool.
+    
+    Args:
+        cache_dir (str): Directory containing snapshot folders
+        jobs (int): Number of worker processes (0: one per CPU, 1: no pool)
+        parquet (bool): Whether to write Parquet files for snapshots that have none yet
+    
+    Returns:
+        list: (snapshot, result, error message) for each snapshot with a raw export, oldest first
+    """
+    found = [snapshot for snapshot in snapshots.discover_snapshots(cache_dir) if snapshot.raw_csv_path]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(found) < 2:
+        results = [_reparse_snapshot(snapshot, parquet) for snapshot in found]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        with ProcessPoolExecutor(max_workers=min(jobs, len(found))) as pool:
+            results = list(pool.map(_reparse_snapshot, found, [parquet] * len(found)))
+    return [(snapshot, result, error) for snapshot, (result, error) in zip(found, results)]
+
 def main():
     parser = argparse.ArgumentParser(description='Parse legal acts CSV file from local file or URL.')
     
     # Input and output options
-    parser.add_argument('--input', required=True, help='Path or URL to input CSV file')
-    parser.add_argument('--output', required=True, help='Path to output CSV file')
+    parser.add_argument('--input', help='Path or URL to input CSV file')
+    parser.add_argument('--output', help='Path to output CSV file')
+    parser.add_argument('--timeout', type=float, default=60, help='Connect/read timeout in seconds when downloading')
+    parser.add_argument('--retries', type=int, default=3, help='Number of times an interrupted download is resumed')
+    parser.add_argument('--parquet', action='store_true', help='Also write the parsed data as a compact Parquet file (requires pyarrow)')
+    parser.add_argument('--timeseries-db', help='Add the snapshot to this cross-snapshot time-series database (SQLite)')
+    parser.add_argument('--pack', action='store_true', help='Store the CSV files as deduplicated blocks in the cache block store')
+    parser.add_argument('--skip-unchanged', action='store_true', help='Skip parsing and publishing if the export is unchanged since the latest snapshot')
+    parser.add_argument('--no-validate', action='store_true', help='Do not check the parsed counts against the Total rows and coverage of the export')
+    parser.add_argument('--trace-memory', action='store_true', help='Record the peak memory of every stage in the run report (slower)')
+    parser.add_argument('--profile', action='store_true', help='Profile the run and list the slowest functions in the run report')
+    
+    # Backfill options
+    parser.add_argument('--reparse-all', action='store_true', help='Re-parse the raw export of every snapshot in the cache directory, keeping their timestamps (nothing is published)')
+    parser.add_argument('--cache-dir', default='cache', help='Directory containing snapshot folders for --reparse-all')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Number of worker processes for --reparse-all (0: one per CPU)')
     
     # DOI generation options
     parser.add_argument('--generate-doi', action='store_true', help='Generate DOI via Zenodo')
@@ -254,6 +724,24 @@ def main():
 
     args = parser.parse_args()
 
+    if args.reparse_all:
+        results = reparse_all(args.cache_dir, jobs=args.jobs, parquet=args.parquet)
+        errors = 0
+        for snapshot, result, error in results:
+            if error:
+                errors += 1
+                print(f"Error re-parsing {snapshot.name}: {error}")
+            else:
+                print(f"{'Updated' if result['changed'] else 'Unchanged'} {snapshot.name} ({result['rows']} rows)")
+        print(f"Re-parsed {len(results) - errors} of {len(results)} snapshots, "
+              f"{sum(1 for _, result, _ in results if result and result['changed'])} changed")
+        if errors:
+            raise SystemExit(1)
+        return
+
+    if not args.input or not args.output:
+        parser.error('--input and --output are required unless --reparse-all is given')
+
     # Get current date for filename
     current_date = datetime.now().strftime('%Y%m%d_%H%M%S')
     
@@ -278,20 +766,46 @@ def main():
     if args.license:
         metadata['license'] = args.license
 
-    doi_info, parsing_timestamp = parse_csv(
-        args.input, 
-        args.output,
-        generate_doi=args.generate_doi,
-        zenodo_token=args.zenodo_token,
-        sandbox=not args.production,
-        metadata=metadata if metadata else None,
-        create_github_release=args.create_github_release,
-        github_token=args.github_token,
-        github_repo_owner=args.github_repo_owner,
-        github_repo_name=args.github_repo_name,
-        include_parsing_code=args.include_parsing_code,
-        parsing_code_path=args.parsing_code_path
-    )
+    from export_validation import ValidationError
+
+    try:
+        doi_info, parsing_timestamp = parse_csv(
+            args.input,
+            args.output,
+            fetch=FetchOptions(timeout=args.timeout, retries=args.retries, skip_unchanged=args.skip_unchanged),
+            output=OutputOptions(validate=not args.no_validate, parquet=args.parquet,
+                                 timeseries_db=args.timeseries_db, pack=args.pack),
+            publish=PublishOptions(
+                generate_doi=args.generate_doi,
+                zenodo_token=args.zenodo_token,
+                sandbox=not args.production,
+                metadata=metadata if metadata else None,
+                create_github_release=args.create_github_release,
+                github_token=args.github_token,
+                github_repo_owner=args.github_repo_owner,
+                github_repo_name=args.github_repo_name,
+                include_parsing_code=args.include_parsing_code,
+                parsing_code_path=args.parsing_code_path
+            ),
+            run=RunOptions(trace_memory=args.trace_memory, profile=args.profile)
+        )
+    except ValidationError as e:
+        print(f"Error: {e}")
+        for name, check in e.report['checks'].items():
+            for example in check['examples']:
+                print(f"  {name}: {example}")
+        raise SystemExit(1)
+
+    changed = parsing_timestamp is not None
+
+    # Let later workflow jobs skip page generation and publishing
+    if os.environ.get('GITHUB_OUTPUT'):
+        with open(os.environ['GITHUB_OUTPUT'], 'a') as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
+
+    if not changed:
+        return
+
     print(f"Parsed data from {args.input} and saved to {args.output}")
     print(f"Parsing timestamp: {parsing_timestamp}")
 
@@ -0,0 +1,192 @@
+import os
+import json
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+def dataset_date(output_path):
+    """Return the date part of an output file name (e.g. 20260501_001654)."""
+    filename = os.path.basename(output_path)
+    return filename.replace('eurlex_legal_acts_statistics_', '').replace('.csv', '')
+
+def format_dataset_date(date_match):
+    """Format a YYYY_MM dataset date for display, or return it unchanged."""
+    try:
+        year, month = date_match.split('_')
+        return datetime(int(year), int(month), 1).strftime('%B %Y')
+    except:
+        return date_match
+
+def create_publishers(generate_doi=False, zenodo_token=None, sandbox=True, create_github_release=False,
+                      github_token=None, github_repo_owner=None, github_repo_name=None):
+    """
+    Create the publishers of the requested publishing stages.
+
+    The publishers (and the HTTP stack they use) are only imported when
+    their stage is requested. A publisher that cannot be created (e.g.
+    without a token) is reported and skipped.
+
+    Args:
+        generate_doi (bool): Whether to create a Zenodo publisher
+        zenodo_token (str): Zenodo API token
+        sandbox (bool): Whether to use Zenodo sandbox environment
+        create_github_release (bool): Whether to create a GitHub publisher
+        github_token (str): GitHub API token
+        github_repo_owner (str): GitHub repository owner
+        github_repo_name (str): GitHub repository name
+
+    Returns:
+        tuple: ZenodoPublisher and GitHubPublisher, each None if not requested or not available
+    """
+    zenodo = github = None
+    if generate_doi:
+        try:
+            from zenodo_publisher import ZenodoPublisher
+            zenodo = ZenodoPublisher(token=zenodo_token, sandbox=sandbox)
+        except Exception as e:
+            print(f"Error generating DOI: {e}")
+    if create_github_release:
+        try:
+            from github_publisher import GitHubPublisher
+            github = GitHubPublisher(
+                token=github_token,
+                repo_owner=github_repo_owner,
+                repo_name=github_repo_name
+            )
+        except Exception as e:
+            print(f"Error creating GitHub Release: {e}")
+    return zenodo, github
+
+def mint_doi(publisher, snapshot, date_match, metadata, parsing_timestamp):
+    """
+    Publish a snapshot on Zenodo and save its citation metadata next to the CSV file.
+
+    Args:
+        publisher (ZenodoPublisher): Zenodo publisher
+        snapshot (Snapshot): Snapshot to publish
+        date_match (str): Dataset date from the output file name
+        metadata (dict): Additional metadata for the deposit
+        parsing_timestamp (str): Timestamp when the data was parsed
+
+    Returns:
+        dict: DOI and citation information
+    """
+    doi = publisher.create_or_update_deposit(
+        csv_path=snapshot.csv_path,
+        dataset_date=date_match,
+        metadata=metadata,
+        parsing_timestamp=parsing_timestamp,
+        code_path=snapshot.parsing_code_path,
+        raw_csv_path=snapshot.raw_csv_path
+    )
+
+    # Build the citation from the metadata of the deposit that was just published
+    doi_info = publisher.generate_citation(doi)
+
+    # Save DOI info to metadata file alongside the CSV
+    metadata_path = os.path.join(snapshot.folder, snapshot.name + "_metadata.json")
+
+    # Add parsing timestamp to the metadata file
+    doi_info['parsing_timestamp'] = parsing_timestamp
+
+    if snapshot.raw_csv_path:
+        doi_info['raw_csv_filename'] = os.path.basename(snapshot.raw_csv_path)
+    if snapshot.parsing_code_path:
+        doi_info['parsing_code_filename'] = os.path.basename(snapshot.parsing_code_path)
+
+    with open(metadata_path, 'w') as f:
+        json.dump(doi_info, f, indent=2)
+
+    print(f"DOI generated: {doi}")
+    print(f"Citation metadata saved to: {metadata_path}")
+    return doi_info
+
+def create_release(publisher, snapshot, date_match, metadata, parsing_timestamp):
+    """
+    Create a GitHub release for a snapshot, with the CSV, raw CSV, parsing code and Parquet files as assets.
+
+    Args:
+        publisher (GitHubPublisher): GitHub publisher
+        snapshot (Snapshot): Snapshot to publish
+        date_match (str): Dataset date from the output file name
+        metadata (dict): Metadata providing the release title and description
+        parsing_timestamp (str): Timestamp when the data was parsed
+
+    Returns:
+        dict: Release data from GitHub API
+    """
+    formatted_date = format_dataset_date(date_match)
+
+    # Create tag name and release title
+    tag_name = f"dataset-{date_match}"
+    title = metadata.get('title') if metadata else f"EU Legal Acts Statistics - {formatted_date} (Parsed: {parsing_timestamp})"
+
+    # Create release body with description
+    description = metadata.get('description') if metadata else f"Monthly statistics of EU legal acts for {formatted_date}. Parsed on {parsing_timestamp}."
+    body = f"{description}\n\nThis dataset contains legal acts statistics from EUR-Lex. The data was parsed on {parsing_timestamp}."
+
+    additional_files = [f for f in (snapshot.raw_csv_path, snapshot.parsing_code_path, snapshot.parquet_path) if f]
+    release_data = publisher.create_release(
+        tag_name=tag_name,
+        csv_path=snapshot.csv_path,
+        title=title,
+        body=body,
+        additional_files=additional_files or None
+    )
+
+    print(f"GitHub Release created: {release_data['html_url']}")
+    return release_data
+
+def publish_snapshot(snapshot, parsing_timestamp, date_match, metadata=None, zenodo=None, github=None):
+    """
+    Mint a DOI and create a GitHub release for a parsed snapshot concurrently.
+
+    Neither step waits for the other: the release is created without a DOI
+    and its notes are patched with the DOI once minting has completed. A
+    failing step is reported and does not stop the other one.
+
+    Args:
+        snapshot (Snapshot): Snapshot to publish
+        parsing_timestamp (str): Timestamp when the data was parsed
+        date_match (str): Dataset date from the output file name
+        metadata (dict): Additional metadata for the deposit and the release
+        zenodo (ZenodoPublisher): Publisher to mint the DOI with, or None to skip it
+        github (GitHubPublisher): Publisher to create the release with, or None to skip it
+
+    Returns:
+        tuple: DOI information (dict or None) and release data (dict or None)
+    """
+    if zenodo:
+        # Include parsing timestamp in metadata
+        if metadata is None:
+            metadata = {}
+
+        # Add parsing timestamp to description if not explicitly provided
+        if 'description' not in metadata:
+            metadata['description'] = f"Monthly statistics of EU legal acts. Parsed on {parsing_timestamp}."
+        elif 'Parsed on' not in metadata['description']:
+            metadata['description'] += f" Parsed on {parsing_timestamp}."
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        doi_future = zenodo and pool.submit(mint_doi, zenodo, snapshot, date_match, metadata, parsing_timestamp)
+        release_future = github and pool.submit(create_release, github, snapshot, date_match, metadata, parsing_timestamp)
+
+    doi_info = release_data = None
+    if doi_future:
+        try:
+            doi_info = doi_future.result()
+        except Exception as e:
+            print(f"Error generating DOI: {e}")
+    if release_future:
+        try:
+            release_data = release_future.result()
+        except Exception as e:
+            print(f"Error creating GitHub Release: {e}")
+
+    if doi_info and release_data:
+        try:
+            github.add_doi(release_data, doi_info['doi'])
+            print(f"Added DOI {doi_info['doi']} to GitHub Release")
+        except Exception as e:
+            print(f"Error adding DOI to GitHub Release: {e}")
+
+    return doi_info, release_data
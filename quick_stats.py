@@ -0,0 +1,207 @@
+import sys
+import csv
+import json
+import math
+import argparse
+from array import array
+import snapshot_store
+from export_parser import COLUMNS, BLOCK_MARKER, parse_export
+
+# Statistics of snapshots and raw exports using the standard library only (csv
+# and array), for checks and small queries that should not wait for numpy and
+# pandas to import. The results equal those of snapshot_cube.SnapshotCube.stats.
+
+# Array type codes of the numeric columns; counts are doubles so that missing counts can be NaN
+YEAR_TYPECODE = 'l'
+MONTH_TYPECODE = 'b'
+COUNT_TYPECODE = 'd'
+
+def _count_value(value):
+    """Convert a count to a float, with missing or non-numeric counts as NaN."""
+    if value is None or value == '':
+        return math.nan
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+def _compact(years, months, categories, act_types, types, counts):
+    """Build compact columns from per-column iterables, storing each distinct string once."""
+    strings = {}
+    return {
+        'year': array(YEAR_TYPECODE, map(int, years)),
+        'month': array(MONTH_TYPECODE, map(int, months)),
+        'category': [strings.setdefault(value, value) for value in categories],
+        'act_type': [strings.setdefault(value, value) for value in act_types],
+        'type': [strings.setdefault(value, value) for value in types],
+        'count': array(COUNT_TYPECODE, map(_count_value, counts))
+    }
+
+def compact_columns(columns):
+    """
+    Turn the column lists of export_parser.parse_export into compact columns.
+
+    Args:
+        columns (dict): Long-format output as lists keyed by column name
+
+    Returns:
+        dict: Years and months as integer arrays, counts as a float array
+            (NaN if missing) and the string columns as lists
+    """
+    return _compact(*(columns[column] for column in COLUMNS))
+
+def read_columns(csv_path):
+    """
+    Read a long-format CSV file into compact columns.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file (which may be packed)
+
+    Returns:
+        dict: Compact columns (see compact_columns)
+    """
+    return _read_long_format(snapshot_store.open_text(csv_path))
+
+def _read_long_format(text):
+    reader = csv.reader(text)
+    header = next(reader)
+    rows = list(reader)
+    return _compact(*([row[index] for row in rows] for index in (header.index(column) for column in COLUMNS)))
+
+def read_file(path, totals=None):
+    """
+    Read a long-format CSV file or a raw export into compact columns.
+
+    Args:
+        path (str): Path to a long-format CSV file or a raw export (either may be packed)
+        totals (list): Filled with the Total rows if path is a raw export
+
+    Returns:
+        dict: Compact columns (see compact_columns)
+    """
+    text = snapshot_store.open_text(path)
+    if not text.getvalue().startswith(BLOCK_MARKER):
+        return _read_long_format(text)
+    return compact_columns(parse_export(text, totals=totals))
+
+def _counts(sums, as_float):
+    convert = float if as_float else int
+    return {'basic': convert(sums[0]), 'amending': convert(sums[1]), 'total': convert(sums[0] + sums[1])}
+
+def summarize(columns, year_from=None, year_to=None, categories=None, act_types=None):
+    """
+    Aggregate compact columns into the statistics shown on a stats page, in one pass.
+
+    Args:
+        columns (dict): Compact columns (see compact_columns)
+        year_from (int): First year included
+        year_to (int): Last year included
+        categories (list): Categories included (None: all)
+        act_types (list): Act types included (None: all)
+
+    Returns:
+        dict: Same structure as snapshot_cube.SnapshotCube.stats (counts are
+            floats if any count of the snapshot is missing, ints otherwise)
+    """
+    categories = set(categories) if categories else None
+    act_types = set(act_types) if act_types else None
+    as_float = any(count != count for count in columns['count'])
+
+    by_type = [0.0, 0.0]
+    yearly = {}
+    by_category = {}
+    detailed = {}
+    for year, category, act_type, type_, count in zip(columns['year'], columns['category'], columns['act_type'],
+                                                      columns['type'], columns['count']):
+        if (year_from is not None and year < year_from) or (year_to is not None and year > year_to) or \
+                (categories is not None and category not in categories) or \
+                (act_types is not None and act_type not in act_types):
+            continue
+        index = 0 if type_ == 'basic' else 1
+        if count != count:
+            count = 0.0
+        by_type[index] += count
+        yearly.setdefault(year, [0.0, 0.0])[index] += count
+        by_category.setdefault(category, [0.0, 0.0])[index] += count
+        detailed.setdefault((category, act_type), [0.0, 0.0])[index] += count
+
+    detailed_stats = {}
+    for category, act_type in sorted(detailed):
+        detailed_stats.setdefault(category, {})[act_type] = _counts(detailed[(category, act_type)], as_float)
+
+    totals = _counts(by_type, as_float)
+    return {
+        'total_acts': totals['total'],
+        'basic_acts': totals['basic'],
+        'amending_acts': totals['amending'],
+        'yearly_stats': {year: _counts(yearly[year], as_float) for year in sorted(yearly)},
+        'category_stats': {category: _counts(by_category[category], as_float) for category in sorted(by_category)},
+        'detailed_stats': detailed_stats
+    }
+
+def check_totals(columns, totals):
+    """
+    Compare the Total rows of a raw export with the sums of its parsed counts.
+
+    This is the Total row check of export_validation.check_totals without
+    numpy; export_validation.validate_export runs the complete validation.
+
+    Args:
+        columns (dict): Compact columns of the export (see compact_columns)
+        totals (list): Total rows collected by export_parser.parse_rows
+
+    Returns:
+        list: Description of every Total row that does not match
+    """
+    sums = {}
+    for year, month, category, type_, count in zip(columns['year'], columns['month'], columns['category'],
+                                                   columns['type'], columns['count']):
+        if count == count:
+            sums.setdefault((year, month, category), [0.0, 0.0])[0 if type_ == 'basic' else 1] += count
+
+    problems = []
+    for year, month, category, basic, amending in totals:
+        actual = sums.get((int(year), int(month), category), [0.0, 0.0])
+        if basic != actual[0] or (amending is not None and amending != actual[1]):
+            expected = basic if amending is None else f"{basic}/{amending}"
+            problems.append(f"{int(year)}-{int(month):02d} {category}: Total row says {expected}, "
+                            f"parsed counts sum to {actual[0]:g}/{actual[1]:g} (basic/amending)")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print the statistics of a snapshot CSV file or raw export (standard library only).')
+    parser.add_argument('path', help='Path to a long-format CSV file or a raw export')
+    parser.add_argument('--year-from', type=int, help='First year included')
+    parser.add_argument('--year-to', type=int, help='Last year included')
+    parser.add_argument('--category', action='append', help='Category included (repeatable)')
+    parser.add_argument('--act-type', action='append', help='Act type included (repeatable)')
+    parser.add_argument('--totals-only', action='store_true', help='Only print the total, basic and amending counts')
+    parser.add_argument('--check', action='store_true',
+                        help='Check the Total rows of a raw export; exit with status 1 if they do not match')
+    args = parser.parse_args()
+
+    totals = []
+    columns = read_file(args.path, totals=totals)
+
+    if args.check:
+        if not totals:
+            print(f"{args.path} has no Total rows to check")
+            raise SystemExit(1)
+        problems = check_totals(columns, totals)
+        for problem in problems:
+            print(problem)
+        print(f"Checked {len(totals)} Total rows, {len(problems)} do not match")
+        if problems:
+            raise SystemExit(1)
+        return
+
+    stats = summarize(columns, year_from=args.year_from, year_to=args.year_to,
+                      categories=args.category, act_types=args.act_type)
+    if args.totals_only:
+        stats = {key: stats[key] for key in ('total_acts', 'basic_acts', 'amending_acts')}
+    json.dump(stats, sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+    main()
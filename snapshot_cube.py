@@ -0,0 +1,433 @@
+import os
+import json
+import hashlib
+import functools
+import numpy as np
+import snapshot_store
+
+# Types of act along the last axis of a cube
+TYPES = ('basic', 'amending')
+
+# Suffix of the cube file next to a snapshot's long-format CSV file
+CUBE_SUFFIX = '_cube.npz'
+
+def cube_path_for(csv_path):
+    """Return the path of the cube file belonging to a long-format CSV file."""
+    return os.path.splitext(csv_path)[0] + CUBE_SUFFIX
+
+def source_digest(csv_path):
+    """
+    Return the SHA-256 of a long-format CSV file, whether it is stored in full or packed.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    if os.path.exists(csv_path):
+        sha256 = hashlib.sha256()
+        with open(csv_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    # The manifest of a packed file records the checksum of its full contents
+    with open(csv_path + snapshot_store.MANIFEST_SUFFIX, 'r') as f:
+        return json.load(f)['sha256']
+
+def _factorize(values):
+    """
+    Encode repeated strings as indices into their sorted unique values.
+
+    Args:
+        values (iterable): Strings (e.g. a long-format column)
+
+    Returns:
+        tuple: Array of the sorted unique strings and the index of each value in it
+    """
+    codes = {}
+    index = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int64)
+    uniques = np.array([str(value) for value in codes])
+    order = np.argsort(uniques, kind='stable')
+    remap = np.empty(len(order), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return uniques[order], remap[index]
+
+class SnapshotCube:
+    """
+    The counts of one snapshot as a dense year x month x act type x type array.
+
+    Act types are indexed per (category, act type) pair, sorted like the stats
+    pages list them; each pair's category is an index into the category
+    dictionary. Cells the snapshot has no row for are marked absent, and
+    missing counts (NA in the export) are stored as 0 and marked missing, so
+    that every rollup matches aggregating the long-format frame.
+    """
+
+    def __init__(self, counts, present, missing, years, categories, act_types, act_type_categories,
+                 parsing_timestamp=None, source_sha256=None):
+        """
+        Create a cube from its arrays (see from_columns to build one from parsed rows).
+
+        Args:
+            counts (ndarray): Integer counts, shape (years, 12, act types, 2)
+            present (ndarray): Whether the snapshot has a row for each cell
+            missing (ndarray): Whether the count of each cell is missing
+            years (ndarray): Year of each index along the first axis, ascending
+            categories (ndarray): Category names, sorted
+            act_types (ndarray): Act type name of each index along the third axis
+            act_type_categories (ndarray): Category index of each act type
+            parsing_timestamp (str): Parsing timestamp of the snapshot
+            source_sha256 (str): SHA-256 of the CSV file the cube was built from
+        """
+        self.counts = counts
+        self.present = present
+        self.missing = missing
+        self.years = years
+        self.categories = categories
+        self.act_types = act_types
+        self.act_type_categories = act_type_categories
+        self.parsing_timestamp = parsing_timestamp
+        self.source_sha256 = source_sha256
+
+    @classmethod
+    def from_columns(cls, columns, parsing_timestamp=None):
+        """
+        Build a cube from long-format columns.
+
+        Args:
+            columns: Mapping of column name to values (the result of
+                export_parser.parse_export, or a long-format DataFrame)
+            parsing_timestamp (str): Parsing timestamp of the snapshot
+
+        Returns:
+            SnapshotCube: The cube
+        """
+        year = np.asarray(columns['year'], dtype=np.int64)
+        month = np.asarray(columns['month'], dtype=np.int64) - 1
+        if len(month) and (month.min() < 0 or month.max() > 11):
+            raise ValueError("Months must be between 1 and 12")
+
+        type_names, type_codes = _factorize(columns['type'])
+        unknown = set(type_names) - set(TYPES)
+        if unknown:
+            raise ValueError(f"Unknown act type {sorted(unknown)[0]!r}")
+        type_index = np.array([TYPES.index(name) for name in type_names], dtype=np.int64)[type_codes]
+
+        count = np.asarray(columns['count'], dtype=np.float64)
+        cell_missing = np.isnan(count)
+
+        years, year_index = np.unique(year, return_inverse=True)
+        categories, category_index = _factorize(columns['category'])
+        names, name_index = _factorize(columns['act_type'])
+        # Codes sort like (category, act type) pairs, so the pairs come out in page order
+        pairs, act_index = np.unique(category_index * len(names) + name_index, return_inverse=True)
+
+        shape = (len(years), 12, len(pairs), len(TYPES))
+        index = (year_index, month, act_index, type_index)
+        counts = np.zeros(shape, dtype=np.int32)
+        present = np.zeros(shape, dtype=bool)
+        missing = np.zeros(shape, dtype=bool)
+        np.add.at(counts, index, np.where(cell_missing, 0, count).astype(np.int32))
+        present[index] = True
+        missing[index] = cell_missing
+
+        return cls(counts, present, missing, years, categories, names[pairs % len(names)], pairs // len(names),
+                   parsing_timestamp=parsing_timestamp)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build a cube from a long-format DataFrame, taking the parsing timestamp from its parsing_date column."""
+        parsing_timestamp = None
+        if 'parsing_date' in df.columns and len(df):
+            parsing_timestamp = str(df['parsing_date'].iloc[0])
+        columns = ('year', 'month', 'category', 'act_type', 'type', 'count')
+        return cls.from_columns({column: df[column].to_numpy() for column in columns},
+                                parsing_timestamp=parsing_timestamp)
+
+    def save(self, path, source_sha256=None):
+        """
+        Write the cube to a single compressed .npz file, atomically.
+
+        Args:
+            path (str): Path to the cube file (see cube_path_for)
+            source_sha256 (str): SHA-256 of the CSV file the cube was built from
+
+        Returns:
+            str: Path to the cube file
+        """
+        if source_sha256 is not None:
+            self.source_sha256 = source_sha256
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, counts=self.counts, present=self.present, missing=self.missing, years=self.years,
+                                categories=self.categories, act_types=self.act_types,
+                                act_type_categories=self.act_type_categories,
+                                parsing_timestamp=np.array(self.parsing_timestamp or ''),
+                                source_sha256=np.array(self.source_sha256 or ''))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        """Read a cube written by save."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['counts'], data['present'], data['missing'], data['years'], data['categories'],
+                       data['act_types'], data['act_type_categories'],
+                       parsing_timestamp=str(data['parsing_timestamp']) or None,
+                       source_sha256=str(data['source_sha256']) or None)
+
+    @property
+    def nbytes(self):
+        """Number of bytes held by the cube's arrays."""
+        return sum(array.nbytes for array in (self.counts, self.present, self.missing, self.years, self.categories,
+                                              self.act_types, self.act_type_categories))
+
+    @functools.cached_property
+    def has_missing(self):
+        """Whether any count is missing (aggregates are then floats, as in the long-format frame)."""
+        return bool(self.missing.any())
+
+    def _value(self, count):
+        return float(count) if self.has_missing else int(count)
+
+    def _masks(self, year_from=None, year_to=None, categories=None, act_types=None):
+        """Return the year and act type masks selecting the cells matching the filters."""
+        year_mask = np.ones(len(self.years), dtype=bool)
+        if year_from is not None:
+            year_mask &= self.years >= year_from
+        if year_to is not None:
+            year_mask &= self.years <= year_to
+        act_mask = np.ones(len(self.act_types), dtype=bool)
+        if categories:
+            act_mask &= np.isin(self.categories[self.act_type_categories], list(categories))
+        if act_types:
+            act_mask &= np.isin(self.act_types, list(act_types))
+        return year_mask, act_mask
+
+    def rollups(self, year_from=None, year_to=None, categories=None, act_types=None):
+        """
+        Sum the counts matching the filters along each axis.
+
+        Args:
+            year_from (int): First year included
+            year_to (int): Last year included
+            categories (list): Categories included (None: all)
+            act_types (list): Act types included (None: all)
+
+        Returns:
+            dict: Per-type sums ('by_type'), and per year, category and act
+                type sums with masks of the years, categories and act types
+                that have at least one row
+        """
+        if year_from is None and year_to is None and not categories and not act_types:
+            return self._rollups
+        return self._rollup(*self._masks(year_from, year_to, categories, act_types))
+
+    @functools.cached_property
+    def _rollups(self):
+        return self._rollup(*self._masks())
+
+    def _rollup(self, year_mask, act_mask):
+        counts = self.counts[year_mask][:, :, act_mask]
+        present = self.present[year_mask][:, :, act_mask]
+        act_categories = self.act_type_categories[act_mask]
+
+        by_act_type = counts.sum(axis=(0, 1), dtype=np.int64)
+        act_type_present = present.any(axis=(0, 1, 3))
+        by_category = np.zeros((len(self.categories), len(TYPES)), dtype=np.int64)
+        np.add.at(by_category, act_categories, by_act_type)
+        category_present = np.zeros(len(self.categories), dtype=bool)
+        category_present[act_categories[act_type_present]] = True
+
+        return {
+            'by_type': counts.sum(axis=(0, 1, 2), dtype=np.int64),
+            'years': self.years[year_mask],
+            'by_year': counts.sum(axis=(1, 2), dtype=np.int64),
+            'year_present': present.any(axis=(1, 2, 3)),
+            'by_category': by_category,
+            'category_present': category_present,
+            'act_type_index': np.flatnonzero(act_mask),
+            'by_act_type': by_act_type,
+            'act_type_present': act_type_present
+        }
+
+    def _counts(self, sums):
+        basic, amending = (self._value(value) for value in sums)
+        return {'basic': basic, 'amending': amending, 'total': self._value(sums.sum())}
+
+    def stats(self, year_from=None, year_to=None, categories=None, act_types=None):
+        """
+        Aggregate the counts matching the filters into the statistics shown on a stats page.
+
+        Args:
+            year_from (int): First year included
+            year_to (int): Last year included
+            categories (list): Categories included (None: all)
+            act_types (list): Act types included (None: all)
+
+        Returns:
+            dict: total_acts, basic_acts, amending_acts and the yearly_stats,
+                category_stats and detailed_stats dicts (sorted by key), each
+                mapping to basic/amending/total counts
+        """
+        rollups = self.rollups(year_from, year_to, categories, act_types)
+
+        detailed_stats = {}
+        for position in np.flatnonzero(rollups['act_type_present']):
+            index = rollups['act_type_index'][position]
+            category = str(self.categories[self.act_type_categories[index]])
+            detailed_stats.setdefault(category, {})[str(self.act_types[index])] = \
+                self._counts(rollups['by_act_type'][position])
+
+        basic, amending = rollups['by_type']
+        return {
+            'total_acts': self._value(basic + amending),
+            'basic_acts': self._value(basic),
+            'amending_acts': self._value(amending),
+            'yearly_stats': {int(rollups['years'][position]): self._counts(rollups['by_year'][position])
+                             for position in np.flatnonzero(rollups['year_present'])},
+            'category_stats': {str(self.categories[index]): self._counts(rollups['by_category'][index])
+                               for index in np.flatnonzero(rollups['category_present'])},
+            'detailed_stats': detailed_stats
+        }
+
+    def total(self, years=None, months=None, categories=None, act_types=None, types=None):
+        """
+        Sum the counts of an ad-hoc selection of cells.
+
+        Args:
+            years (list): Years included (None: all)
+            months (list): Months (1-12) included (None: all)
+            categories (list): Categories included (None: all)
+            act_types (list): Act types included (None: all)
+            types (list): Types (basic, amending) included (None: both)
+
+        Returns:
+            int: Sum of the selected counts (missing counts count as 0)
+        """
+        year_mask = np.ones(len(self.years), dtype=bool) if years is None else np.isin(self.years, list(years))
+        month_mask = np.ones(12, dtype=bool)
+        if months is not None:
+            month_mask = np.isin(np.arange(1, 13), list(months))
+        act_mask = self._masks(categories=categories, act_types=act_types)[1]
+        type_mask = np.ones(len(TYPES), dtype=bool) if types is None else np.isin(TYPES, list(types))
+        return self._value(self.counts[np.ix_(year_mask, month_mask, act_mask, type_mask)].sum(dtype=np.int64))
+
+    def pairs(self):
+        """Return the (category, act type) pair of each index along the act type axis."""
+        return [(str(self.categories[category]), str(act_type))
+                for category, act_type in zip(self.act_type_categories, self.act_types)]
+
+    def reindex(self, years, pairs):
+        """
+        Return the counts, present and missing arrays spread over other years and act types.
+
+        Args:
+            years (ndarray): Years of the new first axis (a superset of the cube's years)
+            pairs (list): (category, act type) pairs of the new third axis (a superset of the cube's)
+
+        Returns:
+            tuple: counts, present and missing arrays of shape (years, 12, pairs, 2)
+        """
+        year_index = np.searchsorted(years, self.years)
+        pair_index = {pair: index for index, pair in enumerate(pairs)}
+        act_index = np.array([pair_index[pair] for pair in self.pairs()], dtype=np.int64)
+        shape = (len(years), 12, len(pairs), len(TYPES))
+        arrays = []
+        for array in (self.counts, self.present, self.missing):
+            expanded = np.zeros(shape, dtype=array.dtype)
+            expanded[np.ix_(year_index, np.arange(12), act_index, np.arange(len(TYPES)))] = array
+            arrays.append(expanded)
+        return tuple(arrays)
+
+def diff_cubes(old, new):
+    """
+    Compare the cells of two snapshot cubes with array comparisons.
+
+    Args:
+        old (SnapshotCube): Cube of the older snapshot
+        new (SnapshotCube): Cube of the newer snapshot
+
+    Returns:
+        dict: Same structure as the result of diff_snapshots.diff_cells
+    """
+    years = np.union1d(old.years, new.years)
+    pairs = sorted(set(old.pairs()) | set(new.pairs()))
+    old_counts, old_present, old_missing = old.reindex(years, pairs)
+    new_counts, new_present, new_missing = new.reindex(years, pairs)
+
+    def key(index):
+        year, month, act, type_ = index
+        return (int(years[year]), int(month) + 1, pairs[act][0], pairs[act][1], TYPES[type_])
+
+    def value(counts, missing, index):
+        return None if missing[index] else int(counts[index])
+
+    both = old_present & new_present
+    changed = both & ((old_counts != new_counts) | (old_missing != new_missing))
+    changed_cells = [(key(index), value(old_counts, old_missing, index), value(new_counts, new_missing, index))
+                     for index in zip(*np.nonzero(changed))]
+    added = [(key(index), value(new_counts, new_missing, index))
+             for index in zip(*np.nonzero(new_present & ~old_present))]
+    removed = [(key(index), value(old_counts, old_missing, index))
+               for index in zip(*np.nonzero(old_present & ~new_present))]
+
+    # The type axis is not in alphabetical order, so restore the key order of diff_cells
+    return {'added': sorted(added), 'removed': sorted(removed), 'changed': sorted(changed_cells)}
+
+def load_cube(csv_path):
+    """
+    Load the cube of a snapshot if it exists and was built from the current CSV file.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file (which may be packed)
+
+    Returns:
+        SnapshotCube: The cube, or None if there is none or it is out of date
+    """
+    cube_path = cube_path_for(csv_path)
+    if not os.path.exists(cube_path):
+        return None
+    cube = SnapshotCube.load(cube_path)
+    if cube.source_sha256 != source_digest(csv_path):
+        return None
+    return cube
+
+def load_snapshot_cube(csv_path):
+    """
+    Return the cube of a snapshot, building it from the long-format data if its cube file is missing or out of date.
+
+    Cube files are derived data and not committed, so a rebuilt cube is
+    saved next to the CSV file for the next run (if the directory is writable).
+
+    Args:
+        csv_path (str): Path to the long-format CSV file (which may be packed)
+
+    Returns:
+        SnapshotCube: The cube
+    """
+    import columnar_store
+
+    cube = load_cube(csv_path)
+    if cube is None:
+        cube = SnapshotCube.from_frame(columnar_store.load_snapshot_frame(csv_path))
+        try:
+            cube.save(cube_path_for(csv_path), source_digest(csv_path))
+        except OSError as e:
+            print(f"Could not save the cube of {csv_path}: {e}")
+    return cube
+
+def write_snapshot_cube(df, csv_path, source_sha256=None):
+    """
+    Build the cube of a long-format frame and save it next to its CSV file.
+
+    Args:
+        df (DataFrame): Long-format frame
+        csv_path (str): Path to the long-format CSV file written from df
+        source_sha256 (str): SHA-256 of the CSV file (default: computed from the file)
+
+    Returns:
+        str: Path to the cube file
+    """
+    return SnapshotCube.from_frame(df).save(cube_path_for(csv_path), source_sha256 or source_digest(csv_path))
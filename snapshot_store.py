@@ -0,0 +1,288 @@
+import os
+import io
+import json
+import glob
+import hashlib
+import argparse
+
+# Name of the folder (inside the cache directory) holding the shared blocks
+BLOCKS_DIR = 'blocks'
+
+# Suffix of the manifest that replaces a packed file
+MANIFEST_SUFFIX = '.blocks.json'
+
+def _sha256(data):
+    """Return the SHA-256 hex digest of bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def _block_path(store_dir, digest):
+    """Return the path of a block in the store."""
+    return os.path.join(store_dir, digest[:2], digest + '.block')
+
+def _store_dir_for(path):
+    """Return the block store of the cache directory a snapshot file lives in."""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), BLOCKS_DIR)
+
+def write_block(store_dir, data):
+    """
+    Store a block under its content hash, unless it is already stored.
+
+    Args:
+        store_dir (str): Block store directory
+        data (bytes): Block contents
+
+    Returns:
+        str: Content hash of the block
+    """
+    digest = _sha256(data)
+    path = _block_path(store_dir, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per process, as several processes may store the same block at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return digest
+
+def read_block(store_dir, digest):
+    """Return the contents of a stored block."""
+    with open(_block_path(store_dir, digest), 'rb') as f:
+        return f.read()
+
+def _is_raw(path):
+    """Whether a snapshot file is a raw EUR-Lex export."""
+    return path.endswith('_raw.csv')
+
+def _month_key(line):
+    """Return the year/month prefix of a long-format CSV line."""
+    return line.split(b',', 2)[:2]
+
+def split_blocks(data, raw, line_suffix=b''):
+    """
+    Split a snapshot file into per-month blocks.
+
+    Raw exports are split before every "Statistics for" line. Long-format
+    CSV files are split whenever the year/month of a line changes, with
+    line_suffix (the constant parsing_date column) removed from every data
+    line so that the blocks can be shared between snapshots.
+
+    Args:
+        data (bytes): File contents
+        raw (bool): Whether the file is a raw export
+        line_suffix (bytes): Suffix to strip from every data line
+
+    Returns:
+        list: Blocks (bytes), which concatenate back to the file contents
+    """
+    lines = data.splitlines(keepends=True)
+    blocks = []
+    current = []
+    current_key = None
+
+    for index, line in enumerate(lines):
+        if raw:
+            boundary = b'"Statistics for"' in line
+        elif index == 0:
+            boundary = False
+        else:
+            if line_suffix:
+                ending = line[len(line.rstrip(b'\r\n')):]
+                line = line[:-len(line_suffix) - len(ending)] + ending
+            key = _month_key(line)
+            boundary = index == 1 or key != current_key
+            current_key = key
+
+        if boundary and current:
+            blocks.append(b''.join(current))
+            current = []
+        current.append(line)
+
+    if current:
+        blocks.append(b''.join(current))
+    return blocks
+
+def _line_suffix(data):
+    """Return the constant parsing_date suffix of a long-format CSV file, if any."""
+    lines = data.splitlines()
+    if len(lines) < 2 or not lines[0].endswith(b',parsing_date'):
+        return b''
+    suffix = b',' + lines[1].rsplit(b',', 1)[1]
+    if all(line.endswith(suffix) for line in lines[1:]):
+        return suffix
+    return b''
+
+def pack_file(path, store_dir=None, remove=True):
+    """
+    Replace a snapshot file by a manifest of content-addressed blocks.
+
+    Blocks that are already in the store (e.g. months unchanged since the
+    previous snapshot) are not written again.
+
+    Args:
+        path (str): Path to the raw or long-format CSV file
+        store_dir (str): Block store directory (default: cache/blocks)
+        remove (bool): Whether to remove the file after packing
+
+    Returns:
+        str: Path to the manifest
+    """
+    store_dir = store_dir or _store_dir_for(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    raw = _is_raw(path)
+    line_suffix = b'' if raw else _line_suffix(data)
+    blocks = split_blocks(data, raw, line_suffix)
+
+    manifest = {
+        'file': os.path.basename(path),
+        'size': len(data),
+        'sha256': _sha256(data),
+        'line_suffix': line_suffix.decode('utf-8'),
+        'blocks': [write_block(store_dir, block) for block in blocks]
+    }
+    manifest_path = path + MANIFEST_SUFFIX
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Never drop the only full copy of a file we cannot rebuild exactly
+    try:
+        read_bytes(path, store_dir, prefer_manifest=True)
+    except ValueError:
+        os.remove(manifest_path)
+        raise
+
+    if remove:
+        os.remove(path)
+    return manifest_path
+
+def read_bytes(path, store_dir=None, prefer_manifest=False):
+    """
+    Return the contents of a snapshot file, rebuilding it from blocks if it is packed.
+
+    Args:
+        path (str): Path to the raw or long-format CSV file
+        store_dir (str): Block store directory (default: cache/blocks)
+        prefer_manifest (bool): Rebuild from blocks even if the full file exists
+
+    Returns:
+        bytes: File contents
+    """
+    if os.path.exists(path) and not prefer_manifest:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    store_dir = store_dir or _store_dir_for(path)
+    with open(path + MANIFEST_SUFFIX, 'r') as f:
+        manifest = json.load(f)
+
+    line_suffix = manifest['line_suffix'].encode('utf-8')
+    parts = []
+    for index, digest in enumerate(manifest['blocks']):
+        block = read_block(store_dir, digest)
+        if line_suffix:
+            lines = block.splitlines(keepends=True)
+            for line_index, line in enumerate(lines):
+                if index == 0 and line_index == 0:
+                    continue
+                body = line.rstrip(b'\r\n')
+                lines[line_index] = body + line_suffix + line[len(body):]
+            block = b''.join(lines)
+        parts.append(block)
+
+    data = b''.join(parts)
+    if _sha256(data) != manifest['sha256']:
+        raise ValueError(f"Rebuilt {path} does not match its manifest checksum")
+    return data
+
+def open_text(path, store_dir=None):
+    """Return a text stream over a snapshot file, whether it is stored in full or packed."""
+    return io.StringIO(read_bytes(path, store_dir).decode('utf-8-sig'))
+
+def exists(path):
+    """Whether a snapshot file is stored, in full or packed."""
+    return os.path.exists(path) or os.path.exists(path + MANIFEST_SUFFIX)
+
+def unpack_file(path, store_dir=None, remove=True):
+    """
+    Rebuild a packed snapshot file in full.
+
+    Args:
+        path (str): Path to the raw or long-format CSV file
+        store_dir (str): Block store directory (default: cache/blocks)
+        remove (bool): Whether to remove the manifest afterwards
+
+    Returns:
+        str: Path to the rebuilt file
+    """
+    data = read_bytes(path, store_dir, prefer_manifest=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    if remove:
+        os.remove(path + MANIFEST_SUFFIX)
+    return path
+
+def snapshot_files(snapshot_dir):
+    """Return the raw and long-format CSV files of a snapshot folder, packed or not."""
+    name = os.path.basename(os.path.normpath(snapshot_dir))
+    candidates = [os.path.join(snapshot_dir, name + '.csv'), os.path.join(snapshot_dir, name + '_raw.csv')]
+    return [path for path in candidates if exists(path)]
+
+def pack_snapshot(snapshot_dir, store_dir=None, remove=True):
+    """
+    Pack the raw and long-format CSV files of a snapshot folder.
+
+    Args:
+        snapshot_dir (str): Snapshot folder (cache/<timestamp>)
+        store_dir (str): Block store directory (default: cache/blocks)
+        remove (bool): Whether to remove the full files after packing
+
+    Returns:
+        list: Paths to the written manifests
+    """
+    return [pack_file(path, store_dir, remove) for path in snapshot_files(snapshot_dir) if os.path.exists(path)]
+
+def unpack_snapshot(snapshot_dir, store_dir=None, remove=True):
+    """
+    Rebuild the packed files of a snapshot folder in full.
+
+    Args:
+        snapshot_dir (str): Snapshot folder (cache/<timestamp>)
+        store_dir (str): Block store directory (default: cache/blocks)
+        remove (bool): Whether to remove the manifests afterwards
+
+    Returns:
+        list: Paths to the rebuilt files
+    """
+    return [unpack_file(path, store_dir, remove) for path in snapshot_files(snapshot_dir)
+            if os.path.exists(path + MANIFEST_SUFFIX)]
+
+def main():
+    """Pack or unpack all snapshot folders of a cache directory."""
+    parser = argparse.ArgumentParser(description='Store snapshots as deduplicated, content-addressed blocks.')
+    parser.add_argument('action', choices=['pack', 'unpack'], help='Pack full files into blocks, or rebuild them')
+    parser.add_argument('--input', '-i', default='cache', help='Directory containing snapshot folders')
+    args = parser.parse_args()
+
+    store_dir = os.path.join(args.input, BLOCKS_DIR)
+    snapshot_dirs = sorted(d for d in glob.glob(os.path.join(args.input, '*'))
+                           if os.path.isdir(d) and os.path.basename(d) != BLOCKS_DIR)
+
+    for snapshot_dir in snapshot_dirs:
+        if args.action == 'pack':
+            paths = pack_snapshot(snapshot_dir, store_dir)
+        else:
+            paths = unpack_snapshot(snapshot_dir, store_dir)
+        for path in paths:
+            print(f"{args.action.capitalize()}ed {path}")
+
+    if args.action == 'pack' and os.path.isdir(store_dir):
+        block_files = glob.glob(os.path.join(store_dir, '*', '*.block'))
+        size = sum(os.path.getsize(f) for f in block_files)
+        print(f"Block store: {len(block_files)} blocks, {size / 1024 / 1024:.1f} MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+import snapshot_store
+import columnar_store
+
+@dataclass(frozen=True)
+class Snapshot:
+    """The files of one parsed EUR-Lex export in the cache directory."""
+
+    name: str
+    folder: str
+    csv_path: str
+    raw_csv_path: Optional[str] = None
+    parsing_code_path: Optional[str] = None
+    metadata_path: Optional[str] = None
+    fetch_path: Optional[str] = None
+    parquet_path: Optional[str] = None
+    run_report_path: Optional[str] = None
+    cube_path: Optional[str] = None
+    blocks_path: Optional[str] = None
+
+def _existing(path):
+    """Return path if the file exists, else None."""
+    return path if os.path.exists(path) else None
+
+def load_snapshot(csv_path):
+    """
+    Index the files belonging to a long-format CSV file.
+
+    Args:
+        csv_path (str): Path to the long-format CSV file (which may be packed)
+
+    Returns:
+        Snapshot: The snapshot, with None for files that do not exist
+    """
+    base = os.path.splitext(csv_path)[0]
+    raw_csv_path = base + '_raw.csv'
+    return Snapshot(
+        name=os.path.basename(base),
+        folder=os.path.dirname(csv_path),
+        csv_path=csv_path,
+        raw_csv_path=raw_csv_path if snapshot_store.exists(raw_csv_path) else None,
+        parsing_code_path=_existing(base + '_parsecode.py'),
+        metadata_path=_existing(base + '_metadata.json'),
+        fetch_path=_existing(base + '_fetch.json'),
+        parquet_path=_existing(columnar_store.parquet_path_for(csv_path)),
+        run_report_path=_existing(base + '_run.json'),
+        cube_path=_existing(base + '_cube.npz'),
+        blocks_path=_existing(base + '_blocks.json.gz')
+    )
+
+def _is_snapshot_csv(filename):
+    """Whether a file name in the cache directory is a long-format snapshot CSV."""
+    if filename.endswith(snapshot_store.MANIFEST_SUFFIX):
+        filename = filename[:-len(snapshot_store.MANIFEST_SUFFIX)]
+    return filename.endswith('.csv') and not filename.endswith(('_raw.csv', '_metadata.csv'))
+
+def discover_snapshots(cache_dir) -> List[Snapshot]:
+    """
+    List the snapshots in a cache directory, oldest first.
+
+    Snapshots live in their own folder (cache/<name>/<name>.csv, stored in
+    full or packed into blocks); long-format CSV files directly inside the
+    cache directory are listed as well. Raw exports, metadata and the block
+    store are never listed as snapshots themselves.
+
+    Args:
+        cache_dir (str): Directory containing snapshot folders
+
+    Returns:
+        list: Snapshot for each long-format CSV file, sorted by name
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+
+    found = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir():
+            if entry.name == snapshot_store.BLOCKS_DIR:
+                continue
+            csv_path = os.path.join(entry.path, entry.name + '.csv')
+            if snapshot_store.exists(csv_path):
+                found.append(load_snapshot(csv_path))
+        elif _is_snapshot_csv(entry.name):
+            csv_path = entry.path
+            if csv_path.endswith(snapshot_store.MANIFEST_SUFFIX):
+                csv_path = csv_path[:-len(snapshot_store.MANIFEST_SUFFIX)]
+            found.append(load_snapshot(csv_path))
+
+    # A flat CSV file may be listed twice, in full and as a manifest
+    unique = {snapshot.csv_path: snapshot for snapshot in found}
+    return sorted(unique.values(), key=lambda snapshot: (snapshot.name, snapshot.csv_path))
+
+def latest_snapshot(cache_dir, exclude=None) -> Optional[Snapshot]:
+    """
+    Return the most recent snapshot in a cache directory.
+
+    Args:
+        cache_dir (str): Directory containing snapshot folders
+        exclude (str): Snapshot name to ignore (e.g. the one being written)
+
+    Returns:
+        Snapshot: The snapshot with the greatest name, or None
+    """
+    candidates = [s for s in discover_snapshots(cache_dir) if s.name != exclude]
+    return candidates[-1] if candidates else None
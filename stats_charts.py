@@ -0,0 +1,189 @@
+import os
+import json
+import math
+import hashlib
+import functools
+from html import escape
+
+# Directory (inside the stats pages directory) caching the rendered charts of each snapshot
+CHART_CACHE_DIR = 'charts'
+
+# Width of the charts' coordinate system; the charts scale to the page width
+WIDTH = 720
+
+# Space left of, above and below the plot area of the yearly chart, for the axis labels
+MARGIN_LEFT = 44
+MARGIN_TOP = 8
+MARGIN_BOTTOM = 20
+
+# Height of the plot area of the yearly chart
+YEARLY_PLOT_HEIGHT = 200
+
+# Height of a category's label line and bar in the category chart
+LABEL_HEIGHT = 16
+BAR_HEIGHT = 14
+BAR_GAP = 10
+
+# Space right of the category bars for their totals
+TOTAL_WIDTH = 56
+
+# Minimum distance between two year labels
+MIN_LABEL_SPACING = 36
+
+@functools.lru_cache(maxsize=None)
+def chart_version():
+    """Return the SHA-256 of this module; charts rendered by other code are rendered again."""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _n(value):
+    """Format a coordinate with at most one decimal."""
+    return f"{value:.1f}".rstrip('0').rstrip('.')
+
+def _count(counts, key):
+    """Return a count of basic/amending/total counts, with missing counts as 0."""
+    return counts.get(key) or 0
+
+def _nice_step(maximum, ticks=4):
+    """Return a 1, 2 or 5 times a power of ten step dividing 0..maximum into about ticks intervals."""
+    if maximum <= 0:
+        return 1
+    raw = maximum / ticks
+    power = 10 ** math.floor(math.log10(raw))
+    for factor in (1, 2, 5, 10):
+        if factor * power >= raw:
+            return max(1, int(factor * power))
+
+def _svg(height, title, body):
+    """Wrap chart elements in an inline SVG element scaling to the page width."""
+    return (f'<svg class="chart" viewBox="0 0 {WIDTH} {height}" role="img" font-size="11">'
+            f'<title>{escape(title)}</title>{"".join(body)}</svg>')
+
+def yearly_chart(years):
+    """
+    Render the acts per year as a stacked basic/amending bar chart.
+
+    Args:
+        years (dict): basic/amending/total counts by year (see stats_data.snapshot_parts)
+
+    Returns:
+        str: Inline SVG element, or an empty string if there are no years
+    """
+    if not years:
+        return ''
+
+    labels = list(years)
+    maximum = max(_count(counts, 'basic') + _count(counts, 'amending') for counts in years.values())
+    step = _nice_step(maximum)
+    top = step * max(1, math.ceil(maximum / step))
+    plot_width = WIDTH - MARGIN_LEFT
+    slot = plot_width / len(labels)
+    bar = slot * 0.8
+    scale = YEARLY_PLOT_HEIGHT / top
+    bottom = MARGIN_TOP + YEARLY_PLOT_HEIGHT
+
+    # Horizontal grid lines with the counts they mark
+    grid = ''.join(f"M{MARGIN_LEFT} {_n(bottom - value * scale)}H{WIDTH}" for value in range(0, top + 1, step))
+    body = [f'<path class="grid" d="{grid}"/><g text-anchor="end">']
+    body += [f'<text x="{MARGIN_LEFT - 4}" y="{_n(bottom - value * scale + 4)}">{value}</text>'
+             for value in range(0, top + 1, step)]
+    body.append('</g>')
+
+    # One stacked bar per year, with its counts as tooltip
+    for index, (year, counts) in enumerate(years.items()):
+        basic = _count(counts, 'basic')
+        amending = _count(counts, 'amending')
+        x = _n(MARGIN_LEFT + index * slot + (slot - bar) / 2)
+        body.append(f'<g><title>{escape(str(year))}: {basic} basic, {amending} amending</title>'
+                    f'<rect class="b" x="{x}" y="{_n(bottom - basic * scale)}" width="{_n(bar)}" height="{_n(basic * scale)}"/>'
+                    f'<rect class="a" x="{x}" y="{_n(bottom - (basic + amending) * scale)}" width="{_n(bar)}" '
+                    f'height="{_n(amending * scale)}"/></g>')
+
+    # Label every year if there is room, otherwise round years only
+    label_step = next((s for s in (1, 2, 5, 10, 20, 50) if s * slot >= MIN_LABEL_SPACING), 100)
+    body.append('<g text-anchor="middle">')
+    body += [f'<text x="{_n(MARGIN_LEFT + (index + 0.5) * slot)}" y="{bottom + 14}">{escape(str(year))}</text>'
+             for index, year in enumerate(labels) if int(year) % label_step == 0]
+    body.append('</g>')
+
+    return _svg(bottom + MARGIN_BOTTOM, 'Acts per year, basic and amending', body)
+
+def category_chart(categories):
+    """
+    Render the acts per category as horizontal stacked basic/amending bars, largest first.
+
+    Args:
+        categories (dict): basic/amending/total counts by category (see stats_data.snapshot_parts)
+
+    Returns:
+        str: Inline SVG element, or an empty string if there are no categories
+    """
+    if not categories:
+        return ''
+
+    rows = sorted(categories.items(), key=lambda item: -(_count(item[1], 'basic') + _count(item[1], 'amending')))
+    maximum = max(_count(counts, 'basic') + _count(counts, 'amending') for _, counts in rows) or 1
+    scale = (WIDTH - TOTAL_WIDTH) / maximum
+    row_height = LABEL_HEIGHT + BAR_HEIGHT + BAR_GAP
+
+    body = []
+    for index, (category, counts) in enumerate(rows):
+        basic = _count(counts, 'basic')
+        amending = _count(counts, 'amending')
+        y = index * row_height
+        bar_y = y + LABEL_HEIGHT
+        body.append(f'<g><title>{escape(category)}: {basic} basic, {amending} amending</title>'
+                    f'<text y="{y + 12}">{escape(category)}</text>'
+                    f'<rect class="b" y="{bar_y}" width="{_n(basic * scale)}" height="{BAR_HEIGHT}"/>'
+                    f'<rect class="a" x="{_n(basic * scale)}" y="{bar_y}" width="{_n(amending * scale)}" height="{BAR_HEIGHT}"/>'
+                    f'<text x="{_n((basic + amending) * scale + 4)}" y="{bar_y + 11}">{basic + amending}</text></g>')
+
+    return _svg(len(rows) * row_height - BAR_GAP, 'Acts per category, basic and amending', body)
+
+def render_charts(years, categories):
+    """
+    Render the charts of a stats page.
+
+    Args:
+        years (dict): basic/amending/total counts by year
+        categories (dict): basic/amending/total counts by category
+
+    Returns:
+        dict: Inline SVG of the 'yearly' and 'categories' charts
+    """
+    return {'yearly': yearly_chart(years), 'categories': category_chart(categories)}
+
+def snapshot_charts(output_dir, snapshot_id, years, categories):
+    """
+    Return the charts of a snapshot's stats page, rendering them only if their data or this module changed.
+
+    The charts are cached as <output_dir>/charts/<snapshot_id>.json under a
+    hash of their data and the chart code, so rebuilding a page (e.g. for a
+    template change or a new DOI) reuses them.
+
+    Args:
+        output_dir (str): Directory for output HTML files
+        snapshot_id (str): Snapshot name
+        years (dict): basic/amending/total counts by year (see stats_data.snapshot_parts)
+        categories (dict): basic/amending/total counts by category
+
+    Returns:
+        dict: Inline SVG of the 'yearly' and 'categories' charts
+    """
+    data = json.dumps({'years': years, 'categories': categories}, separators=(',', ':'), sort_keys=True)
+    key = hashlib.sha256((chart_version() + data).encode('utf-8')).hexdigest()
+    cache_path = os.path.join(output_dir, CHART_CACHE_DIR, snapshot_id + '.json')
+
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached.get('key') == key:
+            return cached['charts']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    charts = render_charts(years, categories)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump({'key': key, 'charts': charts}, f)
+    return charts
@@ -0,0 +1,197 @@
+import os
+import gzip
+import json
+import math
+import importlib.util
+
+# Directory (inside the stats pages directory) holding the JSON data files
+DATA_DIR = 'data'
+
+# Name of the cross-snapshot manifest in the data directory
+MANIFEST_NAME = 'manifest.json'
+
+# JSON data files written per snapshot, by the part of the statistics they hold
+DATA_FILES = {
+    'summary': 'summary.json',
+    'years': 'years.json',
+    'categories': 'categories.json',
+    'act_types': 'act_types.json'
+}
+
+# JSON data file holding the changes since the previous snapshot, if there is one
+CHANGES_FILE = 'changes.json'
+
+def brotli_available():
+    """Whether the optional brotli dependency is installed."""
+    return importlib.util.find_spec('brotli') is not None
+
+def _number(value):
+    """Convert a (numpy) count to a JSON number, or None if it is missing."""
+    if value is None:
+        return None
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+def _counts(counts):
+    """Return basic/amending/total counts as JSON numbers."""
+    return {key: _number(counts[key]) for key in ('basic', 'amending', 'total')}
+
+def totals(stats):
+    """Return the total basic/amending/total counts of aggregated statistics as JSON numbers."""
+    return _counts({'basic': stats['basic_acts'], 'amending': stats['amending_acts'], 'total': stats['total_acts']})
+
+def change_rows(changes):
+    """
+    Flatten a diff summary into table rows.
+
+    Args:
+        changes (dict): Result of diff_snapshots.diff_summary
+
+    Returns:
+        list: [year, month, category, act_type, type, previous count, current count]
+            lists, changed cells first, then added and removed ones (None
+            for the count a cell did not have)
+    """
+    keys = ('year', 'month', 'category', 'act_type', 'type')
+    return ([[cell[key] for key in keys] + [_number(cell['old_count']), _number(cell['new_count'])]
+             for cell in changes['changed']] +
+            [[cell[key] for key in keys] + [None, _number(cell['count'])] for cell in changes['added']] +
+            [[cell[key] for key in keys] + [_number(cell['count']), None] for cell in changes['removed']])
+
+def write_json(path, data):
+    """
+    Write compact JSON together with gzip and (if available) brotli compressed copies.
+
+    The compressed files (path + '.gz', path + '.br') can be served as they
+    are to clients accepting those encodings. They are written
+    deterministically, so unchanged data yields unchanged files.
+
+    Args:
+        path (str): Path to the JSON file
+        data: JSON-serializable data
+
+    Returns:
+        list: Paths to the files written
+    """
+    content = json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    written = [path]
+    with open(path, 'wb') as f:
+        f.write(content)
+
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    written.append(path + '.gz')
+
+    if brotli_available():
+        import brotli
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(content, mode=brotli.MODE_TEXT, quality=11))
+        written.append(path + '.br')
+
+    return written
+
+def snapshot_data_dir(output_dir, snapshot_id):
+    """Return the directory holding the JSON data files of a snapshot."""
+    return os.path.join(output_dir, DATA_DIR, snapshot_id)
+
+def snapshot_parts(snapshot_id, stats, parsing_timestamp=None, doi=None):
+    """
+    Turn the aggregated statistics of a snapshot into the contents of its JSON data files.
+
+    Args:
+        snapshot_id (str): Snapshot name
+        stats (dict): Result of SnapshotCube.stats
+        parsing_timestamp (str): Parsing timestamp of the snapshot
+        doi (str): DOI of the snapshot, if any
+
+    Returns:
+        dict: JSON-serializable data by part (see DATA_FILES)
+    """
+    return {
+        'summary': {
+            'id': snapshot_id,
+            'parsing_timestamp': None if parsing_timestamp is None else str(parsing_timestamp),
+            'doi': doi,
+            'totals': totals(stats)
+        },
+        'years': {str(year): _counts(counts) for year, counts in stats['yearly_stats'].items()},
+        'categories': {category: _counts(counts) for category, counts in stats['category_stats'].items()},
+        'act_types': {category: {act_type: _counts(counts) for act_type, counts in act_types.items()}
+                      for category, act_types in stats['detailed_stats'].items()}
+    }
+
+def write_snapshot_data(output_dir, snapshot_id, stats, parsing_timestamp=None, doi=None, changes=None):
+    """
+    Write the pre-aggregated statistics of a snapshot as JSON data files.
+
+    summary.json holds the totals, years.json, categories.json and
+    act_types.json the per-year, per-category and per-category/act type
+    counts, so clients only fetch the part they need. changes.json holds
+    the changes since the previous snapshot, if given.
+
+    Args:
+        output_dir (str): Directory for output HTML files
+        snapshot_id (str): Snapshot name
+        stats (dict): Result of SnapshotCube.stats
+        parsing_timestamp (str): Parsing timestamp of the snapshot
+        doi (str): DOI of the snapshot, if any
+        changes (dict): Result of diff_snapshots.diff_summary, with the
+            previous snapshot's name as 'previous_name'
+
+    Returns:
+        dict: Path of each data file relative to the data directory, by part
+    """
+    data_dir = snapshot_data_dir(output_dir, snapshot_id)
+    os.makedirs(data_dir, exist_ok=True)
+
+    files = {}
+    for part, data in snapshot_parts(snapshot_id, stats, parsing_timestamp, doi).items():
+        write_json(os.path.join(data_dir, DATA_FILES[part]), data)
+        files[part] = f"{snapshot_id}/{DATA_FILES[part]}"
+
+    if changes is not None:
+        write_json(os.path.join(data_dir, CHANGES_FILE), {
+            'previous': changes['previous_name'],
+            'added_count': changes['added_count'],
+            'removed_count': changes['removed_count'],
+            'changed_count': changes['changed_count'],
+            'net_change': _number(changes['net_change']),
+            'rows': change_rows(changes)
+        })
+        files['changes'] = f"{snapshot_id}/{CHANGES_FILE}"
+    return files
+
+def snapshot_data_exists(output_dir, snapshot_id):
+    """Whether all JSON data files of a snapshot exist."""
+    data_dir = snapshot_data_dir(output_dir, snapshot_id)
+    return all(os.path.exists(os.path.join(data_dir, name)) for name in DATA_FILES.values())
+
+def write_manifest(output_dir, stats_files):
+    """
+    Write the cross-snapshot manifest listing every snapshot's totals and data files.
+
+    Args:
+        output_dir (str): Directory for output HTML files
+        stats_files (list): Page summaries returned by generate_stats_page
+
+    Returns:
+        str: Path to the manifest
+    """
+    entries = sorted((
+        {
+            'id': stats_file['id'],
+            'parsing_timestamp': None if stats_file['parsing_timestamp'] is None else str(stats_file['parsing_timestamp']),
+            'doi': stats_file['doi'],
+            'page': os.path.basename(stats_file['path']),
+            'totals': stats_file.get('totals'),
+            'files': stats_file.get('data_files')
+        }
+        for stats_file in stats_files
+    ), key=lambda entry: entry['id'])
+
+    manifest_path = os.path.join(output_dir, DATA_DIR, MANIFEST_NAME)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    write_json(manifest_path, {'snapshots': entries})
+    return manifest_path
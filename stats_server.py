@@ -0,0 +1,408 @@
+import os
+import gzip
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+import snapshot_store
+import snapshots
+import stats_data
+
+# Parts of a snapshot's statistics served per snapshot, as in its JSON data files
+PARTS = tuple(stats_data.DATA_FILES)
+
+# Default number of query results kept in the LRU cache
+DEFAULT_CACHE_SIZE = 1024
+
+# Default number of seconds between checks of the cache directory for new snapshots
+DEFAULT_POLL_INTERVAL = 10
+
+# Responses smaller than this are not gzip compressed
+GZIP_MIN_BYTES = 1024
+
+class LRUCache:
+    """Thread-safe cache keeping the most recently used query results."""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        """
+        Create an empty cache.
+
+        Args:
+            size (int): Maximum number of results kept (0 disables the cache)
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached result for key, or None."""
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Cache a result, evicting the least recently used one if the cache is full."""
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached results."""
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        """Return the number of cached results, hits and misses."""
+        with self._lock:
+            return {'size': len(self._items), 'max_size': self.size, 'hits': self.hits, 'misses': self.misses}
+
+def _file_state(csv_path):
+    """Return the size and modification time of a snapshot's CSV file (or its manifest, if packed)."""
+    for path in (csv_path, csv_path + snapshot_store.MANIFEST_SUFFIX):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        return stat.st_size, stat.st_mtime_ns
+    return None
+
+class SnapshotData:
+    """One snapshot held in memory as its cube (see snapshot_cube), with its unfiltered statistics."""
+
+    def __init__(self, snapshot):
+        """
+        Load a snapshot into memory.
+
+        Args:
+            snapshot (Snapshot): Snapshot to load
+        """
+        import snapshot_cube
+
+        self.name = snapshot.name
+        self.state = _file_state(snapshot.csv_path)
+        self.cube = snapshot_cube.load_snapshot_cube(snapshot.csv_path)
+        self.parsing_timestamp = self.cube.parsing_timestamp
+        self.doi = None
+        if snapshot.metadata_path:
+            with open(snapshot.metadata_path, 'r') as f:
+                doi_info = json.load(f)
+            self.doi = doi_info.get('doi')
+            if not self.parsing_timestamp:
+                self.parsing_timestamp = doi_info.get('parsing_timestamp')
+        self.parts = self.query()
+
+    def query(self, year_from=None, year_to=None, categories=None, act_types=None):
+        """
+        Aggregate the cells matching the given filters.
+
+        Args:
+            year_from (int): First year included
+            year_to (int): Last year included
+            categories (list): Categories included (None: all)
+            act_types (list): Act types included (None: all)
+
+        Returns:
+            dict: JSON-serializable data by part (see stats_data.snapshot_parts)
+        """
+        stats = self.cube.stats(year_from, year_to, categories, act_types)
+        return stats_data.snapshot_parts(self.name, stats, self.parsing_timestamp, self.doi)
+
+class QueryError(Exception):
+    """A request that cannot be answered, with the HTTP status to respond with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class StatsService:
+    """Class to serve the statistics of the latest snapshots from memory."""
+
+    def __init__(self, cache_dir='cache', keep=1, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Create a service for a cache directory; call reload() to load the snapshots.
+
+        Args:
+            cache_dir (str): Directory containing snapshot folders
+            keep (int): Number of most recent snapshots kept in memory
+            cache_size (int): Maximum number of query results cached
+        """
+        self.cache_dir = cache_dir
+        self.keep = max(keep, 1)
+        self.cache = LRUCache(cache_size)
+        self.loaded_at = None
+        # (generation, snapshots by name, latest name), replaced as a whole on reload
+        self._state = (0, {}, None)
+        self._signature = None
+        self._pending = None
+        self._reload_lock = threading.Lock()
+
+    def loaded_snapshots(self):
+        """Return the names of the snapshots being served, oldest first."""
+        return sorted(self._state[1])
+
+    def _discover(self):
+        """Return the snapshots to serve and their signature, used to detect changes."""
+        found = snapshots.discover_snapshots(self.cache_dir)[-self.keep:]
+        return found, tuple((snapshot.name, _file_state(snapshot.csv_path)) for snapshot in found)
+
+    def reload(self):
+        """
+        Load the latest snapshots if the cache directory changed since the last load.
+
+        Snapshots that are already loaded and unchanged are reused. A snapshot
+        that fails to load is reported and left out.
+
+        Returns:
+            bool: Whether the served snapshots were replaced
+        """
+        with self._reload_lock:
+            found, signature = self._discover()
+            if signature == self._signature:
+                return False
+            return self._load(found, signature)
+
+    def poll(self):
+        """
+        Reload if the cache directory changed and has been stable since the previous poll.
+
+        A snapshot being written shows up as changed on consecutive polls, so
+        it is only loaded once its files stopped changing.
+
+        Returns:
+            bool: Whether the served snapshots were replaced
+        """
+        with self._reload_lock:
+            found, signature = self._discover()
+            if signature == self._signature:
+                self._pending = None
+                return False
+            if signature != self._pending:
+                self._pending = signature
+                return False
+            return self._load(found, signature)
+
+    def _load(self, found, signature):
+        generation, loaded, _ = self._state
+        data = {}
+        for snapshot in found:
+            previous = loaded.get(snapshot.name)
+            if previous is not None and previous.state == _file_state(snapshot.csv_path):
+                data[snapshot.name] = previous
+                continue
+            try:
+                data[snapshot.name] = SnapshotData(snapshot)
+                print(f"Loaded snapshot {snapshot.name}")
+            except Exception as e:
+                print(f"Error loading snapshot {snapshot.name}: {e}")
+
+        latest = max(data) if data else None
+        self._state = (generation + 1, data, latest)
+        self._signature = signature
+        self._pending = None
+        self.loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.cache.clear()
+        return True
+
+    def _snapshot_list(self, data, latest):
+        return {
+            'latest': latest,
+            'snapshots': [{
+                'id': name,
+                'parsing_timestamp': data[name].parsing_timestamp,
+                'doi': data[name].doi,
+                'totals': data[name].parts['summary']['totals']
+            } for name in sorted(data)]
+        }
+
+    def _answer(self, data, latest, segments, params):
+        """Compute the JSON data answering a request."""
+        if segments in ([], ['snapshots']):
+            return self._snapshot_list(data, latest)
+        if segments == ['health']:
+            return {'status': 'ok', 'snapshots': len(data), 'latest': latest,
+                    'loaded_at': self.loaded_at, 'cache': self.cache.stats()}
+        if len(segments) not in (2, 3) or segments[0] != 'snapshots':
+            raise QueryError(404, 'Not found')
+
+        name = latest if segments[1] == 'latest' else segments[1]
+        part = segments[2] if len(segments) == 3 else 'summary'
+        if name not in data:
+            raise QueryError(404, f"Snapshot {segments[1]} is not loaded")
+        if part not in PARTS:
+            raise QueryError(404, f"Unknown part {part} (expected one of {', '.join(PARTS)})")
+
+        unknown = set(params) - {'year_from', 'year_to', 'category', 'act_type'}
+        if unknown:
+            raise QueryError(400, f"Unknown query parameter {sorted(unknown)[0]}")
+        try:
+            year_from = int(params['year_from'][-1]) if 'year_from' in params else None
+            year_to = int(params['year_to'][-1]) if 'year_to' in params else None
+        except ValueError:
+            raise QueryError(400, 'year_from and year_to must be years')
+        if year_from is None and year_to is None and not params:
+            return data[name].parts[part]
+        return data[name].query(year_from, year_to, params.get('category'), params.get('act_type'))[part]
+
+    def respond(self, path):
+        """
+        Answer a GET request.
+
+        Results are cached by snapshot generation, path and query, so repeated
+        queries are served from the LRU cache until the next reload.
+
+        Args:
+            path (str): Request path with its query string
+
+        Returns:
+            tuple: HTTP status and the cached response (dict with 'body',
+                'gzip' (None for small bodies) and 'etag')
+        """
+        generation, data, latest = self._state
+        url = urlsplit(path)
+        params = parse_qs(url.query)
+        key = (generation, url.path.rstrip('/'), tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        if key[1] != '/health':
+            cached = self.cache.get(key)
+            if cached is not None:
+                return 200, cached
+
+        segments = [unquote(segment) for segment in url.path.split('/') if segment]
+        try:
+            status, result = 200, self._answer(data, latest, segments, params)
+        except QueryError as e:
+            status, result = e.status, {'error': str(e)}
+
+        body = json.dumps(result, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        response = {
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None,
+            'etag': '"' + hashlib.sha1(body).hexdigest() + '"'
+        }
+        if status == 200 and key[1] != '/health':
+            self.cache.put(key, response)
+        return status, response
+
+class StatsRequestHandler(BaseHTTPRequestHandler):
+    """Request handler answering GET requests from the server's StatsService."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, keep-alive
+    # clients wait for delayed ACKs on every response
+    disable_nagle_algorithm = True
+
+    def _send(self, include_body):
+        status, response = self.server.service.respond(self.path)
+        if status == 200 and self.headers.get('If-None-Match') == response['etag']:
+            self.send_response(304)
+            self.send_header('ETag', response['etag'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = response['body']
+        compressed = response['gzip'] and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compressed:
+            body = response['gzip']
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', response['etag'])
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if include_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._send(include_body=True)
+
+    def do_HEAD(self):
+        self._send(include_body=False)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def _watch(service, interval, stopped):
+    """Poll the cache directory for new snapshots until stopped is set."""
+    while not stopped.wait(interval):
+        try:
+            service.poll()
+        except Exception as e:
+            print(f"Error checking {service.cache_dir} for new snapshots: {e}")
+
+def make_server(cache_dir='cache', host='127.0.0.1', port=8000, keep=1, cache_size=DEFAULT_CACHE_SIZE,
+                poll_interval=DEFAULT_POLL_INTERVAL, verbose=False):
+    """
+    Create a statistics server with its snapshots loaded; call serve_forever() to start serving.
+
+    Args:
+        cache_dir (str): Directory containing snapshot folders
+        host (str): Address to listen on
+        port (int): Port to listen on (0: any free port, see server.server_address)
+        keep (int): Number of most recent snapshots kept in memory
+        cache_size (int): Maximum number of query results cached
+        poll_interval (float): Seconds between checks for new snapshots (0: no hot reload)
+        verbose (bool): Whether to log every request
+
+    Returns:
+        ThreadingHTTPServer: The server, with the StatsService as server.service
+    """
+    service = StatsService(cache_dir, keep=keep, cache_size=cache_size)
+    service.reload()
+
+    server = ThreadingHTTPServer((host, port), StatsRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    server.stop_watching = threading.Event()
+    if poll_interval:
+        threading.Thread(target=_watch, args=(service, poll_interval, server.stop_watching),
+                         name='snapshot-watcher', daemon=True).start()
+    return server
+
+def main():
+    """Serve the statistics of the latest snapshots over HTTP."""
+    parser = argparse.ArgumentParser(description='Serve EUR-Lex statistics from memory over HTTP.')
+    parser.add_argument('--cache-dir', default='cache', help='Directory containing snapshot folders')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--snapshots', type=int, default=1, help='Number of most recent snapshots to serve')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='Maximum number of query results cached (0 disables the cache)')
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='Seconds between checks for new snapshots (0 disables hot reload)')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    server = make_server(args.cache_dir, args.host, args.port, keep=args.snapshots, cache_size=args.cache_size,
+                         poll_interval=args.poll, verbose=args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Serving statistics of {', '.join(server.service.loaded_snapshots()) or 'no snapshots'} on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop_watching.set()
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
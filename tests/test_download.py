@@ -0,0 +1,123 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import snapshots
+import parse_legal_acts_statistics
+from parse_legal_acts_statistics import ExportChangedError, stream_export, fetch_export, open_raw_text
+from export_parser import parse_export_blocks
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+class ExportHandler(BaseHTTPRequestHandler):
+    """Request handler serving the server's current export version, honouring Range and If-Range."""
+
+    protocol_version = 'HTTP/1.1'
+    timeout = 5
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(self.headers))
+            # Each scripted response: version served, bytes sent before the connection drops, bytes missing
+            version, cut, missing = server.script.pop(0) if server.script else (server.version, None, 0)
+            server.version = version
+        content, etag = server.versions[version]
+
+        status, body, headers = 200, content, {}
+        if_range = self.headers.get('If-Range')
+        if self.headers.get('Range') and (if_range is None or if_range == etag):
+            start = int(self.headers['Range'][len('bytes='):-1])
+            if start >= len(content):
+                status, body, headers = 416, b'', {'Content-Range': f'bytes */{len(content)}'}
+            else:
+                status, body = 206, content[start:]
+                headers = {'Content-Range': f'bytes {start}-{len(content) - 1}/{len(content)}'}
+
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) + missing))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body if cut is None else body[:cut])
+        if cut is not None or missing:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    found = snapshots.discover_snapshots(CACHE_DIR)
+    raw = [snapshot.raw_csv_path for snapshot in found if snapshot.raw_csv_path]
+    if len(raw) < 2:
+        pytest.skip(f"Needs two raw exports in {CACHE_DIR}")
+    monkeypatch.setattr(parse_legal_acts_statistics.time, 'sleep', lambda seconds: None)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ExportHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.script = []
+    server.version = 0
+    server.versions = []
+    for index, path in enumerate((raw[0], raw[-1])):
+        with open(path, 'rb') as f:
+            server.versions.append((f.read(), f'"v{index}"'))
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/export.csv"
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def _download(server, tmp_path, chunk_size=64 * 1024):
+    path = str(tmp_path / 'raw.csv')
+    fetch_info = {}
+    text = ''.join(stream_export(server.url, path, chunk_size=chunk_size, fetch_info=fetch_info))
+    with open(path, 'rb') as f:
+        return text, f.read(), fetch_info
+
+def test_interrupted_download_is_resumed_if_unchanged(server, tmp_path):
+    content, etag = server.versions[0]
+    server.script = [(0, len(content) // 2, 0)]
+    text, stored, fetch_info = _download(server, tmp_path)
+    assert stored == content
+    assert text == content.decode('utf-8-sig', errors='replace')
+    # The resumed request starts after the last complete chunk received
+    assert 0 < int(server.requests[1]['Range'][len('bytes='):-1]) <= len(content) // 2
+    assert server.requests[1]['If-Range'] == etag
+    assert fetch_info['etag'] == etag
+    assert fetch_info['size'] == len(content)
+
+def test_changed_export_is_not_appended(server, tmp_path):
+    content, _ = server.versions[0]
+    server.script = [(0, len(content) // 2, 0), (1, None, 0)]
+    with pytest.raises(ExportChangedError):
+        _download(server, tmp_path)
+
+def test_connection_dropped_after_the_last_byte(server, tmp_path):
+    content, _ = server.versions[0]
+    server.script = [(0, None, 1)]
+    # One chunk for the whole export, so that every byte is received before the connection drops
+    _, stored, fetch_info = _download(server, tmp_path, chunk_size=len(content))
+    assert stored == content
+    assert fetch_info['size'] == len(content)
+    assert server.requests[1]['Range'] == f'bytes={len(content)}-'
+
+def test_changed_export_is_downloaded_again(server, tmp_path):
+    content, _ = server.versions[0]
+    server.script = [(0, len(content) // 2, 0), (1, None, 0)]
+    totals = []
+    raw_csv_filename = str(tmp_path / 'raw.csv')
+    columns, _ = fetch_export(server.url, raw_csv_filename, totals=totals)
+
+    new_content, _ = server.versions[1]
+    with open(raw_csv_filename, 'rb') as f:
+        assert f.read() == new_content
+    expected_totals = []
+    with open_raw_text(raw_csv_filename) as f:
+        expected_columns, _ = parse_export_blocks(f, None, expected_totals)
+    assert columns == expected_columns
+    assert totals == expected_totals
@@ -0,0 +1,193 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import pytest
+import requests
+from http_session import create_session
+from zenodo_publisher import ZenodoPublisher
+from github_publisher import GitHubPublisher
+
+DOI = '10.5281/zenodo.1'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler answering like the parts of the Zenodo and GitHub APIs the publishers use."""
+
+    protocol_version = 'HTTP/1.1'
+    # Fail instead of hanging if a retried request body was not rewound
+    timeout = 5
+
+    def _handle(self):
+        api = self.server
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with api.lock:
+            api.requests.append((self.command, url.path, body))
+            failures = api.failures.get((self.command, url.path))
+            status, applied = failures.pop(0) if failures else (None, True)
+
+        # A request applied as 'starter' leaves an incomplete asset, like a GitHub upload failing midway
+        state = 'starter' if applied == 'starter' else 'uploaded'
+        result = api.route(self.command, url.path, parse_qs(url.query), body, state) if applied else {}
+        if isinstance(result, tuple):
+            status, result = result
+        data = json.dumps(result).encode('utf-8')
+        self.send_response(status or 200)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+class StubAPI(ThreadingHTTPServer):
+    """Server recording every request and failing requests as scripted in failures."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.lock = threading.Lock()
+        self.requests = []
+        # Statuses to respond with by (method, path), with whether the request still takes effect
+        # (True, False or 'starter')
+        self.failures = {}
+        self.files = {}
+        self.assets = []
+        self.next_asset_id = 0
+
+    def fail(self, method, path, *statuses, applied=False):
+        self.failures.setdefault((method, path), []).extend((status, applied) for status in statuses)
+
+    def requests_to(self, method, path):
+        return [body for request_method, request_path, body in self.requests
+                if (request_method, request_path) == (method, path)]
+
+    def route(self, method, path, query, body, state='uploaded'):
+        if (method, path) == ('POST', '/api/deposit/depositions'):
+            return {'id': 1, 'links': {'bucket': f"{self.url}/files/bucket"}}
+        if method == 'PUT' and path.startswith('/files/bucket/'):
+            self.files[path.rsplit('/', 1)[1]] = body
+            return {'key': path.rsplit('/', 1)[1], 'size': len(body)}
+        if (method, path) == ('POST', '/api/deposit/depositions/1/actions/publish'):
+            return {'doi': DOI, 'metadata': json.loads(self.requests_to('POST', '/api/deposit/depositions')[0])['metadata']}
+        if (method, path) == ('POST', '/repos/owner/repo/releases'):
+            return {'id': 7, 'upload_url': f"{self.url}/uploads/repos/owner/repo/releases/7/assets{{?name,label}}",
+                    **json.loads(body)}
+        if (method, path) == ('POST', '/uploads/repos/owner/repo/releases/7/assets'):
+            if any(asset['name'] == query['name'][0] for asset in self.assets):
+                return 422, {'errors': [{'code': 'already_exists'}]}
+            self.next_asset_id += 1
+            asset = {'id': self.next_asset_id, 'name': query['name'][0], 'size': len(body), 'state': state}
+            if state == 'uploaded':
+                self.files[asset['name']] = body
+            self.assets.append(asset)
+            return asset
+        if method == 'DELETE' and path.startswith('/repos/owner/repo/releases/assets/'):
+            asset_id = int(path.rsplit('/', 1)[1])
+            self.assets = [asset for asset in self.assets if asset['id'] != asset_id]
+            return {}
+        if (method, path) == ('GET', '/repos/owner/repo/releases/7/assets'):
+            return self.assets
+        if (method, path) == ('PATCH', '/repos/owner/repo/releases/7'):
+            return {'id': 7, **json.loads(body)}
+        return {}
+
+@pytest.fixture
+def api():
+    server = StubAPI()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name, size in (('snapshot.csv', 300 * 1024), ('snapshot_raw.csv', 5000)):
+        path = tmp_path / name
+        path.write_bytes(bytes(range(256)) * (size // 256))
+        paths[name] = str(path)
+    return paths
+
+def _zenodo(api):
+    return ZenodoPublisher(token='token', base_url=f"{api.url}/api", session=create_session(retries=3, backoff_factor=0),
+                           progress=None)
+
+def _github(api):
+    return GitHubPublisher(token='token', repo_owner='owner', repo_name='repo', api_url=api.url,
+                           session=create_session(retries=3, backoff_factor=0), progress=None, retry_backoff=0)
+
+def _contents(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_zenodo_deposit(api, files):
+    doi = _zenodo(api).create_or_update_deposit(files['snapshot.csv'], '2025_03', raw_csv_path=files['snapshot_raw.csv'])
+    assert doi == DOI
+    assert api.files == {name: _contents(path) for name, path in files.items()}
+
+def test_zenodo_upload_is_retried_with_the_body_rewound(api, files):
+    api.fail('PUT', '/files/bucket/snapshot.csv', 503, 502)
+    _zenodo(api).create_or_update_deposit(files['snapshot.csv'], '2025_03')
+    # Every attempt sent the whole file
+    assert api.requests_to('PUT', '/files/bucket/snapshot.csv') == [_contents(files['snapshot.csv'])] * 3
+    assert api.files['snapshot.csv'] == _contents(files['snapshot.csv'])
+
+def test_zenodo_deposit_is_not_repeated_after_a_server_error(api, files):
+    api.fail('POST', '/api/deposit/depositions', 502, applied=True)
+    with pytest.raises(requests.HTTPError):
+        _zenodo(api).create_or_update_deposit(files['snapshot.csv'], '2025_03')
+    assert len(api.requests_to('POST', '/api/deposit/depositions')) == 1
+
+def test_zenodo_deposit_is_retried_when_rate_limited(api, files):
+    api.fail('POST', '/api/deposit/depositions', 429)
+    assert _zenodo(api).create_or_update_deposit(files['snapshot.csv'], '2025_03') == DOI
+    assert len(api.requests_to('POST', '/api/deposit/depositions')) == 2
+
+def test_github_release(api, files):
+    release = _github(api).create_release('v1', csv_path=files['snapshot.csv'],
+                                          additional_files=[files['snapshot_raw.csv']])
+    assert release['tag_name'] == 'v1'
+    assert sorted(asset['name'] for asset in api.assets) == sorted(files)
+    assert api.files == {name: _contents(path) for name, path in files.items()}
+
+def test_github_upload_is_repeated_with_the_body_rewound(api, files):
+    upload_path = '/uploads/repos/owner/repo/releases/7/assets'
+    api.fail('POST', upload_path, 502, 500)
+    _github(api).create_release('v1', csv_path=files['snapshot.csv'])
+    assert api.requests_to('POST', upload_path) == [_contents(files['snapshot.csv'])] * 3
+    assert [asset['name'] for asset in api.assets] == ['snapshot.csv']
+
+def test_github_upload_is_not_repeated_if_the_asset_was_created(api, files):
+    upload_path = '/uploads/repos/owner/repo/releases/7/assets'
+    api.fail('POST', upload_path, 502, applied=True)
+    assets = _github(api).upload_assets(f"{api.url}{upload_path}{{?name,label}}", [files['snapshot.csv']])
+    assert len(api.requests_to('POST', upload_path)) == 1
+    assert assets == api.assets
+
+def test_github_upload_is_repeated_if_only_a_starter_asset_was_created(api, files):
+    upload_path = '/uploads/repos/owner/repo/releases/7/assets'
+    api.fail('POST', upload_path, 502, applied='starter')
+    assets = _github(api).upload_assets(f"{api.url}{upload_path}{{?name,label}}", [files['snapshot.csv']])
+    # The incomplete asset was deleted before the file was uploaded again
+    assert len(api.requests_to('DELETE', '/repos/owner/repo/releases/assets/1')) == 1
+    assert api.requests_to('POST', upload_path) == [_contents(files['snapshot.csv'])] * 2
+    assert assets == api.assets
+    assert [(asset['name'], asset['state']) for asset in api.assets] == [('snapshot.csv', 'uploaded')]
+    assert api.files['snapshot.csv'] == _contents(files['snapshot.csv'])
+
+def test_github_add_doi(api):
+    github = _github(api)
+    release = github.add_doi({'id': 7, 'body': 'Notes'}, DOI)
+    patched = json.loads(api.requests_to('PATCH', '/repos/owner/repo/releases/7')[0])
+    assert patched['body'].startswith('Notes')
+    assert f"[{DOI}](https://doi.org/{DOI})" in patched['body']
+    assert release['body'] == patched['body']
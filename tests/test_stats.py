@@ -0,0 +1,43 @@
+import os
+import pytest
+import columnar_store
+import snapshots
+import snapshot_cube
+import quick_stats
+from benchmark import legacy_aggregate_stats
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+def _snapshots():
+    # The oldest and the latest snapshot cover the exports' changes in shape
+    found = snapshots.discover_snapshots(CACHE_DIR)
+    return found[:1] + found[-1:] if len(found) > 1 else found
+
+def _rendered(stats):
+    """Return stats as the strings the template renders, in iteration order."""
+    if isinstance(stats, dict):
+        return [(str(key), _rendered(value)) for key, value in stats.items()]
+    return str(stats)
+
+@pytest.fixture(scope='module', params=_snapshots(), ids=lambda snapshot: snapshot.name)
+def snapshot_frame(request):
+    return request.param, columnar_store.load_snapshot_frame(request.param.csv_path)
+
+def test_cube_stats_match_legacy_aggregation(snapshot_frame):
+    _, df = snapshot_frame
+    assert _rendered(snapshot_cube.SnapshotCube.from_frame(df).stats()) == _rendered(legacy_aggregate_stats(df))
+
+def test_filtered_cube_stats_match_legacy_aggregation(snapshot_frame):
+    _, df = snapshot_frame
+    category = sorted(df['category'].unique())[0]
+    year_from, year_to = 2000, 2010
+    expected = legacy_aggregate_stats(df[(df['year'] >= year_from) & (df['year'] <= year_to) &
+                                         (df['category'] == category)])
+    stats = snapshot_cube.SnapshotCube.from_frame(df).stats(year_from=year_from, year_to=year_to,
+                                                            categories=[category])
+    assert _rendered(stats) == _rendered(expected)
+
+def test_quick_stats_match_cube_stats(snapshot_frame):
+    snapshot, df = snapshot_frame
+    stats = quick_stats.summarize(quick_stats.read_columns(snapshot.csv_path))
+    assert _rendered(stats) == _rendered(snapshot_cube.SnapshotCube.from_frame(df).stats())
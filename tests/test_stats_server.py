@@ -0,0 +1,103 @@
+import os
+import gzip
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+import pytest
+import snapshots
+import stats_server
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    found = snapshots.discover_snapshots(CACHE_DIR)
+    if not found:
+        pytest.skip(f"No snapshots in {CACHE_DIR}")
+
+    # Serve a copy of the latest snapshot, so that its cube is not written into the repository
+    cache_dir = tmp_path_factory.mktemp('cache')
+    snapshot_dir = cache_dir / found[-1].name
+    snapshot_dir.mkdir()
+    shutil.copyfile(found[-1].csv_path, snapshot_dir / os.path.basename(found[-1].csv_path))
+
+    server = stats_server.make_server(str(cache_dir), port=0, poll_interval=0)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server, found[-1].name
+    server.shutdown()
+    server.server_close()
+
+def _get(server, path, headers=None):
+    """Return the status, headers and body of a GET request to the server."""
+    host, port = server.server_address[:2]
+    request = urllib.request.Request(f"http://{host}:{port}{path}", headers=headers or {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+def _json(server, path):
+    status, _, body = _get(server, path)
+    return status, json.loads(body)
+
+def test_snapshot_list(server):
+    server, name = server
+    for path in ('/', '/snapshots', '/snapshots/'):
+        status, data = _json(server, path)
+        assert status == 200
+        assert data['latest'] == name
+        assert [snapshot['id'] for snapshot in data['snapshots']] == [name]
+
+def test_health(server):
+    server, name = server
+    status, data = _json(server, '/health')
+    assert status == 200
+    assert data['status'] == 'ok'
+    assert data['latest'] == name
+
+def test_latest_is_an_alias(server):
+    server, name = server
+    for part in stats_server.PARTS:
+        assert _json(server, f'/snapshots/latest/{part}') == _json(server, f'/snapshots/{name}/{part}')
+    status, summary = _json(server, '/snapshots/latest')
+    assert status == 200
+    assert summary['id'] == name
+
+def test_filtered_query(server):
+    server, _ = server
+    status, years = _json(server, '/snapshots/latest/years?year_from=2000&year_to=2001')
+    assert status == 200
+    assert list(years) == ['2000', '2001']
+
+    _, all_years = _json(server, '/snapshots/latest/years')
+    assert years == {year: all_years[year] for year in ('2000', '2001')}
+
+@pytest.mark.parametrize('path', ['/unknown', '/snapshots/19990101_000000', '/snapshots/latest/unknown',
+                                  '/snapshots/latest/years/extra'])
+def test_not_found(server, path):
+    server, _ = server
+    status, data = _json(server, path)
+    assert status == 404
+    assert data['error']
+
+@pytest.mark.parametrize('query', ['year_from=abc', 'year_to=2000x', 'unknown=1'])
+def test_bad_request(server, query):
+    server, _ = server
+    status, data = _json(server, f'/snapshots/latest/years?{query}')
+    assert status == 400
+    assert data['error']
+
+def test_etag_and_gzip(server):
+    server, _ = server
+    status, headers, body = _get(server, '/snapshots/latest/act_types', {'Accept-Encoding': 'gzip'})
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(body))
+
+    status, _, body = _get(server, '/snapshots/latest/act_types', {'If-None-Match': headers['ETag']})
+    assert status == 304
+    assert body == b''
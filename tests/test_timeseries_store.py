@@ -0,0 +1,57 @@
+import os
+import shutil
+import pytest
+import columnar_store
+import snapshots
+from timeseries_store import TimeSeriesStore, sync_snapshots
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    found = snapshots.discover_snapshots(CACHE_DIR)
+    if not found:
+        pytest.skip(f"No snapshots in {CACHE_DIR}")
+
+    # Sync a copy of the oldest and the latest snapshot
+    cache_dir = tmp_path_factory.mktemp('cache')
+    for snapshot in {found[0].name: found[0], found[-1].name: found[-1]}.values():
+        (cache_dir / snapshot.name).mkdir()
+        shutil.copyfile(snapshot.csv_path, cache_dir / snapshot.name / os.path.basename(snapshot.csv_path))
+    store = TimeSeriesStore(str(tmp_path_factory.mktemp('db') / 'timeseries.sqlite'))
+    added = sync_snapshots(store, str(cache_dir))
+    frames = {name: columnar_store.load_snapshot_frame(str(cache_dir / name / f"{name}.csv")) for name in added}
+    yield store, frames
+    store.close()
+
+def test_sync_adds_every_snapshot(store):
+    store, frames = store
+    assert [name for name, _ in store.snapshots()] == sorted(frames)
+
+def test_cells_match_csv(store):
+    store, frames = store
+    for name, df in frames.items():
+        expected = sorted((int(year), int(month), category, act_type, type_, int(count))
+                          for year, month, category, act_type, type_, count
+                          in zip(df['year'], df['month'], df['category'], df['act_type'], df['type'], df['count']))
+        assert store.cells(name) == expected
+
+@pytest.mark.parametrize('filters', [{}, {'year': 2010}, {'year': 2010, 'month': 3, 'type': 'basic'},
+                                     {'act_type': 'Council regulations', 'year': 2010}, {'category': 'Implementing acts'}])
+def test_series_match_csv(store, filters):
+    store, frames = store
+    expected = []
+    for name in sorted(frames):
+        df = frames[name]
+        for key, value in filters.items():
+            df = df[df[key] == value]
+        if len(df):
+            expected.append((name, int(df['count'].sum())))
+    assert expected
+    assert store.series(**filters) == expected
+
+def test_year_queries_use_the_year_index(store):
+    store, _ = store
+    plan = store.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT SUM(count) FROM counts WHERE year = ? GROUP BY snapshot_id", (2010,)).fetchall()
+    assert any('counts_by_year' in row[-1] for row in plan)
@@ -0,0 +1,238 @@
+import os
+import math
+import sqlite3
+import argparse
+
+# Default location of the time-series database
+DEFAULT_DB_PATH = os.path.join('cache', 'timeseries.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    parsing_date TEXT
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS act_types (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS counts (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    act_type_id INTEGER NOT NULL REFERENCES act_types(id),
+    type TEXT NOT NULL,
+    count INTEGER,
+    PRIMARY KEY (snapshot_id, year, month, category_id, act_type_id, type)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS counts_by_act_type ON counts (act_type_id, year, month, snapshot_id);
+CREATE INDEX IF NOT EXISTS counts_by_category ON counts (category_id, year, month, snapshot_id);
+CREATE INDEX IF NOT EXISTS counts_by_year ON counts (year, month, type, snapshot_id, count);
+"""
+
+# Columns of the long-format output stored per row
+ROW_COLUMNS = ['year', 'month', 'category', 'act_type', 'type', 'count']
+
+def frame_rows(df):
+    """Return the rows of a long-format frame as (year, month, category, act_type, type, count) tuples."""
+    return zip(*(df[column] for column in ROW_COLUMNS))
+
+class TimeSeriesStore:
+    """Class to store the counts of all snapshots in one indexed SQLite database."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        """
+        Open (and create if needed) a time-series database.
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def _label_ids(self, table, names):
+        """Return ids for category or act type names, adding the missing ones."""
+        names = set(names)
+        self.connection.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(n,) for n in names])
+        return {name: id_ for id_, name in self.connection.execute(f"SELECT id, name FROM {table}")
+                if name in names}
+
+    def has_snapshot(self, name):
+        """Whether a snapshot is already stored."""
+        return self.connection.execute("SELECT 1 FROM snapshots WHERE name = ?", (name,)).fetchone() is not None
+
+    def add_snapshot(self, name, rows, parsing_date=None, replace=False):
+        """
+        Store the counts of a snapshot.
+
+        Args:
+            name (str): Snapshot name (e.g. 20260501_001654)
+            rows (iterable): (year, month, category, act_type, type, count) tuples
+            parsing_date (str): Parsing timestamp of the snapshot
+            replace (bool): Whether to replace a snapshot that is already stored
+
+        Returns:
+            bool: Whether the snapshot was stored (False if it already was and replace is False)
+        """
+        rows = list(rows)
+        with self.connection:
+            if self.has_snapshot(name):
+                if not replace:
+                    return False
+                self.connection.execute("DELETE FROM snapshots WHERE name = ?", (name,))
+
+            snapshot_id = self.connection.execute(
+                "INSERT INTO snapshots (name, parsing_date) VALUES (?, ?)", (name, parsing_date)
+            ).lastrowid
+            category_ids = self._label_ids('categories', (row[2] for row in rows))
+            act_type_ids = self._label_ids('act_types', (row[3] for row in rows))
+
+            self.connection.executemany(
+                "INSERT INTO counts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((snapshot_id, int(year), int(month), category_ids[category], act_type_ids[act_type], type_,
+                  None if count is None or (isinstance(count, float) and math.isnan(count)) else int(count))
+                 for year, month, category, act_type, type_, count in rows)
+            )
+        return True
+
+    def snapshots(self):
+        """
+        List the stored snapshots.
+
+        Returns:
+            list: (name, parsing_date) tuples, oldest first
+        """
+        return self.connection.execute("SELECT name, parsing_date FROM snapshots ORDER BY name").fetchall()
+
+    def series(self, act_type=None, category=None, year=None, month=None, type=None):
+        """
+        Return the summed count of matching cells in every snapshot.
+
+        Filters that are None match everything, so e.g. series(act_type=X,
+        year=2010) answers how the 2010 count of act type X changed across
+        snapshots.
+
+        Args:
+            act_type (str): Act type to match
+            category (str): Category to match
+            year (int): Year to match
+            month (int): Month to match
+            type (str): 'basic' or 'amending'
+
+        Returns:
+            list: (snapshot name, count) tuples, oldest first
+        """
+        conditions = []
+        params = []
+        if act_type is not None:
+            conditions.append("c.act_type_id = (SELECT id FROM act_types WHERE name = ?)")
+            params.append(act_type)
+        if category is not None:
+            conditions.append("c.category_id = (SELECT id FROM categories WHERE name = ?)")
+            params.append(category)
+        for column, value in (('year', year), ('month', month), ('type', type)):
+            if value is not None:
+                conditions.append(f"c.{column} = ?")
+                params.append(value)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = f"""
+            SELECT s.name, SUM(c.count)
+            FROM counts c JOIN snapshots s ON s.id = c.snapshot_id
+            {where}
+            GROUP BY s.id
+            ORDER BY s.name
+        """
+        return self.connection.execute(query, params).fetchall()
+
+    def cells(self, snapshot):
+        """
+        Return all cells of a snapshot.
+
+        Args:
+            snapshot (str): Snapshot name
+
+        Returns:
+            list: (year, month, category, act_type, type, count) tuples
+        """
+        return self.connection.execute("""
+            SELECT c.year, c.month, cat.name, act.name, c.type, c.count
+            FROM counts c
+            JOIN snapshots s ON s.id = c.snapshot_id
+            JOIN categories cat ON cat.id = c.category_id
+            JOIN act_types act ON act.id = c.act_type_id
+            WHERE s.name = ?
+            ORDER BY c.year, c.month, cat.name, act.name, c.type
+        """, (snapshot,)).fetchall()
+
+def sync_snapshots(store, cache_dir):
+    """
+    Add the snapshots of a cache directory that are not stored yet.
+
+    Args:
+        store (TimeSeriesStore): Time-series database
+        cache_dir (str): Directory containing snapshot folders
+
+    Returns:
+        list: Names of the snapshots that were added
+    """
+    import snapshots
+    import columnar_store
+
+    added = []
+    for snapshot in snapshots.discover_snapshots(cache_dir):
+        if store.has_snapshot(snapshot.name):
+            continue
+        df = columnar_store.load_snapshot_frame(snapshot.csv_path)
+        parsing_date = str(df['parsing_date'].iloc[0]) if 'parsing_date' in df.columns and len(df) else None
+        store.add_snapshot(snapshot.name, frame_rows(df), parsing_date)
+        added.append(snapshot.name)
+    return added
+
+def main():
+    """Sync the time-series database with the cache directory, or query it."""
+    parser = argparse.ArgumentParser(description='Cross-snapshot time-series database of legal act counts.')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Path to the SQLite database')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help='Add the snapshots of a cache directory that are not stored yet')
+    sync_parser.add_argument('--input', '-i', default='cache', help='Directory containing snapshot folders')
+
+    query_parser = subparsers.add_parser('query', help='Show how a count changed across snapshots')
+    query_parser.add_argument('--act-type', help='Act type to match')
+    query_parser.add_argument('--category', help='Category to match')
+    query_parser.add_argument('--year', type=int, help='Year to match')
+    query_parser.add_argument('--month', type=int, help='Month to match')
+    query_parser.add_argument('--type', choices=['basic', 'amending'], help='Basic or amending acts')
+
+    args = parser.parse_args()
+
+    with TimeSeriesStore(args.db) as store:
+        if args.command == 'sync':
+            added = sync_snapshots(store, args.input)
+            print(f"Added {len(added)} snapshots to {args.db}")
+        else:
+            for name, count in store.series(act_type=args.act_type, category=args.category,
+                                            year=args.year, month=args.month, type=args.type):
+                print(f"{name}\t{count}")
+
+if __name__ == '__main__':
+    main()
@@ -1,26 +1,40 @@
 import os
 import json
-import requests
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http_session import create_session, FileUpload, print_progress
+import instrumentation
 
 class ZenodoPublisher:
     """Class to handle publishing datasets to Zenodo and obtaining DOIs."""
     
-    def __init__(self, token=None, sandbox=True):
+    def __init__(self, token=None, sandbox=True, base_url=None, doi_resolver_url="https://doi.org",
+                 session=None, max_workers=3, progress=print_progress):
         """
         Initialize the Zenodo publisher.
         
         Args:
             token (str): Zenodo API token
             sandbox (bool): Whether to use Zenodo Sandbox (testing) environment
+            base_url (str): Base URL of the Zenodo API, overriding sandbox (e.g. a local mock server for testing)
+            doi_resolver_url (str): Base URL DOIs are resolved against for citation metadata
+            session (requests.Session): Session to send requests with (default: pooled, retrying session)
+            max_workers (int): Maximum number of files uploaded concurrently
+            progress (callable): Called with (filename, bytes sent, total bytes) during uploads, or None
         """
         self.token = token or os.environ.get('ZENODO_TOKEN')
         if not self.token:
             raise ValueError("Zenodo API token is required. Set via constructor or ZENODO_TOKEN env variable.")
         
-        self.base_url = "https://sandbox.zenodo.org/api" if sandbox else "https://zenodo.org/api"
+        self.base_url = base_url or ("https://sandbox.zenodo.org/api" if sandbox else "https://zenodo.org/api")
+        self.doi_resolver_url = doi_resolver_url.rstrip('/')
+        self.session = session or create_session()
+        self.max_workers = max_workers
+        self.progress = progress
         self.headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"}
+        # Metadata of the last published deposit, used to build citations without another request
+        self.published_metadata = None
     
     def create_or_update_deposit(self, csv_path, dataset_date, metadata=None,
                                  parsing_timestamp=None, code_path=None, raw_csv_path=None):
@@ -62,76 +76,108 @@ class ZenodoPublisher:
         deposit_metadata = {**default_metadata, **(metadata or {})}
         
         # Create a new deposit
-        r = requests.post(
-            f"{self.base_url}/deposit/depositions",
-            headers=self.headers,
-            json={"metadata": deposit_metadata}
-        )
-        r.raise_for_status()
+        with instrumentation.stage('zenodo.deposit'):
+            r = self.session.post(
+                f"{self.base_url}/deposit/depositions",
+                headers=self.headers,
+                json={"metadata": deposit_metadata}
+            )
+            r.raise_for_status()
         
         deposit_data = r.json()
         deposit_id = deposit_data["id"]
         bucket_url = deposit_data["links"]["bucket"]
         
-        # Upload the CSV file
-        with open(csv_path, "rb") as file:
-            filename = os.path.basename(csv_path)
-            r = requests.put(
-                f"{bucket_url}/{filename}",
-                headers={"Authorization": f"Bearer {self.token}"},
-                data=file
-            )
-            r.raise_for_status()
-        
-        # Upload the parsing code if provided
-        if code_path and os.path.exists(code_path):
-            with open(code_path, "rb") as file:
-                filename = os.path.basename(code_path)
-                r = requests.put(
-                    f"{bucket_url}/{filename}",
-                    headers={"Authorization": f"Bearer {self.token}"},
-                    data=file
-                )
-                r.raise_for_status()
-
-        # Upload the raw CSV file if provided
-        if raw_csv_path and os.path.exists(raw_csv_path):
-            with open(raw_csv_path, "rb") as file:
-                filename = os.path.basename(raw_csv_path)
-                r = requests.put(
-                    f"{bucket_url}/{filename}",
-                    headers={"Authorization": f'Bearer {self.token}'},
-                    data=file
-                )
-                r.raise_for_status()
+        # Upload the CSV file, the parsing code and the raw CSV file concurrently
+        files = [csv_path] + [f for f in (code_path, raw_csv_path) if f and os.path.exists(f)]
+        with instrumentation.stage('zenodo.upload'):
+            self.upload_files(bucket_url, files)
 
         # Publish the deposit
-        r = requests.post(
-            f"{self.base_url}/deposit/depositions/{deposit_id}/actions/publish",
-            headers=self.headers
-        )
-        r.raise_for_status()
+        with instrumentation.stage('zenodo.publish'):
+            r = self.session.post(
+                f"{self.base_url}/deposit/depositions/{deposit_id}/actions/publish",
+                headers=self.headers
+            )
+            r.raise_for_status()
         
         # Return the DOI
         published_data = r.json()
+        self.published_metadata = published_data.get("metadata") or deposit_metadata
         return published_data["doi"]
     
-    def generate_citation(self, doi, authors=None, title=None, date=None):
+    def upload_files(self, bucket_url, file_paths):
+        """
+        Upload several files to a deposit bucket concurrently.
+        
+        All uploads are attempted; the first error (if any) is raised once they
+        have finished.
+        
+        Args:
+            bucket_url (str): Bucket URL of the deposit
+            file_paths (list): Paths to the files to upload
+        
+        Returns:
+            list: File data from Zenodo API, in the order of file_paths
+        """
+        if not file_paths:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(file_paths))) as pool:
+            futures = [pool.submit(self._upload_file, bucket_url, f) for f in file_paths]
+        
+        for future in futures:
+            if future.exception():
+                raise future.exception()
+        return [future.result() for future in futures]
+    
+    def _upload_file(self, bucket_url, file_path):
+        """
+        Upload a file to a deposit bucket.
+        
+        Args:
+            bucket_url (str): Bucket URL of the deposit
+            file_path (str): Path to the file to upload
+        """
+        filename = os.path.basename(file_path)
+        with FileUpload(file_path, progress=self.progress) as body:
+            r = self.session.put(
+                f"{bucket_url}/{filename}",
+                headers={"Authorization": f"Bearer {self.token}"},
+                data=body
+            )
+            r.raise_for_status()
+        instrumentation.count('zenodo.uploaded_files')
+        instrumentation.count('zenodo.uploaded_bytes', body.total)
+        return r.json()
+    
+    def generate_citation(self, doi, authors=None, title=None, date=None, metadata=None):
         """
         Generate citation text for the dataset with the given DOI.
         
+        Missing fields are taken from metadata, which defaults to the metadata
+        of the deposit published last. The DOI is only resolved for metadata
+        when none is available locally.
+        
         Args:
             doi (str): DOI of the dataset
             authors (str): Author names, default from metadata
             title (str): Title, default from metadata
             date (str): Date, default from metadata
+            metadata (dict): Deposit metadata, default from the last published deposit
             
         Returns:
             dict: Citation information in different formats
         """
-        # Get metadata from Zenodo if not provided
+        metadata = metadata or self.published_metadata
+        if metadata:
+            authors = authors or ", ".join([c.get("name", "") for c in metadata.get("creators", [])])
+            title = title or metadata.get("title", "")
+            date = date or metadata.get("publication_date", "")
+        
+        # Get metadata from the DOI resolver if not provided
         if not all([authors, title, date]):
-            r = requests.get(f"https://doi.org/{doi}", headers={"Accept": "application/json"})
+            r = self.session.get(f"{self.doi_resolver_url}/{doi}", headers={"Accept": "application/json"})
             if r.ok:
                 metadata = r.json()
                 authors = authors or ", ".join([c.get("name", "") for c in metadata.get("creators", [])])